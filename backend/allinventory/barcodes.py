@@ -0,0 +1,91 @@
+import io
+from functools import lru_cache
+
+from barcode import EAN13
+from barcode.errors import BarcodeError
+from barcode.writer import ImageWriter, SVGWriter
+from django.utils.html import escape
+
+
+# Barcode rendering. A uid always renders to the same image, so rendered
+# barcodes are kept in a bounded in-process LRU keyed by uid, format and
+# writer options; label sheets and repeated prints reuse them. PNG output
+# needs Pillow, which python-barcode only uses when it is installed.
+
+CACHE_SIZE = 4096
+MAX_LABELS = 1000
+
+# Writer options a request may override, with their types.
+OPTIONS = {
+    'module_width': float,
+    'module_height': float,
+    'font_size': int,
+    'text_distance': float,
+    'quiet_zone': float,
+}
+
+
+class BarcodeUnavailable(Exception):
+    pass
+
+
+def options_from(params):
+    """The writer options present in a query dict, as a hashable tuple."""
+    options = []
+    for name, cast in OPTIONS.items():
+        if name in params:
+            try:
+                options.append((name, cast(params[name])))
+            except ValueError:
+                raise BarcodeUnavailable(f"Invalid {name}")
+    return tuple(options)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def render(uid, fmt='svg', options=()):
+    """EAN-13 image bytes of a product uid."""
+    if fmt == 'png':
+        if ImageWriter is None:
+            raise BarcodeUnavailable("PNG barcodes need Pillow installed")
+        writer = ImageWriter()
+    elif fmt == 'svg':
+        writer = SVGWriter()
+    else:
+        raise BarcodeUnavailable(f"Unknown format {fmt}")
+    try:
+        code = EAN13(uid, writer=writer)
+    except (BarcodeError, ValueError, TypeError) as exc:
+        raise BarcodeUnavailable(f"Invalid uid {uid!r}: {exc}")
+    buffer = io.BytesIO()
+    code.write(buffer, options=dict(options))
+    return buffer.getvalue()
+
+
+def inline_svg(uid, options=()):
+    """The <svg> element alone, to embed in an HTML page."""
+    svg = render(uid, 'svg', options).decode()
+    return svg[svg.index('<svg'):]
+
+
+def label_sheet(labels, columns=3, options=()):
+    """Printable HTML page of barcode labels. labels: (product, quantity)."""
+    cells = []
+    for product, quantity in labels:
+        cell = (
+            '<div class="label">'
+            f'{inline_svg(product.uid, options)}'
+            f'<div class="name">{escape(product.name)}</div>'
+            f'<div class="price">{escape(product.selling_price or "")}</div>'
+            '</div>'
+        )
+        cells.extend([cell] * quantity)
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Labels</title><style>'
+        f'.sheet{{display:grid;grid-template-columns:repeat({columns},1fr);gap:4mm}}'
+        '.label{text-align:center;font-family:sans-serif;font-size:9pt;break-inside:avoid}'
+        '.label svg{max-width:100%;height:auto}'
+        '@page{margin:8mm}'
+        '</style></head><body><div class="sheet">'
+        + ''.join(cells)
+        + '</div></body></html>'
+    )
@@ -0,0 +1,179 @@
+import csv
+from collections import defaultdict
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+
+from alltransactions.models import Vendor
+from alltransactions.uploads import ImportFormatError
+from . import uids, versions
+from .models import Brand, Product
+
+
+# Catalog import/export. An import resolves brand and vendor names through
+# maps built with one query each, then writes products in chunks: one uid
+# reservation, one bulk INSERT and one bulk INSERT of vendor links per chunk.
+# The export streams the same columns back out, so an exported file can be
+# edited and imported into another branch.
+
+CHUNK_SIZE = 1000
+COLUMNS = ['name', 'brand', 'uid', 'cost_price', 'selling_price', 'count', 'vendors']
+REQUIRED = ('name', 'brand')
+VENDOR_SEPARATOR = ';'
+
+
+def _column_map(header):
+    names = [cell.lower().strip().replace(' ', '_') for cell in header]
+    aliases = {'product': 'name', 'barcode': 'uid', 'vendor': 'vendors', 'quantity': 'count'}
+    positions = {}
+    for index, name in enumerate(names):
+        name = aliases.get(name, name)
+        if name in COLUMNS:
+            positions[name] = index
+    missing = [column for column in REQUIRED if column not in positions]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+    return positions
+
+
+class CatalogImport:
+    """Create the products of one upload in a branch. Rows naming an unknown
+    brand or vendor, a product the brand already has, or a barcode already
+    used in the branch are reported instead of imported."""
+
+    def __init__(self, enterprise, branch):
+        self.enterprise = enterprise
+        self.branch = branch
+        self.brands = {brand.name.lower(): brand for brand in Brand.objects.filter(enterprise=enterprise, branch=branch)}
+        # Vendors without a branch serve the whole enterprise; a branch's own
+        # vendor wins over one of the same name, so it is read last
+        vendors = Vendor.objects.filter(Q(branch=branch) | Q(branch__isnull=True), enterprise=enterprise)
+        self.vendors = {
+            vendor.name.lower(): vendor for vendor in vendors.order_by(F('branch').asc(nulls_first=True), 'id')
+        }
+        self.names = set()
+        self.barcodes = set()
+        for brand_id, name, uid in Product.objects.filter(branch=branch).values_list('brand_id', 'name', 'uid'):
+            self.names.add((brand_id, name.lower()))
+            if uid:
+                self.barcodes.add(uid)
+        self.brand_totals = defaultdict(lambda: [0, 0])
+        self.errors = []
+        self.imported = 0
+
+    def _error(self, row_number, name, message):
+        self.errors.append({'row': row_number, 'name': name, 'error': message})
+
+    def _number(self, values, column, cast):
+        value = values.get(column) or ''
+        return cast(value) if value else 0
+
+    def _parse(self, row_number, row, positions):
+        values = {column: row[index] if index < len(row) else '' for column, index in positions.items()}
+        name = values['name']
+        if not name:
+            self._error(row_number, name, "Name is required.")
+            return None
+        brand = self.brands.get(values['brand'].lower())
+        if brand is None:
+            self._error(row_number, name, f"Unknown brand '{values['brand']}'.")
+            return None
+        if (brand.id, name.lower()) in self.names:
+            self._error(row_number, name, "Product already exists in this brand.")
+            return None
+
+        uid = values.get('uid') or ''
+        if uid and (not uid.isdigit() or len(uid) != 12):
+            self._error(row_number, name, "Barcode must be 12 digits.")
+            return None
+        if uid in self.barcodes:
+            self._error(row_number, name, f"Barcode {uid} is already used in this branch.")
+            return None
+
+        vendors = []
+        for vendor_name in filter(None, (v.strip() for v in (values.get('vendors') or '').split(VENDOR_SEPARATOR))):
+            vendor = self.vendors.get(vendor_name.lower())
+            if vendor is None:
+                self._error(row_number, name, f"Unknown vendor '{vendor_name}'.")
+                return None
+            vendors.append(vendor)
+
+        try:
+            cost_price = self._number(values, 'cost_price', float)
+            selling_price = self._number(values, 'selling_price', float)
+            count = self._number(values, 'count', int)
+        except ValueError:
+            self._error(row_number, name, "Prices and count must be numbers.")
+            return None
+
+        self.names.add((brand.id, name.lower()))
+        if uid:
+            self.barcodes.add(uid)
+        product = Product(
+            name=name, uid=uid, brand=brand, enterprise=self.enterprise, branch=self.branch,
+            cost_price=cost_price, selling_price=selling_price,
+            count=count, stock=round(count * selling_price),
+        )
+        return product, vendors
+
+    def _flush(self, chunk):
+        if not chunk:
+            return
+        products = uids.assign([product for product, _ in chunk])
+        Product.objects.bulk_create(products)
+        through = Product.vendor.through
+        through.objects.bulk_create([
+            through(product_id=product.pk, vendor_id=vendor.pk)
+            for product, vendors in chunk
+            for vendor in vendors
+        ])
+        for product in products:
+            totals = self.brand_totals[product.brand_id]
+            totals[0] += product.count
+            totals[1] += product.stock
+        self.imported += len(products)
+
+    def run(self, rows):
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            raise ImportFormatError("The file is empty.")
+        positions = _column_map(header)
+        chunk = []
+        for row_number, row in enumerate(rows, start=2):
+            if not any(row):
+                continue
+            parsed = self._parse(row_number, row, positions)
+            if parsed:
+                chunk.append(parsed)
+            if len(chunk) >= CHUNK_SIZE:
+                self._flush(chunk)
+                chunk = []
+        self._flush(chunk)
+
+        # Opening stock counts into the brand counters like a purchase would.
+        for brand_id, (count, stock) in self.brand_totals.items():
+            if count or stock:
+                Brand.objects.filter(pk=brand_id).update(
+                    count=Coalesce(F('count'), Value(0)) + count, stock=Coalesce(F('stock'), Value(0.0)) + stock
+                )
+        if self.imported:
+            versions.schedule_touch(self.enterprise.id, self.branch.id)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_rows(products):
+    """CSV lines of a product queryset, read chunk by chunk."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['id'] + COLUMNS)
+    products = products.select_related('brand').prefetch_related('vendor').order_by('id')
+    for product in products.iterator(chunk_size=CHUNK_SIZE):
+        yield writer.writerow([
+            product.id, product.name, product.brand.name, product.uid, product.cost_price,
+            product.selling_price, product.count,
+            VENDOR_SEPARATOR.join(vendor.name for vendor in product.vendor.all()),
+        ])
@@ -0,0 +1,18 @@
+# Product uids are the 12 data digits of an EAN-13; scanners read all 13,
+# the last one being the check digit computed here.
+
+def check_digit(digits):
+    """EAN-13 check digit of a 12 digit string."""
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str(-total % 10)
+
+
+def uid_from_code(code):
+    """The product uid a scanned code stands for, or None if it is no EAN-13."""
+    if not code.isdigit():
+        return None
+    if len(code) == 12:
+        return code
+    if len(code) == 13 and check_digit(code[:12]) == code[12]:
+        return code[:12]
+    return None
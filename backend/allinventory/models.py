@@ -1,5 +1,7 @@
 from django.db import models
-import random
+from django.db.models import Q
+from django.utils import timezone
+from . import uids, versions
 
 # Create your models here.
 
@@ -13,6 +15,14 @@ class Brand(models.Model):
     def __str__(self):
         return f"{self.name} - {self.branch.name} at {self.enterprise.name}"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        versions.schedule_touch(self.enterprise_id, self.branch_id)
+
+    def delete(self, *args, **kwargs):
+        versions.schedule_touch(self.enterprise_id, self.branch_id)
+        return super().delete(*args, **kwargs)
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     uid = models.CharField(max_length = 12,blank=True) 
@@ -26,6 +36,15 @@ class Product(models.Model):
     vendor = models.ManyToManyField('alltransactions.Vendor', related_name='all_product', blank=True)
     enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE,related_name='all_product')
     branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE,related_name='all_product', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['enterprise', 'uid']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'uid'], condition=~Q(uid=''), name='unique_uid_per_branch'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.brand.name} at {self.branch.name if self.branch else 'Unknown Branch'} of {self.enterprise.name}"
 
@@ -33,15 +52,39 @@ class Product(models.Model):
 
         if self.pk is None:
             if self.uid is None or self.uid == '':
-                self.uid = self.generate_unique_uid()
+                self.uid = uids.allocate(self.enterprise_id)[0]
         super().save(*args, **kwargs)
-    
+        versions.schedule_touch(self.enterprise_id, self.branch_id)
+
+    def delete(self, *args, **kwargs):
+        versions.schedule_touch(self.enterprise_id, self.branch_id)
+        return super().delete(*args, **kwargs)
+
+    @property
+    def ean13(self):
+        return uids.ean13(self.uid) if self.uid else None
 
-    def generate_unique_uid(self):
-            ###print("Generating uid")
-            while True:
-                uid = ''.join([str(random.randint(0, 9)) for _ in range(12)])
-                if uid.startswith('0') or uid.startswith('1'):
-                    continue
-                if not Product.objects.filter(uid=uid).exists():
-                    return uid
+
+class UidSequence(models.Model):
+    """Next free product uid number of an enterprise; see uids.reserve."""
+    enterprise = models.OneToOneField('enterprise.Enterprise', on_delete=models.CASCADE, related_name='uid_sequence')
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"UID sequence of {self.enterprise_id} at {self.next_value}"
+
+
+class CatalogVersion(models.Model):
+    """Change counter of a branch's product catalog; see versions.py."""
+    enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE, related_name='catalog_versions')
+    branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE, related_name='catalog_versions', null=True, blank=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'branch'], name='unique_catalog_version_per_branch'),
+        ]
+
+    def __str__(self):
+        return f"Catalog of {self.branch_id} at version {self.version}"
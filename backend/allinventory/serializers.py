@@ -1,4 +1,4 @@
-from rest_framework.serializers import ModelSerializer, SerializerMethodField
+from rest_framework.serializers import ModelSerializer, SerializerMethodField, ValidationError
 from .models import Brand, Product
 
 class BrandSerializer(ModelSerializer):
@@ -7,10 +7,34 @@ class BrandSerializer(ModelSerializer):
         fields = '__all__'
     
 class ProductSerializer(ModelSerializer):
+    """A `fields` list in the context keeps only those fields (sparse
+    catalog reads); brandName expects brand to be select_related."""
     brandName = SerializerMethodField()
     class Meta:
         model = Product
         fields = '__all__'
+        # uid is allocated on save when left blank; the (branch, uid)
+        # constraint must not make either field required here.
+        validators = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        only = self.context.get('fields')
+        if only:
+            for name in set(self.fields) - set(only):
+                self.fields.pop(name)
+
+    def validate(self, attrs):
+        uid = attrs.get('uid')
+        branch = attrs.get('branch', self.instance.branch if self.instance else None)
+        if uid and branch:
+            clashes = Product.objects.filter(branch=branch, uid=uid)
+            if self.instance:
+                clashes = clashes.exclude(pk=self.instance.pk)
+            if clashes.exists():
+                raise ValidationError({'uid': 'Another product of this branch has this barcode'})
+        return attrs
+
     def get_brandName(self,obj):
         return obj.brand.name
 
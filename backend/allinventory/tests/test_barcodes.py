@@ -0,0 +1,56 @@
+from allinventory import barcodes
+from allinventory.models import Brand, Product
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Enterprise
+
+
+class BarcodeTestCase(BranchTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        brand = Brand.objects.create(name="Brand", **cls.common)
+        cls.cable = Product.objects.create(name="Cable <USB>", uid="400638133393", brand=brand, selling_price=20, **cls.common)
+        cls.charger = Product.objects.create(name="Charger", uid="500000000001", brand=brand, **cls.common)
+        other = Enterprise.objects.create(name="Other")
+        cls.foreign = Product.objects.create(name="Foreign", uid="600000000001", enterprise=other, brand=Brand.objects.create(name="B", enterprise=other))
+
+    def test_rendered_svg_is_cached(self):
+        barcodes.render.cache_clear()
+        first = self.client.get(f'/allinventory/barcode/{self.cable.id}/')
+        second = self.client.get(f'/allinventory/barcode/{self.cable.id}/')
+        self.assertEqual(first['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', first.content)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(barcodes.render.cache_info().hits, 1)
+
+    def test_writer_options_are_part_of_the_key(self):
+        barcodes.render.cache_clear()
+        plain = self.client.get(f'/allinventory/barcode/{self.cable.id}/')
+        tall = self.client.get(f'/allinventory/barcode/{self.cable.id}/?module_height=30')
+        self.assertNotEqual(plain.content, tall.content)
+        self.assertEqual(barcodes.render.cache_info().currsize, 2)
+
+    def test_unknown_product_and_bad_options(self):
+        self.assertEqual(self.client.get('/allinventory/barcode/999999/').status_code, 404)
+        self.assertEqual(self.client.get(f'/allinventory/barcode/{self.cable.id}/?module_height=tall').status_code, 400)
+
+    def test_label_sheet_repeats_labels(self):
+        response = self.client.post('/allinventory/barcode/sheet/', {
+            'items': [{'product': self.cable.id, 'quantity': 3}, {'product': self.charger.id, 'quantity': 2}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        html = response.content.decode()
+        self.assertEqual(html.count('class="label"'), 5)
+        self.assertEqual(html.count('<svg'), 5)
+        self.assertIn('Cable &lt;USB&gt;', html)
+        self.assertNotIn('<?xml', html)
+
+    def test_label_sheet_rejects_foreign_and_oversized_requests(self):
+        response = self.client.post('/allinventory/barcode/sheet/', {
+            'items': [{'product': self.foreign.id, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/allinventory/barcode/sheet/', {
+            'items': [{'product': self.cable.id, 'quantity': barcodes.MAX_LABELS + 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
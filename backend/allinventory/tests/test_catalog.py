@@ -0,0 +1,78 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from allinventory.models import Brand, Product
+from alltransactions.models import Vendor
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Branch
+
+
+class CatalogImportExportTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name="Other", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Anker", **self.common)
+        self.vendors = [Vendor.objects.create(name=name, **self.common) for name in ("Alpha Traders", "Beta Supply")]
+        Product.objects.create(name="Existing", brand=self.brand, uid="300000000000", **self.common)
+
+    def upload(self, content, branch=None):
+        return self.client.post(
+            f'/allinventory/product/import/branch/{(branch or self.branch).id}/',
+            {'file': SimpleUploadedFile("catalog.csv", content.encode())}, format='multipart',
+        )
+
+    def test_import_creates_products_uids_and_vendor_links(self):
+        rows = ["name,brand,uid,cost_price,selling_price,count,vendors"]
+        rows += [f"Cable {n},anker,,5,10,2,Alpha Traders;beta supply" for n in range(50)]
+        rows += [
+            "Charger,Anker,400638133393,8,20,1,",
+            "Existing,Anker,,1,1,,",
+            "Hub,Unknown,,1,1,,",
+            "Dock,Anker,300000000000,1,1,,",
+            "Stand,Anker,,x,1,,",
+            "Mount,Anker,,1,1,,Gamma",
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload("\n".join(rows))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['imported'], 51)
+        self.assertEqual([error['row'] for error in response.data['errors']], [53, 54, 55, 56, 57])
+        self.assertLess(len(queries), 20)
+
+        cables = Product.objects.filter(branch=self.branch, name__startswith="Cable")
+        self.assertEqual(cables.count(), 50)
+        self.assertEqual(len(set(cables.values_list('uid', flat=True))), 50)
+        self.assertEqual(Product.vendor.through.objects.filter(product__in=cables).count(), 100)
+        self.assertEqual(Product.objects.get(name="Charger").uid, "400638133393")
+
+        self.brand.refresh_from_db()
+        self.assertEqual((self.brand.count, self.brand.stock), (101, 1020))
+
+    def test_missing_columns_and_empty_imports_are_rejected(self):
+        self.assertEqual(self.upload("title,price\nCable,1").status_code, 400)
+        response = self.upload("name,brand\nHub,Unknown")
+        self.assertEqual((response.status_code, response.data['imported']), (400, 0))
+
+    def test_export_streams_the_catalog_and_round_trips(self):
+        self.upload("name,brand,selling_price,vendors\nCable,Anker,10,Alpha Traders\nCharger,Anker,20,")
+        response = self.client.get(f'/allinventory/product/export/branch/{self.branch.id}/')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,name,brand,uid,cost_price,selling_price,count,vendors")
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[2].endswith(",Alpha Traders"))
+
+        Brand.objects.create(name="Anker", enterprise=self.enterprise, branch=self.other_branch)
+        Vendor.objects.create(name="Alpha Traders", enterprise=self.enterprise, branch=self.other_branch)
+        response = self.upload("\n".join(lines), branch=self.other_branch)
+        self.assertEqual(response.data['imported'], 3)
+        self.assertEqual(Product.objects.filter(branch=self.other_branch).count(), 3)
+
+    def test_enterprise_wide_vendors_are_linked(self):
+        shared = Vendor.objects.create(name="Gamma", enterprise=self.enterprise)
+        Vendor.objects.create(name="Alpha Traders", enterprise=self.enterprise)
+        response = self.upload("name,brand,vendors\nMount,Anker,gamma;alpha traders")
+        self.assertEqual((response.status_code, response.data['imported']), (201, 1))
+        self.assertEqual(
+            set(Product.objects.get(name="Mount").vendor.all()), {shared, self.vendors[0]},
+        )
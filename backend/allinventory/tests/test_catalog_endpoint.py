@@ -0,0 +1,49 @@
+from allinventory.models import Brand, Product, CatalogVersion
+from alltransactions.models import Vendor
+from alltransactions.tests.base import BranchTestCase
+
+
+class ProductCatalogEndpointTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.brand = Brand.objects.create(name="Anker", **self.common)
+        vendor = Vendor.objects.create(name="Vendor", **self.common)
+        for n in range(5):
+            product = Product.objects.create(name=f"Cable {n}", brand=self.brand, selling_price=10, **self.common)
+            product.vendor.add(vendor)
+        self.url = f'/allinventory/product/catalog/branch/{self.branch.id}/'
+
+    def test_pages_by_cursor_with_sparse_fields(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'fields': 'id,name,brandName', 'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        first = response.data['results']
+        self.assertEqual(set(first[0]), {'id', 'name', 'brandName'})
+        self.assertEqual(first[0]['brandName'], "Anker")
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['name'] for row in first + response.data['results']], [f"Cable {n}" for n in range(5)])
+
+        full = self.client.get(self.url)
+        self.assertEqual(len(full.data['results'][0]['vendor']), 1)
+        self.assertEqual(self.client.get(self.url, {'fields': 'id,bogus'}).status_code, 400)
+
+    def test_unchanged_catalog_answers_304(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(name="Cable 0").get().save()
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(2):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(name="Cable 1")
+            product.selling_price = 12
+            product.save()
+        self.assertEqual(CatalogVersion.objects.get(branch=self.branch).version, 2)
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
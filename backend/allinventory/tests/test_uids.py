@@ -0,0 +1,73 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from allinventory import uids
+from allinventory.ean import check_digit
+from allinventory.models import Brand, Product, UidSequence
+from enterprise.models import Enterprise, Branch, Person
+from userauth.models import User
+
+
+class UidAllocatorTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Brand", enterprise=self.enterprise, branch=self.branch)
+
+    def product(self, **fields):
+        return Product(name="Product", brand=self.brand, enterprise=self.enterprise, branch=self.branch, **fields)
+
+    def test_sequential_uids_with_check_digit(self):
+        first, second = self.product(), self.product()
+        first.save()
+        second.save()
+        self.assertEqual(first.uid, "200000000001")
+        self.assertEqual(second.uid, "200000000002")
+        self.assertEqual(first.ean13, "200000000001" + check_digit("200000000001"))
+
+    def test_sequence_starts_above_existing_uids(self):
+        self.product(uid="200000000500").save()
+        self.product(uid="912345678901").save()
+        product = self.product()
+        product.save()
+        self.assertEqual(product.uid, "200000000501")
+
+    def test_enterprises_have_separate_sequences(self):
+        other = Enterprise.objects.create(name="Other")
+        self.assertEqual(uids.allocate(self.enterprise.id, 2), ["200000000001", "200000000002"])
+        self.assertEqual(uids.allocate(other.id), ["200000000001"])
+        self.assertEqual(uids.allocate(self.enterprise.id), ["200000000003"])
+
+    def test_bulk_assignment_is_one_reservation(self):
+        uids.allocate(self.enterprise.id)
+        products = [self.product() for _ in range(2000)]
+        with CaptureQueriesContext(connection) as queries:
+            uids.assign(products)
+        self.assertEqual(len(queries), 1)
+        Product.objects.bulk_create(products, batch_size=500)
+        self.assertEqual(Product.objects.values('uid').distinct().count(), 2000)
+        self.assertEqual(UidSequence.objects.get(enterprise=self.enterprise).next_value, 2002)
+
+    def test_the_last_number_is_the_end_of_the_range(self):
+        UidSequence.objects.create(enterprise=self.enterprise, next_value=uids.LIMIT - 2)
+        self.assertEqual(uids.allocate(self.enterprise.id, 2), ["299999999998", "299999999999"])
+        with self.assertRaises(uids.UidRangeExhausted):
+            uids.allocate(self.enterprise.id)
+        with self.assertRaises(uids.UidRangeExhausted):
+            uids.format_uid(uids.LIMIT)
+
+    def test_duplicate_uid_in_branch_is_rejected(self):
+        self.product(uid="400638133393").save()
+        user = User.objects.create_user(email="admin@example.com", name="Admin", password="x")
+        Person.objects.create(user=user, enterprise=self.enterprise, branch=self.branch, role="Admin")
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/allinventory/product/', {
+            'name': "Copy", 'uid': "400638133393", 'brand': self.brand.id, 'branch': self.branch.id,
+        }, format='json')
+        self.assertIn('uid', response.data)
+        response = client.post('/allinventory/product/', {
+            'name': "Fresh", 'brand': self.brand.id, 'branch': self.branch.id,
+        }, format='json')
+        self.assertEqual(response.data['uid'], "200000000001")
@@ -0,0 +1,86 @@
+from django.db import connection
+from django.db.models import Max
+
+from .ean import check_digit
+
+
+# Product uids come from a per-enterprise sequence instead of random draws.
+# They sit in the GS1 in-store range: "2" followed by an 11 digit number, the
+# 12 data digits of an EAN-13 whose check digit ean.check_digit supplies. A
+# reservation takes a whole block of numbers in one UPDATE ... RETURNING, so
+# creating thousands of products costs one statement and no existence probes;
+# the row lock it takes also keeps concurrent reservations apart. A number
+# that no longer fits in the 11 digits is refused with UidRangeExhausted
+# rather than spilling into a 13 digit uid that is not an EAN-13.
+
+PREFIX = '2'
+DIGITS = 11
+LIMIT = 10 ** DIGITS
+
+
+class UidRangeExhausted(Exception):
+    pass
+
+
+def _exhausted():
+    return UidRangeExhausted(f"No product uids are left in the {PREFIX}xxxxxxxxxxx range.")
+
+
+def format_uid(number):
+    if not 0 <= number < LIMIT:
+        raise _exhausted()
+    return f"{PREFIX}{number:0{DIGITS}d}"
+
+
+def ean13(uid):
+    return uid + check_digit(uid)
+
+
+def _seed(enterprise_id):
+    """First free number: above every uid of this enterprise already in range."""
+    from .models import Product
+
+    highest = Product.objects.filter(
+        enterprise_id=enterprise_id, uid__startswith=PREFIX, uid__regex=rf'^\d{{{DIGITS + 1}}}$'
+    ).aggregate(highest=Max('uid'))['highest']
+    return int(highest[1:]) + 1 if highest else 1
+
+
+def reserve(enterprise_id, count=1):
+    """Reserve count consecutive numbers; returns the first one."""
+    from .models import UidSequence
+
+    meta = UidSequence._meta
+    table = connection.ops.quote_name(meta.db_table)
+    next_value = connection.ops.quote_name(meta.get_field('next_value').column)
+    enterprise = connection.ops.quote_name(meta.get_field('enterprise').column)
+    sql = f"UPDATE {table} SET {next_value} = {next_value} + %s WHERE {enterprise} = %s RETURNING {next_value}"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [count, enterprise_id])
+        row = cursor.fetchone()
+        if row is None:
+            UidSequence.objects.get_or_create(enterprise_id=enterprise_id, defaults={'next_value': _seed(enterprise_id)})
+            cursor.execute(sql, [count, enterprise_id])
+            row = cursor.fetchone()
+    if row[0] > LIMIT:
+        raise _exhausted()
+    return row[0] - count
+
+
+def allocate(enterprise_id, count=1):
+    """count fresh uids for an enterprise."""
+    first = reserve(enterprise_id, count)
+    return [format_uid(number) for number in range(first, first + count)]
+
+
+def assign(products):
+    """Give every product without a uid a fresh one, one reservation per
+    enterprise; for products about to be bulk_created."""
+    pending = {}
+    for product in products:
+        if not product.uid:
+            pending.setdefault(product.enterprise_id, []).append(product)
+    for enterprise_id, group in pending.items():
+        for product, uid in zip(group, allocate(enterprise_id, len(group))):
+            product.uid = uid
+    return products
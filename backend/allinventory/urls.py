@@ -4,6 +4,11 @@ from . import views
 urlpatterns = [
     path('product/', views.ProductView.as_view()),
     path('product/branch/<int:branch>/', views.ProductView.as_view()),
+    path('product/catalog/', views.ProductCatalogView.as_view()),
+    path('product/catalog/branch/<int:branch>/', views.ProductCatalogView.as_view()),
+    path('product/import/branch/<int:branch>/', views.ProductImportView.as_view()),
+    path('product/export/', views.ProductExportView.as_view()),
+    path('product/export/branch/<int:branch>/', views.ProductExportView.as_view()),
     path('product/branch/<int:selfbranch>/brand/<int:brand>/merge/<int:mergebranch>/', views.MergeProductBrandView.as_view()),
     path('deleteproduct/<int:pk>/', views.ProductView.as_view()),
     path('product/<int:pk>/', views.ProductView.as_view()),
@@ -12,6 +17,7 @@ urlpatterns = [
     path('brand/branch/<int:branch>/', views.BrandView.as_view()),
     path('brand/<int:pk>/', views.BrandView.as_view()),
     path('barcode/<int:pk>/', views.generate_barcode),
+    path('barcode/sheet/', views.LabelSheetView.as_view()),
     path('report/product/<int:pk>/', views.ReportView.as_view()),
     
 ]
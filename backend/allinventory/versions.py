@@ -0,0 +1,55 @@
+import hashlib
+from calendar import timegm
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+# Catalog versions. Every committed write to a branch's products or product
+# brands bumps that branch's CatalogVersion (a counter and a timestamp, one
+# UPDATE). Catalog reads derive their ETag and Last-Modified from it, so a
+# client holding a current copy gets 304 before any product is read. Model
+# saves and deletes bump it themselves; bulk paths (import, merge,
+# reconciliation) bypass Model.save and call touch explicitly.
+
+def touch(enterprise_id, branch_id):
+    from .models import CatalogVersion
+
+    now = timezone.now()
+    versions = CatalogVersion.objects.filter(enterprise_id=enterprise_id, branch_id=branch_id)
+    if versions.update(version=F('version') + 1, updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            CatalogVersion.objects.create(enterprise_id=enterprise_id, branch_id=branch_id, version=1, updated_at=now)
+    except IntegrityError:
+        versions.update(version=F('version') + 1, updated_at=now)
+
+
+def schedule_touch(enterprise_id, branch_id):
+    """touch() once the surrounding database transaction commits."""
+    transaction.on_commit(partial(touch, enterprise_id, branch_id))
+
+
+def current(enterprise_id, branch_id=None):
+    """(version, last change) of a branch's catalog, or of the enterprise's
+    when branch_id is None."""
+    from .models import CatalogVersion
+
+    rows = CatalogVersion.objects.filter(enterprise_id=enterprise_id)
+    if branch_id is not None:
+        rows = rows.filter(branch_id=branch_id)
+    state = rows.aggregate(total=Coalesce(Sum('version'), 0), branches=Count('id'), updated_at=Max('updated_at'))
+    return f"{state['branches']}.{state['total']}", state['updated_at']
+
+
+def validators(enterprise_id, branch_id, variant=''):
+    """ETag and Last-Modified (a timestamp, or None) of one representation of
+    a catalog; variant is whatever else shapes the response (query string)."""
+    version, updated_at = current(enterprise_id, branch_id)
+    digest = hashlib.md5(variant.encode()).hexdigest()[:12]
+    etag = f'"catalog-{enterprise_id}-{branch_id or "all"}-{version}-{digest}"'
+    return etag, timegm(updated_at.utctimetuple()) if updated_at else None
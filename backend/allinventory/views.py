@@ -6,13 +6,18 @@ from .models import Product,Brand
 from enterprise.models import Branch
 from .serializers import ProductSerializer,BrandSerializer
 from rest_framework.decorators import api_view
-from barcode import EAN13
-from barcode.writer import SVGWriter
-import io
-from django.http import FileResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from alltransactions.uploads import ImportFormatError, iter_rows
+from .catalog import CatalogImport, export_rows
+from . import barcodes, versions
 from rest_framework.permissions import IsAuthenticated
-from alltransactions.models import Sales,Purchase,SalesTransaction,PurchaseTransaction
-from alltransactions.serializers import SalesSerializer,PurchaseSerializer
+from rest_framework.pagination import CursorPagination
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from alltransactions.merge import BranchMergeMixin
+from alltransactions import movements
 
 # Create your views here.
 
@@ -28,16 +33,16 @@ class ProductView(APIView):
                 return Response(status=status.HTTP_404_NOT_FOUND)
         search = request.GET.get('search')
 
+        products = Product.objects.filter(enterprise=request.user.person.enterprise).select_related('brand').prefetch_related('vendor')
         if branch:
-            products = Product.objects.filter(enterprise=request.user.person.enterprise,branch=branch)
+            products = products.filter(branch=branch)
             serializer = ProductSerializer(products, many=True)
             return Response(serializer.data)
         if search:
-            products = Product.objects.filter(enterprise=request.user.person.enterprise,name__icontains=search)
+            products = products.filter(name__icontains=search)
             serializer = ProductSerializer(products, many=True)
             return Response(serializer.data)
         
-        products = Product.objects.filter(enterprise=request.user.person.enterprise)
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data)
     
@@ -78,6 +83,86 @@ class ProductView(APIView):
         product.delete()
         return Response("Deleted")
     
+class CatalogPagination(CursorPagination):
+    page_size = 200
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
+
+
+class ProductCatalogView(APIView):
+    """The product catalog of the enterprise or one branch, for clients that
+    keep a local copy. Pages are walked by cursor in id order and ?fields=
+    picks the columns (e.g. fields=id,name,uid,selling_price). ETag and
+    Last-Modified follow the catalog version, so a conditional request for
+    an unchanged catalog answers 304 without reading any product."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, branch=None, format=None):
+        enterprise = request.user.person.enterprise
+        if branch and not Branch.objects.filter(id=branch, enterprise=enterprise).exists():
+            return Response({"error": "Unknown branch"}, status=status.HTTP_404_NOT_FOUND)
+        fields = [name.strip() for name in request.GET.get('fields', '').split(',') if name.strip()]
+        unknown = set(fields) - set(ProductSerializer().fields)
+        if unknown:
+            return Response({"error": f"Unknown fields: {', '.join(sorted(unknown))}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag, last_modified = versions.validators(enterprise.id, branch, request.GET.urlencode())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        products = Product.objects.filter(enterprise=enterprise).select_related('brand')
+        if branch:
+            products = products.filter(branch=branch)
+        if not fields or 'vendor' in fields:
+            products = products.prefetch_related('vendor')
+        paginator = CatalogPagination()
+        page = paginator.paginate_queryset(products, request, view=self)
+        response = paginator.get_paginated_response(ProductSerializer(page, many=True, context={'fields': fields}).data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class ProductImportView(APIView):
+    """Create products in a branch from an uploaded CSV/XLSX with columns
+    name, brand, uid, cost_price, selling_price, count, vendors (the last
+    five optional; vendors separated by ';'). Valid rows are imported and
+    the rest come back in a per-row error report."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, branch, format=None):
+        enterprise = request.user.person.enterprise
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+        branch = get_object_or_404(Branch, id=branch, enterprise=enterprise)
+        try:
+            with transaction.atomic():
+                importer = CatalogImport(enterprise, branch)
+                importer.run(iter_rows(upload))
+        except ImportFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        response_status = status.HTTP_201_CREATED if importer.imported else status.HTTP_400_BAD_REQUEST
+        return Response({"imported": importer.imported, "errors": importer.errors}, status=response_status)
+
+
+class ProductExportView(APIView):
+    """Stream the catalog (of one branch, or the whole enterprise) as CSV."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, branch=None, format=None):
+        products = Product.objects.filter(enterprise=request.user.person.enterprise)
+        if branch:
+            products = products.filter(branch=branch)
+        response = StreamingHttpResponse(export_rows(products), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="catalog{f"-{branch}" if branch else ""}.csv"'
+        return response
+
+
 class BrandView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -146,138 +231,81 @@ class BrandView(APIView):
 
 @api_view(['GET'])
 def generate_barcode(request,pk=None):
-    if pk:
-        uid = Product.objects.get(id=pk).uid
-        # print(uid)
+    uid = Product.objects.filter(id=pk).values_list('uid', flat=True).first()
+    if not uid:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    fmt = request.GET.get('output', 'svg')
+    try:
+        image = barcodes.render(uid, fmt, barcodes.options_from(request.GET))
+    except barcodes.BarcodeUnavailable as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    barcode = EAN13(uid, writer=SVGWriter())
-    
-    buffer = io.BytesIO()
-    barcode.write(buffer)
-    buffer.seek(0)
+    response = HttpResponse(image, content_type='image/png' if fmt == 'png' else 'image/svg+xml')
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+class LabelSheetView(APIView):
+    """One printable HTML page of barcode labels.
+    Body: {"items": [{"product": id, "quantity": n}, ...], "columns": 3}"""
+    permission_classes = [IsAuthenticated]
 
-    # print("BARCODE GENERATED")
-    return FileResponse(buffer, content_type='image/svg+xml')
+    def post(self, request, format=None):
+        try:
+            quantities = {int(item['product']): int(item.get('quantity', 1)) for item in request.data.get('items', [])}
+            columns = min(max(int(request.data.get('columns', 3)), 1), 8)
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return Response({"error": "items must be a list of {product, quantity}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not quantities or any(quantity < 1 for quantity in quantities.values()):
+            return Response({"error": "Nothing to print"}, status=status.HTTP_400_BAD_REQUEST)
+        if sum(quantities.values()) > barcodes.MAX_LABELS:
+            return Response({"error": f"At most {barcodes.MAX_LABELS} labels per sheet"}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = Product.objects.filter(
+            enterprise=request.user.person.enterprise, id__in=quantities
+        ).only('id', 'name', 'uid', 'selling_price').in_bulk()
+        missing = set(quantities) - set(products)
+        if missing:
+            return Response({"error": f"Unknown products {sorted(missing)}"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            sheet = barcodes.label_sheet(
+                [(products[pk], quantity) for pk, quantity in quantities.items()],
+                columns, barcodes.options_from(request.query_params),
+            )
+        except barcodes.BarcodeUnavailable as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return HttpResponse(sheet, content_type='text/html; charset=utf-8')
 
 
-class MergeBrandView(APIView):
+class MergeBrandView(BranchMergeMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    kind = 'product'
+
     def post(self,request,selfbranch,mergebranch,format=None):
-        
-        branch = Branch.objects.get(id=mergebranch)
-        print(branch.name)
-        # return Response("Merged")
+        return self.merge(request, selfbranch, mergebranch)
 
-        for brand in Brand.objects.filter(branch=branch):
-            if brand.name in Brand.objects.filter(branch_id=selfbranch).values_list('name',flat=True):
-                continue
-            Brand.objects.create(name=brand.name,enterprise=brand.enterprise,branch_id=selfbranch)
-        return Response("Merged")
+class MergeProductBrandView(BranchMergeMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    kind = 'product'
 
-class MergeProductBrandView(APIView):
     def post(self,request,selfbranch,mergebranch,brand,format=None):
-        print("MERGING PRODUCTS")
-        brand = Brand.objects.get(id=brand)
-        products = Product.objects.filter(branch_id=mergebranch,brand__name__iexact=brand.name)
-        print("THERESASDSAD ",products) 
-        for product in Product.objects.filter(branch_id=mergebranch,brand__name__iexact=brand.name):
-            print(product)
-            if Product.objects.filter(branch_id=selfbranch, brand=brand, name__iexact=product.name).exists():
-                print("HERE")
-                continue
-            p = Product.objects.create(name=product.name,enterprise=product.enterprise,branch_id=selfbranch,cost_price=product.cost_price,selling_price=product.selling_price,brand_id=brand.id,uid = product.uid)
-            print("CREATED",p)
-            
-        return Response("Merged")
+        return self.merge(request, selfbranch, mergebranch, brand)
     
 
 class ReportView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self,request,pk,format=None):
-        product = Product.objects.get(id=pk)
+        product = get_object_or_404(Product, id=pk)
         if product.enterprise != request.user.person.enterprise:
             return Response("Unauthorized")
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        if start_date and end_date:
-            opening_quantity = 0
-            for purchase in Purchase.objects.filter(product=product,purchase_transaction__date__lt=start_date, returned=False):
-                opening_quantity += purchase.quantity
-            for sale in Sales.objects.filter(product=product,sales_transaction__date__lt=start_date, returned=False):
-                opening_quantity -= sale.quantity
-            sales = Sales.objects.filter(product=product,sales_transaction__date__range=[start_date,end_date], returned=False)
-            sales = sales.order_by('sales_transaction__date')
-            sales = SalesSerializer(sales,many=True).data
-            purchases = Purchase.objects.filter(product=product,purchase_transaction__date__range=[start_date,end_date], returned=False)
-            purchases = purchases.order_by('purchase_transaction__date')
-            purchases = PurchaseSerializer(purchases,many=True).data
-            purchases = list(purchases)
-            for p in purchases:
-                p['type'] = 'purchase'
-            sales = list(sales)
-            for s in sales:
-                s['type'] = 'sales'
-            transactions = sorted(
-                purchases + sales,
-                key=lambda x: x["date"]
-            )
-            return Response({"opening_quantity": opening_quantity, "transactions": transactions})
-        elif start_date:
-            opening_quantity = 0
-            for purchase in Purchase.objects.filter(product=product,purchase_transaction__date__lt=start_date, returned=False):
-                opening_quantity += purchase.quantity
-            for sale in Sales.objects.filter(product=product,sales_transaction__date__lt=start_date, returned=False):
-                opening_quantity -= sale.quantity
-            sales = Sales.objects.filter(product=product,sales_transaction__date__gte=start_date, returned=False)
-            sales = sales.order_by('sales_transaction__date')
-            sales = SalesSerializer(sales,many=True).data
-            purchases = Purchase.objects.filter(product=product,purchase_transaction__date__gte=start_date, returned=False)
-            purchases = purchases.order_by('purchase_transaction__date')
-            purchases = PurchaseSerializer(purchases,many=True).data
-            purchases = list(purchases)
-            for p in purchases:
-                p['type'] = 'purchase'
-            sales = list(sales)
-            for s in sales:
-                s['type'] = 'sales'
-            transactions = sorted(
-                purchases + sales,
-                key=lambda x: x["date"]
-            )
-            return Response({"opening_quantity": opening_quantity, "transactions": transactions})
-        elif end_date:
-            sales = Sales.objects.filter(product=product,sales_transaction__date__lte=end_date, returned=False)
-            sales = sales.order_by('sales_transaction__date')
-            sales = SalesSerializer(sales,many=True).data
-            purchases = Purchase.objects.filter(product=product,purchase_transaction__date__lte=end_date, returned=False)
-            purchases = purchases.order_by('purchase_transaction__date')
-            purchases = PurchaseSerializer(purchases,many=True).data
-            purchases = list(purchases)
-            for p in purchases:
-                p['type'] = 'purchase'
-            sales = list(sales)
-            for s in sales:
-                s['type'] = 'sales'
-            transactions = sorted(
-                purchases + sales,
-                key=lambda x: x["date"]
-            )
-            return Response({"opening_quantity": 0, "transactions": transactions})
-        else:
-            sales = Sales.objects.filter(product=product, returned=False)
-            sales = sales.order_by('sales_transaction__date')
-            sales = SalesSerializer(sales,many=True).data
-            purchases = Purchase.objects.filter(product=product, returned=False)
-            purchases = purchases.order_by('purchase_transaction__date')
-            purchases = PurchaseSerializer(purchases,many=True).data
-            purchases = list(purchases)
-            for p in purchases:
-                p['type'] = 'purchase'
-            sales = list(sales)
-            for s in sales:
-                s['type'] = 'sales'
-            transactions = sorted(
-                purchases + sales,
-                key=lambda x: x["date"]
-            )
-            return Response({"opening_quantity": 0, "transactions": transactions})
\ No newline at end of file
+        opening_quantity = movements.opening_quantity(product.id, start_date) if start_date else 0
+        transactions = list(movements.ledger(product.id, start_date, end_date, opening_quantity))
+        closing_quantity = transactions[-1]['balance'] if transactions else opening_quantity
+        return Response({
+            "opening_quantity": opening_quantity,
+            "transactions": transactions,
+            "closing_quantity": closing_quantity,
+        })
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class AlltransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'alltransactions'
+
+    def ready(self):
+        from .search import configure_connection, create_indexes
+        post_migrate.connect(create_indexes, sender=self)
+        connection_created.connect(configure_connection)
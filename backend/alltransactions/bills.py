@@ -0,0 +1,105 @@
+import re
+
+from django.db import connection
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast
+
+
+# Bill numbers come from a BillSequence row per enterprise, branch and kind
+# of document instead of MAX(CAST(bill_no)) over every bill. A number is
+# taken with one UPDATE ... RETURNING inside the transaction that creates
+# the bill, so two tills never get the same number and a rolled back bill
+# gives its number back. An offline till reserves a block up front and
+# sends those numbers itself. Bills typed in by hand keep their number; a
+# numeric one moves the sequence past it, as MAX(bill_no) used to.
+
+KINDS = ('sales', 'purchase', 'return')
+NUMERIC = r'^[0-9]{1,18}$'
+
+
+def _documents(kind):
+    from .models import PurchaseReturn, PurchaseTransaction, SalesReturn, SalesTransaction
+
+    return {
+        'sales': [SalesTransaction],
+        'purchase': [PurchaseTransaction],
+        'return': [SalesReturn, PurchaseReturn],
+    }[kind]
+
+
+def _seed(enterprise_id, branch_id, kind):
+    """First free number: above every numeric bill of this branch already
+    issued (the one full read, when the sequence row is created)."""
+    highest = 0
+    for model in _documents(kind):
+        top = model.objects.filter(
+            enterprise_id=enterprise_id, branch_id=branch_id, bill_no__regex=NUMERIC
+        ).aggregate(top=Max(Cast('bill_no', BigIntegerField())))['top']
+        highest = max(highest, top or 0)
+    return highest + 1
+
+
+def _sequence(enterprise_id, branch_id, kind):
+    from .models import BillSequence
+
+    sequence, _ = BillSequence.objects.get_or_create(
+        enterprise_id=enterprise_id, branch_id=branch_id, kind=kind,
+        defaults={'next_value': _seed(enterprise_id, branch_id, kind)},
+    )
+    return sequence
+
+
+def _update(enterprise_id, branch_id, kind, assignment, params):
+    """Run UPDATE ... SET next_value = <assignment> RETURNING next_value on
+    the sequence row, creating the row first if there is none yet."""
+    from .models import BillSequence
+
+    if kind not in KINDS:
+        raise ValueError(f"Unknown bill kind {kind!r}")
+    meta = BillSequence._meta
+    quote = connection.ops.quote_name
+    next_value = quote(meta.get_field('next_value').column)
+    branch = quote(meta.get_field('branch').column)
+    sql = (
+        f"UPDATE {quote(meta.db_table)} SET {next_value} = {assignment.format(next_value=next_value)} "
+        f"WHERE {quote(meta.get_field('enterprise').column)} = %s AND {quote(meta.get_field('kind').column)} = %s "
+        f"AND {f'{branch} = %s' if branch_id is not None else f'{branch} IS NULL'} RETURNING {next_value}"
+    )
+    params = list(params) + [enterprise_id, kind] + ([branch_id] if branch_id is not None else [])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+        if row is None:
+            _sequence(enterprise_id, branch_id, kind)
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    return row[0]
+
+
+def reserve(enterprise_id, branch_id, kind, count=1):
+    """Take count consecutive numbers; returns the first one."""
+    return _update(enterprise_id, branch_id, kind, "{next_value} + %s", [count]) - count
+
+
+def claim(enterprise_id, branch_id, kind, bill_no):
+    """Move the sequence past a bill number typed in by hand, so automatic
+    numbering never issues it again. Non-numeric numbers are ignored."""
+    if not re.match(NUMERIC, bill_no or ''):
+        return
+    number = int(bill_no)
+    # GREATEST(next_value, number + 1), spelled so SQLite runs it too
+    _update(
+        enterprise_id, branch_id, kind,
+        "CASE WHEN {next_value} > %s THEN {next_value} ELSE %s END", [number, number + 1],
+    )
+
+
+def allocate(enterprise_id, branch_id, kind, count=1):
+    """count fresh bill numbers, as the strings stored in bill_no."""
+    first = reserve(enterprise_id, branch_id, kind, count)
+    return [str(number) for number in range(first, first + count)]
+
+
+def peek(enterprise_id, branch_id, kind):
+    """The number the next bill would get, without taking it."""
+    return str(_sequence(enterprise_id, branch_id, kind).next_value)
@@ -0,0 +1,155 @@
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from allinventory import versions
+from allinventory.models import Brand as ProductBrand, Product
+from enterprise.models import Branch
+from inventory import valuation
+from inventory.models import Brand as PhoneBrand, Phone
+from .models import Purchase, Sales
+
+
+# Stock counter reconciliation. `count`/`stock` on phones, products and their
+# brands are adjusted incrementally by the transaction serializers and drift.
+# Here they are recomputed one branch at a time from grouped aggregates (one
+# query per model), compared with the stored values, and only the fields
+# that drifted are written back. Each branch is its own short transaction,
+# so no table stays locked while the whole enterprise is checked.
+#
+# The scan takes no locks, so a checkout may commit between the read and the
+# write. The drifted rows are therefore locked FOR NO KEY UPDATE in id order
+# (the order stock.apply uses) and corrected by the difference found, as
+# x = x + delta, never overwritten with the value read: a sale committed
+# meanwhile keeps its decrement.
+#
+# Phones count their in-stock Items. A product's count is normally kept as is
+# (admins edit it directly for opening stock and adjustments) and only its
+# valuation is recomputed; recount_products derives it from the purchase and
+# sale quantities that were not returned.
+
+BATCH_SIZE = 1000
+TOLERANCE = 0.005
+
+Drift = namedtuple('Drift', 'model pk field stored actual')
+
+
+def _changed(stored, actual):
+    return abs((stored or 0) - actual) > TOLERANCE
+
+
+def _collect(model, rows, drifts):
+    """rows: (obj, {field: actual}); returns {field: {pk: actual - stored}}
+    for the fields that drifted."""
+    deltas = defaultdict(dict)
+    for obj, actual in rows:
+        for field, value in actual.items():
+            stored = getattr(obj, field)
+            if _changed(stored, value):
+                drifts.append(Drift(model._meta.label, obj.pk, field, stored, value))
+                deltas[field][obj.pk] = value - (stored or 0)
+    return deltas
+
+
+def _shift(model, deltas):
+    """Lock the rows in deltas in id order and add each delta to its field."""
+    pks = sorted({pk for by_pk in deltas.values() for pk in by_pk})
+    if not pks:
+        return
+    list(model.objects.select_for_update(no_key=True).filter(pk__in=pks).order_by('id').values_list('id', flat=True))
+    for field, by_pk in deltas.items():
+        output_field = model._meta.get_field(field)
+        chunk_pks = sorted(by_pk)
+        for start in range(0, len(chunk_pks), BATCH_SIZE):
+            chunk = chunk_pks[start:start + BATCH_SIZE]
+            model.objects.filter(pk__in=chunk).update(**{field: Coalesce(F(field), Value(0, output_field=output_field)) + Case(
+                *[When(pk=pk, then=Value(by_pk[pk])) for pk in chunk],
+                default=Value(0), output_field=output_field,
+            )})
+
+
+def _phone_rows(branch_id):
+    phones = list(
+        Phone.objects.filter(brand__branch_id=branch_id)
+        .annotate(items=Count('item'))
+        .only('id', 'brand_id', 'count', 'stock', 'selling_price')
+    )
+    brands = defaultdict(lambda: [0, 0.0])
+    phone_rows = []
+    for phone in phones:
+        stock = phone.items * (phone.selling_price or 0)
+        phone_rows.append((phone, {'count': phone.items, 'stock': stock}))
+        brands[phone.brand_id][0] += phone.items
+        brands[phone.brand_id][1] += stock
+    brand_rows = [
+        (brand, {'count': brands[brand.pk][0], 'stock': brands[brand.pk][1]})
+        for brand in PhoneBrand.objects.filter(branch_id=branch_id).only('id', 'count', 'stock')
+    ]
+    return phone_rows, brand_rows
+
+
+def _quantity(model):
+    return Coalesce(Subquery(
+        model.objects.filter(product=OuterRef('pk'), returned=False)
+        .values('product').annotate(total=Sum('quantity')).values('total'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def _product_rows(branch_id, recount):
+    products = Product.objects.filter(brand__branch_id=branch_id).only(
+        'id', 'brand_id', 'count', 'stock', 'selling_price'
+    )
+    if recount:
+        products = products.annotate(bought=_quantity(Purchase), sold=_quantity(Sales))
+    brands = defaultdict(lambda: [0, 0])
+    product_rows = []
+    for product in products:
+        count = product.bought - product.sold if recount else (product.count or 0)
+        stock = round(count * (product.selling_price or 0))
+        product_rows.append((product, {'count': count, 'stock': stock}))
+        brands[product.brand_id][0] += count
+        brands[product.brand_id][1] += stock
+    brand_rows = [
+        (brand, {'count': brands[brand.pk][0], 'stock': brands[brand.pk][1]})
+        for brand in ProductBrand.objects.filter(branch_id=branch_id).only('id', 'count', 'stock')
+    ]
+    return product_rows, brand_rows
+
+
+def reconcile_branch(branch_id, recount_products=False, fix=True):
+    """Recompute the counters of one branch (None: rows without a branch).
+    Returns the list of Drift found; writes the fixes unless fix is False."""
+    drifts = []
+    with transaction.atomic():
+        phone_rows, phone_brand_rows = _phone_rows(branch_id)
+        product_rows, product_brand_rows = _product_rows(branch_id, recount_products)
+        updates = [
+            (Phone, _collect(Phone, phone_rows, drifts)),
+            (PhoneBrand, _collect(PhoneBrand, phone_brand_rows, drifts)),
+            (Product, _collect(Product, product_rows, drifts)),
+            (ProductBrand, _collect(ProductBrand, product_brand_rows, drifts)),
+        ]
+        if fix:
+            for model, deltas in updates:
+                _shift(model, deltas)
+    if fix and drifts:
+        enterprise_id = Branch.objects.filter(pk=branch_id).values_list('enterprise_id', flat=True).first()
+        if enterprise_id:
+            valuation.invalidate(enterprise_id, branch_id)
+            if any(drift.model.startswith('allinventory.') for drift in drifts):
+                versions.touch(enterprise_id, branch_id)
+    return drifts
+
+
+def branches(enterprise_id=None):
+    """Branch ids to walk; rows without a branch come last (unless scoped)."""
+    ids = Branch.objects.order_by('id')
+    if enterprise_id is not None:
+        ids = ids.filter(enterprise_id=enterprise_id)
+    ids = list(ids.values_list('id', flat=True))
+    if enterprise_id is None:
+        ids.append(None)
+    return ids
@@ -0,0 +1,124 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, FloatField, Max, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import CustomerAccount, Sales, SalesTransaction
+
+
+# Customer totals. A CustomerAccount is one phone number at one enterprise.
+# total_spent, visits and last_visit are moved by the sales and sales return
+# serializers with one atomic UPDATE ... SET x = x + delta per bill, so the
+# checkout panel reads a single row instead of summing every bill of the
+# phone number. rebuild() recomputes them from the bills with grouped
+# aggregates for accounts that predate this or drifted.
+
+BATCH_SIZE = 1000
+TOTAL_FIELDS = ['total_spent', 'visits', 'last_visit']
+
+def record(enterprise_id, phone_number, amount, visits=0, day=None, name=None):
+    """Add amount to a customer's spend and visits to their visit count;
+    a visit on day moves last_visit forward. Bills without a phone number
+    belong to no customer."""
+    if not phone_number:
+        return
+    changes = {
+        'total_spent': Coalesce(F('total_spent'), Value(0.0)) + amount,
+        'visits': F('visits') + visits,
+    }
+    if day is not None and visits > 0:
+        changes['last_visit'] = Case(When(last_visit__gte=day, then=F('last_visit')), default=Value(day))
+    accounts = CustomerAccount.objects.filter(enterprise_id=enterprise_id, phone_number=phone_number)
+    if accounts.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            CustomerAccount.objects.create(
+                phone_number=phone_number, enterprise_id=enterprise_id, name=name or '',
+                total_spent=amount, visits=max(visits, 0), last_visit=day if visits > 0 else None,
+            )
+    except IntegrityError:
+        accounts.update(**changes)
+
+
+def _totals(bills, returned):
+    """{(enterprise_id, phone_number): (values, name)} from grouped aggregates
+    of the bills and their returned lines."""
+    refunds = {
+        (row['sales_transaction__enterprise_id'], row['sales_transaction__phone_number']): row['total']
+        for row in returned.values('sales_transaction__enterprise_id', 'sales_transaction__phone_number')
+        .annotate(total=Sum('total_price')).order_by()
+    }
+    rows = bills.values('enterprise_id', 'phone_number').annotate(
+        spent=Coalesce(Sum('total_amount'), Value(0.0), output_field=FloatField()),
+        bill_count=Count('id'), last=Max('date'), customer_name=Max('name'),
+    ).order_by()
+    totals = {}
+    for row in rows.iterator():
+        key = (row['enterprise_id'], row['phone_number'])
+        values = {
+            'total_spent': row['spent'] - (refunds.get(key) or 0),
+            'visits': row['bill_count'],
+            'last_visit': row['last'],
+        }
+        totals[key] = (values, row['customer_name'] or '')
+    return totals
+
+
+def _overwrite(pending):
+    """Write (pk, stored, values) triples in one locked transaction per
+    batch, skipping accounts whose stored totals moved since they were read:
+    a sale committed after the aggregates would be lost by the overwrite.
+    Returns the number of accounts written."""
+    written = 0
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            current = CustomerAccount.objects.select_for_update(no_key=True).filter(
+                pk__in=[pk for pk, _, _ in batch]
+            ).order_by('id').only(*TOTAL_FIELDS).in_bulk()
+            changed = []
+            for pk, stored, values in batch:
+                account = current.get(pk)
+                if account is None or _stored(account) != stored:
+                    continue
+                for field, value in values.items():
+                    setattr(account, field, value)
+                changed.append(account)
+            CustomerAccount.objects.bulk_update(changed, TOTAL_FIELDS)
+        written += len(changed)
+    return written
+
+
+def _stored(account):
+    return tuple(getattr(account, field) for field in TOTAL_FIELDS)
+
+
+def rebuild(enterprise_id=None, missing_only=False):
+    """Recompute every customer's totals from their bills, or with
+    missing_only only create the accounts that do not exist yet. Accounts
+    that a sale moved while the totals were computed are left for the next
+    run. Returns the number of accounts written."""
+    bills = SalesTransaction.objects.exclude(phone_number__isnull=True).exclude(phone_number='')
+    returned = Sales.objects.filter(returned=True).exclude(sales_transaction__phone_number__isnull=True)
+    accounts = CustomerAccount.objects.all()
+    if enterprise_id is not None:
+        bills = bills.filter(enterprise_id=enterprise_id)
+        returned = returned.filter(sales_transaction__enterprise_id=enterprise_id)
+        accounts = accounts.filter(enterprise_id=enterprise_id)
+    # Read before the aggregates, so any later change shows up as a mismatch
+    existing = {
+        (account.enterprise_id, account.phone_number): account
+        for account in accounts.only('enterprise_id', 'phone_number', *TOTAL_FIELDS).iterator()
+    }
+    pending = []
+    created = []
+    for key, (values, name) in _totals(bills, returned).items():
+        account = existing.get(key)
+        if account is None:
+            created.append(CustomerAccount(enterprise_id=key[0], phone_number=key[1], name=name, **values))
+        elif not missing_only:
+            pending.append((account.pk, _stored(account), values))
+    written = 0 if missing_only else _overwrite(pending)
+    # A sale may have opened the account meanwhile; its row wins
+    CustomerAccount.objects.bulk_create(created, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return written + len(created)
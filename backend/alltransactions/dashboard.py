@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Purchase, PurchaseTransaction, Sales, SalesTransaction
+
+
+# Dashboard figures. Every figure of the enterprise landing page comes from
+# four grouped aggregates (bill totals and line counts for purchases and
+# sales), each covering the requested range and today with filtered SUMs and
+# grouped by branch. The enterprise figures are the sum of the branch rows,
+# so the per-branch breakdown costs no extra query.
+
+FIELDS = ('purchases', 'ptamt', 'sales', 'stamt', 'profit')
+
+PROFIT = ExpressionWrapper(
+    F('quantity') * (F('unit_price') - Coalesce(F('product__cost_price'), Value(0.0))), output_field=FloatField()
+)
+
+
+def _grouped(queryset, prefix, in_range, is_today, **figures):
+    """Yield (branch id, period, figure, value) for each figure, where a figure
+    is an aggregate class and the field it applies to."""
+    aggregates = {}
+    for name, (aggregate, field) in figures.items():
+        aggregates[f'month_{name}'] = aggregate(field, filter=in_range)
+        aggregates[f'day_{name}'] = aggregate(field, filter=is_today)
+    rows = queryset.filter(in_range | is_today).values(f'{prefix}branch').annotate(**aggregates).order_by()
+    for row in rows:
+        for name in figures:
+            yield row[f'{prefix}branch'], 'monthly', name, row[f'month_{name}'] or 0
+            yield row[f'{prefix}branch'], 'daily', name, row[f'day_{name}'] or 0
+
+
+def figures(enterprise, start, end, today):
+    """Return {branch id: {'monthly': {...}, 'daily': {...}}} for the
+    enterprise; bills without a branch are under None."""
+    branches = defaultdict(lambda: {period: dict.fromkeys(FIELDS, 0) for period in ('monthly', 'daily')})
+
+    def collect(queryset, prefix, **figures):
+        in_range = Q(**{f'{prefix}date__range': (start, end)})
+        is_today = Q(**{f'{prefix}date': today})
+        for branch, period, name, value in _grouped(queryset, prefix, in_range, is_today, **figures):
+            branches[branch][period][name] += value
+
+    collect(PurchaseTransaction.objects.filter(enterprise=enterprise), '', ptamt=(Sum, 'total_amount'))
+    collect(SalesTransaction.objects.filter(enterprise=enterprise), '', stamt=(Sum, 'total_amount'))
+    collect(
+        Purchase.objects.filter(purchase_transaction__enterprise=enterprise), 'purchase_transaction__',
+        purchases=(Count, 'id'),
+    )
+    collect(
+        Sales.objects.filter(sales_transaction__enterprise=enterprise), 'sales_transaction__',
+        sales=(Count, 'id'), profit=(Sum, PROFIT),
+    )
+    return dict(branches)
+
+
+def total(branches):
+    """Fold the branch figures of figures() into enterprise figures."""
+    result = {period: dict.fromkeys(FIELDS, 0) for period in ('monthly', 'daily')}
+    for periods in branches.values():
+        for period, values in periods.items():
+            for name, value in values.items():
+                result[period][name] += value
+    return result
@@ -0,0 +1,30 @@
+from django.db import connection
+
+
+# Shared posting for every running balance (vendor, debtor, staff, EMI debtor).
+# The delta is applied by the database in one statement, so concurrent
+# postings to the same account never read a stale `due` or overwrite each
+# other, and the new balance comes back without a second query.
+
+def post(model, pk, delta):
+    """Add delta to model(pk).due and return the resulting due."""
+    meta = model._meta
+    table = connection.ops.quote_name(meta.db_table)
+    due = connection.ops.quote_name(meta.get_field('due').column)
+    key = connection.ops.quote_name(meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {due} = COALESCE({due}, 0) + %s WHERE {key} = %s RETURNING {due}",
+            [delta or 0, pk],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def repost(model, old_pk, old_amount, new_pk, new_amount):
+    """Move a posting of -old_amount on old_pk to -new_amount on new_pk.
+    Returns the resulting due of new_pk."""
+    if old_pk == new_pk:
+        return post(model, new_pk, (old_amount or 0) - (new_amount or 0))
+    post(model, old_pk, old_amount)
+    return post(model, new_pk, -(new_amount or 0))
@@ -0,0 +1,214 @@
+import threading
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from allinventory import uids, versions
+from allinventory.models import Brand as ProductBrand, Product
+from enterprise.models import Branch, MergeJob
+from enterprise.serializers import MergeJobSerializer
+from inventory import valuation
+from inventory.models import Brand as PhoneBrand, Phone
+
+
+# Branch catalog merge. The target's brand (or item) names are read with one
+# query, the source rows with another, and whatever the target lacks is
+# inserted with bulk_create in chunks, so cloning a large catalog costs a
+# handful of statements per chunk instead of a query per row. A MergeJob runs
+# the same merge in a background thread and records its progress; jobs left
+# behind by a restart are failed (or resumed) at boot by recover_merge_jobs.
+
+BATCH_SIZE = 500
+
+CATALOGS = {
+    'phone': (PhoneBrand, Phone, ['name', 'cost_price', 'selling_price']),
+    'product': (ProductBrand, Product, ['name', 'uid', 'cost_price', 'selling_price']),
+}
+
+
+def _chunks(rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        yield rows[start:start + BATCH_SIZE]
+
+
+def merge_brands(kind, source_id, target_id, progress=None):
+    """Copy the brands of source missing (by name) from target.
+    Returns the new brands."""
+    brand_model = CATALOGS[kind][0]
+    existing = {name.lower() for name in brand_model.objects.filter(branch_id=target_id).values_list('name', flat=True)}
+    missing = []
+    for brand in brand_model.objects.filter(branch_id=source_id).only('name', 'enterprise_id').order_by('id'):
+        if brand.name.lower() not in existing:
+            existing.add(brand.name.lower())
+            missing.append(brand_model(name=brand.name, enterprise_id=brand.enterprise_id, branch_id=target_id))
+
+    created = []
+    for chunk in _chunks(missing):
+        created += brand_model.objects.bulk_create(chunk)
+        if progress:
+            progress(len(created), len(missing))
+    return created
+
+
+def merge_items(kind, source_id, target_id, brand, progress=None):
+    """Copy the phones/products of source filed under a brand named like
+    brand (a target branch brand) that target lacks. Products keep their
+    vendor links and their uid, unless another target product already has
+    it; such a copy gets a fresh uid. Returns the number of rows created."""
+    brand_model, item_model, fields = CATALOGS[kind]
+    source = item_model.objects.filter(branch_id=source_id, brand__name__iexact=brand.name).order_by('id')
+    # The brand's names and, for products, the uids the copies would clash on
+    target = Q(brand=brand)
+    if item_model is Product:
+        source = source.prefetch_related('vendor')
+        target |= Q(uid__in=source.exclude(uid='').values('uid'))
+    existing = set()
+    taken = set()
+    for item in item_model.objects.filter(target, branch_id=target_id).only('brand_id', 'name', *fields):
+        if item.brand_id == brand.id:
+            existing.add(item.name.lower())
+        if getattr(item, 'uid', ''):
+            taken.add(item.uid)
+
+    missing = []
+    for item in source:
+        if item.name.lower() in existing:
+            continue
+        existing.add(item.name.lower())
+        copy = item_model(
+            enterprise_id=item.enterprise_id, branch_id=target_id, brand_id=brand.id,
+            **{field: getattr(item, field) for field in fields}
+        )
+        if getattr(copy, 'uid', '') in taken:
+            copy.uid = ''
+        missing.append((copy, item))
+    if item_model is Product:
+        uids.assign([copy for copy, _ in missing])
+
+    done = 0
+    for chunk in _chunks(missing):
+        with transaction.atomic():
+            created = item_model.objects.bulk_create([copy for copy, _ in chunk])
+            if item_model is Product:
+                through = Product.vendor.through
+                through.objects.bulk_create([
+                    through(product_id=copy.pk, vendor_id=vendor.pk)
+                    for copy, (_, item) in zip(created, chunk)
+                    for vendor in item.vendor.all()
+                ])
+        done += len(created)
+        if progress:
+            progress(done, len(missing))
+    return done
+
+
+def merge(kind, source_id, target_id, brand=None, items=False, progress=None):
+    """Merge brands (brand None) or one brand's items from source into
+    target. With items, the items of every source brand follow too."""
+    brand_model = CATALOGS[kind][0]
+    if brand is not None:
+        return merge_items(kind, source_id, target_id, brand, progress)
+    created = len(merge_brands(kind, source_id, target_id, None if items else progress))
+    if items:
+        brands = list(brand_model.objects.filter(branch_id=target_id))
+        done = 0
+        for index, target_brand in enumerate(brands, 1):
+            done += merge_items(kind, source_id, target_id, target_brand)
+            if progress:
+                progress(index, len(brands))
+        created += done
+    return created
+
+
+def run(job_id):
+    """Execute a queued MergeJob, recording progress on the job row."""
+    job = MergeJob.objects.get(pk=job_id)
+    MergeJob.objects.filter(pk=job_id).update(status='running')
+
+    def progress(done, total):
+        MergeJob.objects.filter(pk=job_id).update(done=done, total=total, updated_at=timezone.now())
+
+    brand = CATALOGS[job.kind][0].objects.get(pk=job.brand) if job.brand else None
+    try:
+        merge(job.kind, job.source_id, job.target_id, brand=brand, items=job.items, progress=progress)
+    except Exception as exc:
+        MergeJob.objects.filter(pk=job_id).update(status='failed', error=str(exc), updated_at=timezone.now())
+        raise
+    else:
+        MergeJob.objects.filter(pk=job_id).update(status='done', updated_at=timezone.now())
+    finally:
+        valuation.invalidate(job.enterprise_id, job.target_id)
+        if job.kind == 'product':
+            versions.touch(job.enterprise_id, job.target_id)
+
+
+def _run_in_thread(job_id):
+    try:
+        run(job_id)
+    finally:
+        connection.close()
+
+
+def recover(resume=False):
+    """Deal with jobs whose thread died with its process: mark every queued or
+    running job failed, or with resume run it again (merges only add what the
+    target lacks, so a rerun finishes the job). Only call this while no web
+    process is running jobs. Returns the jobs handled."""
+    stale = list(MergeJob.objects.filter(status__in=['queued', 'running']).values_list('pk', flat=True))
+    for job_id in stale:
+        if resume:
+            try:
+                run(job_id)
+            except Exception:
+                pass  # recorded on the job by run()
+        else:
+            MergeJob.objects.filter(pk=job_id).update(
+                status='failed', error="Interrupted by a server restart; start the merge again",
+                updated_at=timezone.now(),
+            )
+    return stale
+
+
+def enqueue(**fields):
+    """Create a MergeJob and start it once the request's transaction commits."""
+    job = MergeJob.objects.create(**fields)
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True).start()
+    )
+    return job
+
+
+class BranchMergeMixin:
+    """Merge endpoints of inventory and allinventory. The merge runs inline
+    by default; ?background=true queues a MergeJob and answers 202 with it,
+    to be polled at enterprise/mergejob/<id>/. ?items=true on a brand merge
+    copies every brand's items along with the brands."""
+    kind = None
+
+    def merge(self, request, selfbranch, mergebranch, brand=None):
+        enterprise = request.user.person.enterprise
+        if Branch.objects.filter(enterprise=enterprise, id__in=[selfbranch, mergebranch]).count() != len({selfbranch, mergebranch}):
+            return Response({"error": "Unknown branch"}, status=status.HTTP_404_NOT_FOUND)
+        brand_model = CATALOGS[self.kind][0]
+        if brand is not None:
+            brand = brand_model.objects.filter(id=brand, enterprise=enterprise).first()
+            if brand is None:
+                return Response({"error": "Unknown brand"}, status=status.HTTP_404_NOT_FOUND)
+        items = request.GET.get('items') == 'true'
+
+        if request.GET.get('background') == 'true':
+            job = enqueue(
+                enterprise=enterprise, source_id=mergebranch, target_id=selfbranch, kind=self.kind,
+                brand=brand.id if brand else None, items=items,
+            )
+            return Response(MergeJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+        with transaction.atomic():
+            merge(self.kind, mergebranch, selfbranch, brand=brand, items=items)
+        valuation.invalidate(enterprise.id, selfbranch)
+        if self.kind == 'product':
+            versions.touch(enterprise.id, selfbranch)
+        return Response("Merged")
@@ -2,6 +2,7 @@ from django.db import models
 from allinventory.models import Brand
 from enterprise.models import Enterprise,Branch
 from django.db import transaction
+from . import ledger, search
 
 class Vendor(models.Model):
     name = models.CharField(max_length=255)
@@ -25,28 +26,33 @@ class PurchaseTransaction(models.Model):
     cheque_number = models.CharField(max_length=10,null=True,blank=True)
     cashout_date = models.DateField(null=True)
     person = models.ForeignKey('enterprise.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='all_purchase_transactions')
+    search_document = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
+
     def __str__(self):
         return f"{self.bill_no} - {self.vendor.name} at {self.branch.name if self.branch else 'Unknown Branch'} of {self.enterprise.name}"
 
-    def calculate_total_amount(self):
-        total = sum(purchase.total_price for purchase in self.purchase.all())
-        self.total_amount = total
-        self.save()
+    def calculate_total_amount(self, lines=None):
+        """Sum the lines (the in-memory ones when given) into total_amount,
+        writing that column alone."""
+        lines = self.purchase.all() if lines is None else lines
+        self.total_amount = sum(purchase.total_price for purchase in lines)
+        PurchaseTransaction.objects.filter(pk=self.pk).update(total_amount=self.total_amount)
         return self.total_amount
-    
-    def save(self, *args, **kwargs):
-        if self.pk is None:
-            super().save(*args, **kwargs)
-        
-        # Now the instance is saved, we can safely filter related Items
-        #print("Calculating quantity......................")
-        self.total_amount = Purchase.objects.filter(purchase_transaction=self).aggregate(models.Sum('total_price'))['total_price__sum']
 
-        # Call save again to update the quantity field
-        super().save()
+    def build_search_document(self, lines=None):
+        lines = self.purchase.select_related('product') if lines is None else lines
+        return search.document(self.bill_no, self.vendor.name, *(line.product.name for line in lines))
+
+    def update_search_document(self):
+        self.search_document = self.build_search_document()
+        PurchaseTransaction.objects.filter(pk=self.pk).update(search_document=self.search_document)
 
 class PurchaseReturn(models.Model):
     date = models.DateField(auto_now_add=True)
+    bill_no = models.CharField(max_length=20, blank=True, default='')
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE,related_name='all_purchase_return')
     branch = models.ForeignKey(Branch,related_name='purchase_return',on_delete=models.CASCADE, null=True, blank=True)
     purchase_transaction = models.ForeignKey(PurchaseTransaction, on_delete=models.CASCADE,related_name='purchase_return')
@@ -75,15 +81,10 @@ class Purchase(models.Model):
         return f"Purchase {self.pk} - {self.product.name} at {self.purchase_transaction.branch.name if self.purchase_transaction.branch else 'Unknown Branch'} of {self.purchase_transaction.enterprise.name}"
 
     def save(self, *args, **kwargs):
-        if self.pk is None:
-            super().save(*args, **kwargs)
-        
-        # Now the instance is saved, we can safely filter related Items
-        #print("Calculating quantity......................")
+        # The line total is set before the single write; bulk_create callers
+        # set it themselves (see serializers.priced_lines).
         self.total_price = self.quantity * self.unit_price
-
-        # Call save again to update the quantity field
-        super().save()
+        super().save(*args, **kwargs)
 
 class SalesTransaction(models.Model):
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE,related_name='all_sales_transaction')
@@ -100,31 +101,34 @@ class SalesTransaction(models.Model):
     credited_amount = models.FloatField(null=True,blank=True,default=0)
     amount_paid = models.FloatField(null=True,blank=True,default=0)
     person = models.ForeignKey('enterprise.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='all_sales_transactions')
+    search_document = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
 
     def __str__(self):
         return f"Sales Transaction {self.pk} - {self.branch.name} at {self.enterprise.name}"
     
-    def calculate_total_amount(self):
-        total = sum(sales.total_price for sales in self.sales.all())
-        self.total_amount = total - self.discount   
-
-        self.save()
+    def calculate_total_amount(self, lines=None):
+        """Sum the lines (the in-memory ones when given) less the discount
+        into total_amount, writing that column alone."""
+        lines = self.sales.all() if lines is None else lines
+        self.total_amount = sum(sales.total_price for sales in lines) - (self.discount or 0)
+        SalesTransaction.objects.filter(pk=self.pk).update(total_amount=self.total_amount)
         return self.total_amount
-    
-    def save(self, *args, **kwargs):
-        if self.pk is None:
-            super().save(*args, **kwargs)
-        
-        # # Now the instance is saved, we can safely filter related Items
-        # #print("Calculating quantity......................")
-        # self.total_amount = Sales.objects.filter(sales_transaction=self).aggregate(models.Sum('total_price'))['total_price__sum']
 
-        # # Call save again to update the quantity field
-        super().save()
+    def build_search_document(self, lines=None):
+        lines = self.sales.select_related('product') if lines is None else lines
+        return search.document(self.bill_no, self.name, self.phone_number, *(line.product.name for line in lines))
+
+    def update_search_document(self):
+        self.search_document = self.build_search_document()
+        SalesTransaction.objects.filter(pk=self.pk).update(search_document=self.search_document)
 
 
 class SalesReturn(models.Model):
     date = models.DateField(auto_now_add=True)
+    bill_no = models.CharField(max_length=20, blank=True, default='')
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE,related_name='sales_return')
     branch = models.ForeignKey(Branch,related_name='sales_return',on_delete=models.CASCADE, null=True, blank=True)
     sales_transaction = models.ForeignKey(SalesTransaction, on_delete=models.CASCADE,related_name='sales_return')
@@ -151,15 +155,10 @@ class Sales(models.Model):
         return f"Sales {self.pk} - {self.product.name} at {self.sales_transaction.branch.name if self.sales_transaction.branch else 'Unknown Branch'} of {self.sales_transaction.enterprise.name}"
 
     def save(self, *args, **kwargs):
-        if self.pk is None:
-            super().save(*args, **kwargs)
-        
-        # Now the instance is saved, we can safely filter related Items
-        #print("Calculating quantity......................")
+        # The line total is set before the single write; bulk_create callers
+        # set it themselves (see serializers.priced_lines).
         self.total_price = self.quantity * self.unit_price
-
-        # Call save again to update the quantity field
-        super().save()
+        super().save(*args, **kwargs)
 
 class VendorTransactions(models.Model):
 
@@ -176,13 +175,16 @@ class VendorTransactions(models.Model):
     base = models.BooleanField(default=False)
     type = models.CharField(max_length=20,choices=(('base','base'),('return','return'),('payment','payment')),default='base')
     due = models.FloatField(null=True,blank=True,default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
+
     def __str__(self):
         return f"Vendor Transaction {self.pk} - {self.vendor.name} at {self.branch.name if self.branch else 'Unknown Branch'} of {self.enterprise.name}"
 
     @transaction.atomic
     def delete(self, *args, **kwargs):
-        self.vendor.due = self.vendor.due + self.amount if self.vendor.due is not None else self.amount
-        self.vendor.save() 
+        ledger.post(Vendor, self.vendor_id, self.amount)
         super().delete(*args, **kwargs)
 
 
@@ -207,23 +209,34 @@ class StaffTransactions(models.Model):
     enterprise = models.ForeignKey('enterprise.Enterprise', on_delete=models.CASCADE,related_name='all_staff_transactions')
     branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE, null=True, blank=True)
     desc = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
     
     def __str__(self):
         return f"Staff Transaction {self.pk} - {self.staff.name} at {self.branch.name if self.branch else 'Unknown Branch'} of {self.enterprise.name}"
 
     @transaction.atomic
     def delete(self, *args, **kwargs):
-        self.staff.due = self.staff.due + self.amount
-        self.staff.save() 
+        ledger.post(Staff, self.staff_id, self.amount)
         super().delete(*args, **kwargs)
 
 
-class Customer(models.Model):
+class CustomerAccount(models.Model):
+    """A phone number's spend at one enterprise; the same number at another
+    enterprise is another account. Kept by alltransactions.customers."""
     name = models.CharField(max_length=255)
-    phone_number = models.CharField(primary_key=True,max_length=10,blank=True)
+    phone_number = models.CharField(max_length=10,blank=True)
     total_spent = models.FloatField(null=True,blank=True,default=0)
+    visits = models.IntegerField(default=0)
+    last_visit = models.DateField(null=True, blank=True)
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE,related_name='customers')
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'phone_number'], name='unique_customer_phone'),
+        ]
+
     def __str__(self):
         return f"{self.name} - {self.enterprise.name}"
 
@@ -253,13 +266,48 @@ class DebtorTransaction(models.Model):
     desc = models.TextField(null=True, blank=True)
     inventory = models.CharField(max_length=20, choices=(('all','all'),('phone','phone')), null=True, blank=True)
     due = models.FloatField(null=True, blank=True, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
     
     def __str__(self):
         return f"Debtor Transaction {self.pk} - {self.debtor.name} at {self.branch.name if self.branch else 'Unknown Branch'} of {self.enterprise.name}"
     
     @transaction.atomic
     def delete(self, *args, **kwargs):
-        self.debtor.due = self.debtor.due + self.amount if self.debtor.due is not None else self.amount
-        self.debtor.save() 
+        ledger.post(Debtor, self.debtor_id, self.amount)
         super().delete(*args, **kwargs)
     
+
+
+class ProductStockSnapshot(models.Model):
+    """Net quantity of a product moved (purchases minus sales, returns
+    excluded) up to and including date. Product reports start from the
+    latest snapshot before their range; see movements.py."""
+    product = models.ForeignKey('allinventory.Product', on_delete=models.CASCADE, related_name='stock_snapshots')
+    date = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_stock_snapshot_per_day'),
+        ]
+
+    def __str__(self):
+        return f"Stock of product {self.product_id} on {self.date}: {self.quantity}"
+
+
+class BillSequence(models.Model):
+    """Next bill number of one kind of document in a branch; see bills.py."""
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='bill_sequences')
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='bill_sequences', null=True, blank=True)
+    kind = models.CharField(max_length=10, choices=(('sales', 'Sales'), ('purchase', 'Purchase'), ('return', 'Return')))
+    next_value = models.BigIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'branch', 'kind'], name='unique_bill_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} bills of {self.branch_id} at {self.next_value}"
@@ -0,0 +1,133 @@
+import datetime
+
+from django.db import connection
+from django.db.models import CharField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ProductStockSnapshot, Purchase, Sales
+
+
+# Product movement ledger. The quantity on hand before a report range is the
+# latest ProductStockSnapshot before it plus two Sum aggregates over the
+# movements since; the rows in range come from one UNION ALL of purchase and
+# sale lines, ordered by date in the database, with the running quantity
+# computed by SUM() OVER the same order. Returned lines are not movements.
+# Any write touching a product's lines drops its snapshots from the line's
+# date on (invalidate), so a snapshot never covers a changed movement.
+
+BATCH_SIZE = 1000
+COLUMNS = ['id', 'type', 'date', 'quantity', 'unit_price', 'total_price', 'transaction', 'product', 'product_name']
+SOURCE_COLUMNS = ['row_' + column for column in COLUMNS]
+
+
+def _purchases(product_id):
+    return Purchase.objects.filter(product_id=product_id, returned=False)
+
+
+def _sales(product_id):
+    return Sales.objects.filter(product_id=product_id, returned=False)
+
+
+def _rows(queryset, kind, txn, sign):
+    # Every column is an annotation so both sides of the UNION keep these
+    # names and this order.
+    return queryset.annotate(
+        row_id=F('id'),
+        row_type=Value(kind, output_field=CharField()),
+        row_date=F(f'{txn}__date'),
+        row_quantity=F('quantity'),
+        row_unit_price=F('unit_price'),
+        row_total_price=F('total_price'),
+        row_transaction=F(txn),
+        row_product=F('product'),
+        row_product_name=F('product__name'),
+        row_delta=F('quantity') * sign,
+    ).values_list(*SOURCE_COLUMNS, 'row_delta').order_by()
+
+
+def _net(product_id, after=None, before=None):
+    """Purchased minus sold strictly between after and before (dates)."""
+    totals = []
+    for queryset, txn in ((_purchases(product_id), 'purchase_transaction'), (_sales(product_id), 'sales_transaction')):
+        if after:
+            queryset = queryset.filter(**{f'{txn}__date__gt': after})
+        if before:
+            queryset = queryset.filter(**{f'{txn}__date__lt': before})
+        totals.append(queryset.aggregate(total=Coalesce(Sum('quantity'), 0))['total'])
+    return totals[0] - totals[1]
+
+
+def opening_quantity(product_id, start):
+    """Quantity on hand at the start of the day start."""
+    snapshot = ProductStockSnapshot.objects.filter(product_id=product_id, date__lt=start).order_by('-date').first()
+    if snapshot is None:
+        return _net(product_id, before=start)
+    return snapshot.quantity + _net(product_id, after=snapshot.date, before=start)
+
+
+def ledger(product_id, start=None, end=None, opening=0):
+    """Movement rows in [start, end], oldest first, each with the quantity
+    on hand after it as `balance`."""
+    purchases = _purchases(product_id)
+    sales = _sales(product_id)
+    if start:
+        purchases = purchases.filter(purchase_transaction__date__gte=start)
+        sales = sales.filter(sales_transaction__date__gte=start)
+    if end:
+        purchases = purchases.filter(purchase_transaction__date__lte=end)
+        sales = sales.filter(sales_transaction__date__lte=end)
+    union = _rows(purchases, 'purchase', 'purchase_transaction', 1).union(
+        _rows(sales, 'sales', 'sales_transaction', -1), all=True
+    )
+    sql, params = union.query.sql_with_params()
+    order = "m.row_date, m.row_type, m.row_id"
+    query = (
+        f"SELECT {', '.join(f'm.{column}' for column in SOURCE_COLUMNS)}, "
+        f"%s + SUM(m.row_delta) OVER (ORDER BY {order} ROWS UNBOUNDED PRECEDING) "
+        f"FROM ({sql}) AS m ORDER BY {order}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(query, [opening, *params])
+        for row in cursor:
+            item = dict(zip(COLUMNS + ['balance'], row))
+            if isinstance(item['date'], str):
+                item['date'] = datetime.date.fromisoformat(item['date'])
+            item[f"{item['type']}_transaction"] = item.pop('transaction')
+            item['returned'] = False
+            yield item
+
+
+def invalidate(product_ids, since):
+    """Drop the snapshots a change to these products' lines on or after
+    since could have made stale."""
+    ProductStockSnapshot.objects.filter(product_id__in=product_ids, date__gte=since).delete()
+
+
+def invalidate_lines(lines, since):
+    """invalidate() for every product on a transaction's lines queryset."""
+    invalidate(Subquery(lines.values('product_id')), since)
+
+
+def take_snapshots(day, products=None):
+    """Record every product's net quantity through day with two grouped
+    aggregates. Returns the number of snapshots written."""
+    from allinventory.models import Product
+
+    def moved(model, txn):
+        return Coalesce(Subquery(
+            model.objects.filter(product=OuterRef('pk'), returned=False, **{f'{txn}__date__lte': day})
+            .values('product').annotate(total=Sum('quantity')).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+
+    products = products if products is not None else Product.objects.all()
+    rows = products.annotate(
+        bought=moved(Purchase, 'purchase_transaction'), sold=moved(Sales, 'sales_transaction')
+    ).values_list('id', 'bought', 'sold')
+    snapshots = [
+        ProductStockSnapshot(product_id=pk, date=day, quantity=bought - sold)
+        for pk, bought, sold in rows.iterator(chunk_size=BATCH_SIZE)
+    ]
+    ProductStockSnapshot.objects.filter(date=day, product__in=products).delete()
+    ProductStockSnapshot.objects.bulk_create(snapshots, batch_size=BATCH_SIZE)
+    return len(snapshots)
@@ -0,0 +1,103 @@
+import base64
+import binascii
+from datetime import date
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Pagination for transaction and ledger lists. Page numbers stay the default.
+# With ?cursor= the list is walked by its (date, id) key instead: each page is
+# one range scan from the last row seen, so a page deep in the history costs
+# the same as the first one, and COUNT(*) only runs when ?count=true asks.
+
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 100
+
+
+class TransactionPagination(BasePagination):
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return min(max(size, 1), MAX_PAGE_SIZE)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        if self.cursor_query_param not in request.query_params:
+            self.page_numbers = PageNumberPagination()
+            self.page_numbers.page_size = self.page_size
+            self.page_numbers.page_size_query_param = self.page_size_query_param
+            self.page_numbers.max_page_size = MAX_PAGE_SIZE
+            return self.page_numbers.paginate_queryset(queryset, request, view)
+        self.page_numbers = None
+
+        self.count = queryset.count() if request.query_params.get(self.count_query_param) == 'true' else None
+        token = request.query_params[self.cursor_query_param]
+        reverse, position = self.decode_cursor(token) if token else (False, None)
+
+        if position is None:
+            queryset = queryset.order_by('-date', '-id')
+        elif reverse:
+            queryset = queryset.filter(
+                Q(date__gt=position[0]) | Q(date=position[0], id__gt=position[1])
+            ).order_by('date', 'id')
+        else:
+            queryset = queryset.filter(
+                Q(date__lt=position[0]) | Q(date=position[0], id__lt=position[1])
+            ).order_by('-date', '-id')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows:
+            first, last = rows[0], rows[-1]
+            if has_more or reverse:
+                self.next_position = (last.date, last.id)
+            if (has_more and reverse) or (position is not None and not reverse):
+                self.previous_position = (first.date, first.id)
+        return rows
+
+    def decode_cursor(self, token):
+        try:
+            direction, day, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            return direction == 'p', (date.fromisoformat(day), int(pk))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, reverse, position):
+        token = f"{'p' if reverse else 'n'}|{position[0].isoformat()}|{position[1]}"
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, base64.urlsafe_b64encode(token.encode()).decode())
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(False, self.next_position)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(True, self.previous_position)
+
+    def get_paginated_response(self, data):
+        if self.page_numbers is not None:
+            return self.page_numbers.get_paginated_response(data)
+        payload = {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return Response(payload)
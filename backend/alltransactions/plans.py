@@ -0,0 +1,16 @@
+# Query plans for list and detail views. A view names the relations its
+# serializer reads: select_related for the forward keys behind the *_name
+# fields, prefetch_related (usually a Prefetch with its own select_related)
+# for nested line items. plan() applies them, so a page costs the same
+# number of queries whatever its size.
+
+
+class QueryPlanMixin:
+    select_related = ()
+    prefetch_related = ()
+
+    def plan(self, queryset):
+        return queryset.select_related(*self.select_related).prefetch_related(*self.prefetch_related)
+
+    def get_queryset(self):
+        return self.plan(super().get_queryset())
@@ -0,0 +1,118 @@
+import re
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+# Transaction search. Each searchable transaction keeps a denormalised
+# `search_document`: the lower-cased words of its bill no, party and line
+# items (phone/product names, IMEIs), each preceded by a space. A leading
+# space in the pattern therefore means "word starts with". On PostgreSQL the
+# column carries a pg_trgm GIN index, so substring matches are index scans
+# and misspelt names still match through the indexable `%>` word similarity
+# operator, whose threshold is set on every new connection. The similarity
+# value itself is only computed to order the matches.
+#
+# An empty document marks a row that was never indexed; a transaction with
+# nothing searchable stores a single space instead, so rebuild() does not
+# visit it again on every boot.
+
+SEARCH_MODELS = [
+    'transaction.PurchaseTransaction',
+    'transaction.SalesTransaction',
+    'alltransactions.PurchaseTransaction',
+    'alltransactions.SalesTransaction',
+]
+SIMILARITY = 0.4
+WORD = re.compile(r'\w+')
+
+
+def document(*parts):
+    words = []
+    for part in parts:
+        if part:
+            words.extend(WORD.findall(str(part).lower()))
+    if not words:
+        return ' '
+    return ' ' + ' '.join(dict.fromkeys(words)) + ' '
+
+
+def rebuild(model, related, lines, everything=False, batch_size=500):
+    """Write the search_document of model's rows that have none (all rows
+    with everything) through build_search_document, batch_size rows per
+    UPDATE. related is select_related onto the rows, lines the prefetch of
+    their line items. Returns the number of rows written."""
+    queryset = model.objects.select_related(*related).prefetch_related(lines).order_by('id')
+    if not everything:
+        queryset = queryset.filter(search_document='')
+    accessor = lines.split('__')[0]
+    written = 0
+    batch = []
+    for txn in queryset.iterator(chunk_size=batch_size):
+        txn.search_document = txn.build_search_document(getattr(txn, accessor).all())
+        batch.append(txn)
+        if len(batch) >= batch_size:
+            written += _save(model, batch)
+            batch = []
+    return written + _save(model, batch)
+
+
+@transaction.atomic
+def _save(model, batch):
+    model.objects.bulk_update(batch, ['search_document'])
+    return len(batch)
+
+
+def rank(queryset, term):
+    """Filter queryset to the transactions matching term, best match first."""
+    words = WORD.findall(term.lower())
+    if not words:
+        return queryset.none()
+
+    prefix = Q()
+    contains = Q()
+    for word in words:
+        prefix &= Q(search_document__contains=' ' + word)
+        contains &= Q(search_document__contains=word)
+
+    ordering = ['-search_rank', '-date', '-id']
+    match = contains
+    if connections[queryset.db].vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        match |= Q(search_document__trigram_word_similar=term.lower())
+        queryset = queryset.annotate(similarity=TrigramWordSimilarity(term.lower(), 'search_document'))
+        ordering.insert(1, '-similarity')
+
+    return queryset.filter(match).annotate(
+        search_rank=Case(
+            When(bill_no__iexact=term.strip(), then=Value(3)),
+            When(prefix, then=Value(2)),
+            When(contains, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by(*ordering)
+
+
+def configure_connection(sender, connection, **kwargs):
+    """connection_created hook: the word similarity threshold used by `%>`."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"SET pg_trgm.word_similarity_threshold = {SIMILARITY}")
+
+
+def create_indexes(using='default', **kwargs):
+    """post_migrate hook: trigram indexes on every search_document column."""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for label in SEARCH_MODELS:
+            table = apps.get_model(label)._meta.db_table
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_search_trgm "
+                f"ON {connection.ops.quote_name(table)} USING gin (search_document gin_trgm_ops)"
+            )
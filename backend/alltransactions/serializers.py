@@ -4,8 +4,31 @@ from django.db import transaction
 from allinventory.models import Product,Brand
 from alltransactions.models import Staff,StaffTransactions, Debtor, DebtorTransaction
 from django.utils import timezone
+from . import bills, customers, ledger, movements, stock
 
 
+def priced_lines(model, rows, **fields):
+    """Unsaved purchase/sales lines with total_price already set, so a whole
+    bill is written with one bulk_create instead of two writes per line."""
+    lines = []
+    for row in rows:
+        line = model(**{key: value for key, value in row.items() if key != 'id'}, **fields)
+        line.total_price = line.quantity * line.unit_price
+        lines.append(line)
+    return lines
+
+
+def assign_bill_no(validated_data, kind):
+    """Number a new document that came without a bill_no from its branch's
+    sequence, inside the creating transaction; a typed-in number moves the
+    sequence past it instead."""
+    branch = validated_data.get('branch')
+    enterprise_id, branch_id = validated_data['enterprise'].pk, branch.pk if branch else None
+    if validated_data.get('bill_no'):
+        bills.claim(enterprise_id, branch_id, kind, validated_data['bill_no'])
+    else:
+        validated_data['bill_no'] = bills.allocate(enterprise_id, branch_id, kind)[0]
+
 
 class VendorSerializer(serializers.ModelSerializer):
     # brand_name = serializers.SerializerMethodField(read_only=True)
@@ -320,6 +343,7 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseTransaction
         fields = '__all__'
+        extra_kwargs = {'bill_no': {'required': False, 'allow_blank': True}}
 
     def _get_locked_product(self, product_id, cache):
         """
@@ -339,39 +363,24 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
 
                 raise serializers.ValidationError("PurchaseTransaction date must be today's date.")
         purchases = validated_data.pop('purchase')
+        lines = priced_lines(Purchase, purchases)
+        # The header total comes from the in-memory lines, so the header is
+        # written once and the lines in one bulk INSERT.
+        validated_data['total_amount'] = sum(line.total_price for line in lines)
+        assign_bill_no(validated_data, 'purchase')
+        # Lock every product and brand in id order, add the stock in one UPDATE
+        # each, before the line INSERTs take their foreign key locks
+        stock.apply(lines, 1)
         purchase_transaction = PurchaseTransaction.objects.create(**validated_data)
-        products_cache = {}
-        brands_cache = {}
+        for line in lines:
+            line.purchase_transaction = purchase_transaction
+        Purchase.objects.bulk_create(lines)
         desc = f'Purchase made for :\n'
-
-        
-
-
-        # Create each Purchase and update Product/Brand counts/stocks
         for purchase in purchases:
             desc += f"{purchase.get('product', {})} - {purchase.get('quantity', 0)} pcs, \n"
-            if not purchase.get('total_price'):
-                purchase['total_price'] = purchase['quantity'] * purchase['unit_price']
-            purchaseobj = Purchase.objects.create(purchase_transaction=purchase_transaction, **purchase)
-
-            # lock and cache product
-            product = self._get_locked_product(purchaseobj.product.id, products_cache)
-            product.count = (product.count + purchaseobj.quantity) if product.count is not None else purchaseobj.quantity
-            product.stock = (product.stock + purchaseobj.quantity * product.selling_price) if product.stock is not None else purchaseobj.quantity * product.selling_price
-
-            # lock and cache brand
-            brand_obj = product.brand
-            if brand_obj.id not in brands_cache:
-                brands_cache[brand_obj.id] = brand_obj
-            brand = brands_cache[brand_obj.id]
-            brand.count = (brand.count + purchaseobj.quantity) if brand.count is not None else purchaseobj.quantity
-            brand.stock = (brand.stock + purchaseobj.quantity * product.selling_price) if brand.stock is not None else purchaseobj.quantity * product.selling_price
-
-            product.save()
-            brand.save()
 
-        # Calculate total amount and record base transaction
-        amount = purchase_transaction.calculate_total_amount()
+        # Record base transaction
+        amount = purchase_transaction.total_amount
         vendor = purchase_transaction.vendor
 
         VendorTransactionSerializer().create({
@@ -415,6 +424,8 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                 'type': 'payment'
             })
 
+        movements.invalidate({line.product_id for line in lines}, purchase_transaction.date)
+        purchase_transaction.update_search_document()
         return purchase_transaction
 
     @transaction.atomic
@@ -424,6 +435,7 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
         old_method = instance.method
         old_total = instance.total_amount or 0
         old_date = instance.date
+        old_products = set(instance.purchase.values_list('product_id', flat=True))
 
         # Update transaction fields
         instance.vendor = validated_data.get('vendor', instance.vendor)
@@ -445,6 +457,8 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
         # Keep track of existing purchases
         existing_purchases = {purchase.id: purchase for purchase in instance.purchase.all()}
         new_purchase_ids = []
+        kept_lines = []
+        new_lines = []
 
         for purchase_data in purchases_data:
             purchase_id = purchase_data.get('id', None)
@@ -515,16 +529,15 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                     purchase_instance.total_price = purchase_instance.quantity * purchase_instance.unit_price
                 purchase_instance.save()
                 new_purchase_ids.append(purchase_instance.id)
+                kept_lines.append(purchase_instance)
                 del existing_purchases[purchase_id]
             else:
-                # Create new purchase
-                purchase_data['purchase_transaction'] = instance
-                if not purchase_data.get('total_price'):
-                    purchase_data['total_price'] = purchase_data['quantity'] * purchase_data['unit_price']
-                new_purchase = Purchase.objects.create(**purchase_data)
+                # New purchase, inserted with the others after the loop
+                new_purchase = priced_lines(Purchase, [purchase_data], purchase_transaction=instance)[0]
+                new_lines.append(new_purchase)
 
                 # Lock and update new product
-                new_product = self._get_locked_product(new_purchase.product.id, products_cache)
+                new_product = self._get_locked_product(new_purchase.product_id, products_cache)
                 new_product.count = (new_product.count or 0) + new_purchase.quantity
                 new_product.stock = (new_product.stock or 0) + new_purchase.quantity * new_product.selling_price
                 new_product.save()
@@ -537,7 +550,8 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                 new_brand.stock += new_purchase.quantity * new_product.selling_price
                 new_brand.save()
 
-                new_purchase_ids.append(new_purchase.id)
+        Purchase.objects.bulk_create(new_lines)
+        new_purchase_ids += [purchase.id for purchase in new_lines]
 
         # Remove deleted purchases
         for removed in existing_purchases.values():
@@ -557,11 +571,8 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
 
             removed.delete()
 
-        # Recalculate total and handle vendor transactions
-        instance.calculate_total_amount()
-        instance.refresh_from_db()
-        new_total_amount = instance.total_amount
-        instance.save()
+        # Recalculate total from the kept lines and handle vendor transactions
+        new_total_amount = instance.calculate_total_amount(kept_lines + new_lines)
 
         for purchase in instance.purchase.all():
             desc += f"{purchase.product.name} - {purchase.quantity} pcs, \n"
@@ -603,6 +614,10 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                     pay.update({'cheque_number': instance.cheque_number, 'cashout_date': instance.cashout_date})
                 VendorTransactionSerializer().create(pay)
 
+        movements.invalidate(
+            old_products | set(instance.purchase.values_list('product_id', flat=True)), min(old_date, instance.date)
+        )
+        instance.update_search_document()
         return instance
 
     def to_representation(self, instance):
@@ -816,35 +831,22 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
             if validated_data['person'].role != 'Admin':
                 raise serializers.ValidationError("SalesTransaction date must be today's date.")
         sales = validated_data.pop('sales')
+        lines = priced_lines(Sales, sales)
+        # The header total comes from the in-memory lines, so the header is
+        # written once and the lines in one bulk INSERT.
+        validated_data['total_amount'] = sum(line.total_price for line in lines) - (validated_data.get('discount') or 0)
+        assign_bill_no(validated_data, 'sales')
+        # Lock every product and brand in id order, take the stock in one UPDATE
+        # each, before the line INSERTs take their foreign key locks
+        stock.apply(lines, -1)
         transaction = SalesTransaction.objects.create(**validated_data)
+        for line in lines:
+            line.sales_transaction = transaction
+        Sales.objects.bulk_create(lines)
 
-        products_cache = {}
-        brands_cache = {}
         desc = f'Sales credited for :\n'
-
-        # Create each Sale and update Product/Brand counts/stocks
         for sale in sales:
             desc += f"{sale.get('product', {})} - {sale.get('quantity', 0)} pcs, \n"
-            saleobj = Sales.objects.create(sales_transaction=transaction, **sale)
-
-            # lock product
-            product = self._get_locked_product(saleobj.product.id, products_cache)
-            qty = saleobj.quantity or 0
-            price = product.selling_price or 0
-            product.count = (product.count or 0) - qty
-            product.stock = (product.stock or 0) - qty * price
-            product.save()
-
-            # lock brand
-            brand_obj = product.brand
-            if brand_obj.id not in brands_cache:
-                brands_cache[brand_obj.id] = brand_obj
-            brand = brands_cache[brand_obj.id]
-            brand.count = (brand.count or 0) - qty
-            brand.stock = (brand.stock or 0) - qty * price
-            brand.save()
-
-        transaction.calculate_total_amount()
 
         if transaction.method == 'credit':
             debtor_id = transaction.debtor.id
@@ -859,13 +861,21 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
                 'branch': transaction.branch,
                 'enterprise': transaction.enterprise
             })
+        movements.invalidate({line.product_id for line in lines}, transaction.date)
+        customers.record(
+            transaction.enterprise_id, transaction.phone_number, transaction.total_amount or 0,
+            visits=1, day=transaction.date, name=transaction.name,
+        )
+        transaction.update_search_document()
         return transaction
 
     @transaction.atomic
     def update(self, instance, validated_data):
         old_date = instance.date
+        old_products = set(instance.sales.values_list('product_id', flat=True))
         old_method = instance.method
         old_total = instance.total_amount or 0
+        old_phone_number = instance.phone_number
         old_debtor = instance.debtor
         old_credited_amount = instance.credited_amount or 0
         old_amount_paid = instance.amount_paid or 0
@@ -887,6 +897,8 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
         # Keep track of existing sales
         existing_sales = {sale.id: sale for sale in instance.sales.all()}
         new_sales_ids = []
+        kept_lines = []
+        new_lines = []
 
         for sale_data in sales_data:
             sale_id = sale_data.get('id')
@@ -947,12 +959,13 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
                     setattr(sale_inst, attr, val)
                 sale_inst.save()
                 new_sales_ids.append(sale_inst.id)
+                kept_lines.append(sale_inst)
 
             else:
-                # new sale
-                sale_data['sales_transaction'] = instance
-                new_sale = Sales.objects.create(**sale_data)
-                prod = self._get_locked_product(new_sale.product.id, products_cache)
+                # new sale, inserted with the others after the loop
+                new_sale = priced_lines(Sales, [sale_data], sales_transaction=instance)[0]
+                new_lines.append(new_sale)
+                prod = self._get_locked_product(new_sale.product_id, products_cache)
                 qty = new_sale.quantity or 0
                 price = prod.selling_price or 0
                 prod.count = (prod.count or 0) - qty
@@ -965,7 +978,9 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
                 br.count = (br.count or 0) - qty
                 br.stock = (br.stock or 0) - qty * price
                 br.save()
-                new_sales_ids.append(new_sale.id)
+
+        Sales.objects.bulk_create(new_lines)
+        new_sales_ids += [sale.id for sale in new_lines]
 
         # remove deleted sales
         for removed in existing_sales.values():
@@ -984,8 +999,7 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
             br.save()
             removed.delete()
 
-        instance.calculate_total_amount()
-        instance.save()
+        instance.calculate_total_amount(kept_lines + new_lines)
         new_method = instance.method
         new_date = instance.date
         new_total = instance.total_amount or 0
@@ -1021,6 +1035,18 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
                 }
                 DebtorTransactionSerializer().create(base)
 
+        movements.invalidate(
+            old_products | set(instance.sales.values_list('product_id', flat=True)), min(old_date, instance.date)
+        )
+        if old_phone_number == instance.phone_number:
+            customers.record(instance.enterprise_id, instance.phone_number, new_total - old_total)
+        else:
+            customers.record(instance.enterprise_id, old_phone_number, -old_total, visits=-1)
+            customers.record(
+                instance.enterprise_id, instance.phone_number, new_total,
+                visits=1, day=instance.date, name=instance.name,
+            )
+        instance.update_search_document()
         return instance
 
     def to_representation(self, instance):
@@ -1059,36 +1085,19 @@ class VendorTransactionSerializer(serializers.ModelSerializer):
     
     @transaction.atomic
     def create(self, validated_data):
-        transaction = VendorTransactions.objects.create(**validated_data)
-        vendor = transaction.vendor
-        vendor.due = (vendor.due - transaction.amount) if vendor.due is not None else -transaction.amount
-        vendor.save()
-        transaction.due = vendor.due
-        transaction.save()
-        return transaction
+        validated_data.pop('due', None)
+        vendor = validated_data['vendor']
+        vendor.due = ledger.post(Vendor, vendor.pk, -(validated_data.get('amount') or 0))
+        return VendorTransactions.objects.create(due=vendor.due, **validated_data)
     
     @transaction.atomic
     def update(self, instance, validated_data):
-
-        old_vendor = instance.vendor
+        validated_data.pop('due', None)
+        old_vendor_id = instance.vendor_id
         old_amount = instance.amount
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
-        instance.refresh_from_db()
-        new_vendor = instance.vendor
-
-        if old_vendor == new_vendor:
-            new_vendor.due = (new_vendor.due - instance.amount + old_amount) if new_vendor.due is not None else -instance.amount + old_amount
-            new_vendor.save()
-
-        else:
-            old_vendor.due = old_vendor.due + old_amount
-            new_vendor.due = (new_vendor.due - instance.amount) if new_vendor.due is not None else -instance.amount
-            old_vendor.save()
-            new_vendor.save()
-
-        instance.due = new_vendor.due
+        instance.due = ledger.repost(Vendor, old_vendor_id, old_amount, instance.vendor_id, instance.amount)
         instance.save()
         return instance
     
@@ -1122,6 +1131,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'date',
+            'bill_no',
             'branch',
             'enterprise',
             'purchase_transaction',
@@ -1132,6 +1142,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
     @transaction.atomic
     def create(self, validated_data):
         purchase_ids = validated_data.pop('purchase_ids', [])
+        assign_bill_no(validated_data, 'return')
         purchase_return = PurchaseReturn.objects.create(**validated_data)
         vendor = purchase_return.purchase_transaction.vendor
         total_unit_price = 0
@@ -1165,6 +1176,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
         # Save all cached products and brands
         for product in products_cache.values():
             product.save()
+        movements.invalidate(list(products_cache), purchase_return.purchase_transaction.date)
         for brand in brands_cache.values():
             brand.save()
 
@@ -1219,6 +1231,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
 
         for product in products_cache.values():
             product.save()
+        movements.invalidate(list(products_cache), instance.purchase_transaction.date)
         for brand in brands_cache.values():
             brand.save()
 
@@ -1253,6 +1266,7 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'date',
+            'bill_no',
             'branch',
             'enterprise',
             'sales_transaction',
@@ -1266,6 +1280,7 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         sales_ids = validated_data.pop('sales_ids', [])
 
         # Create the SalesReturn instance
+        assign_bill_no(validated_data, 'return')
         sales_return = SalesReturn.objects.create(**validated_data)
 
         # Memory caches
@@ -1300,8 +1315,11 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         # Save all cached objects once
         for product in products_cache.values():
             product.save()
+        movements.invalidate(list(products_cache), sales_return.sales_transaction.date)
         for brand in brands_cache.values():
             brand.save()
+        bill = sales_return.sales_transaction
+        customers.record(bill.enterprise_id, bill.phone_number, -total_unit_price)
         
         if sales_return.sales_transaction.debtor:
             debtor = sales_return.sales_transaction.debtor
@@ -1330,10 +1348,12 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         # Memory caches
         products_cache = {}
         brands_cache = {}
+        total_unit_price = 0
 
         for sale in sales_ids:
             sale.returned = False
             sale.save()
+            total_unit_price += sale.unit_price * sale.quantity
 
             # Cache product
             product_id = sale.product.id
@@ -1354,8 +1374,11 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         # Save all cached objects once
         for product in products_cache.values():
             product.save()
+        movements.invalidate(list(products_cache), instance.sales_transaction.date)
         for brand in brands_cache.values():
             brand.save()
+        bill = instance.sales_transaction
+        customers.record(bill.enterprise_id, bill.phone_number, total_unit_price)
 
         if instance.sales_transaction.debtor:
             debtor = instance.sales_transaction.debtor
@@ -1379,39 +1402,20 @@ class StaffTransactionSerializer(serializers.ModelSerializer):
         model = StaffTransactions
         fields = '__all__'
 
+    @transaction.atomic
     def create(self, validated_data):
-
-        transaction = StaffTransactions.objects.create(**validated_data)
-        staff = transaction.staff
-        staff.due = (staff.due - transaction.amount) if staff.due is not None else -transaction.amount
-        staff.save()
-        return transaction
+        staff = validated_data['staff']
+        staff.due = ledger.post(Staff, staff.pk, -(validated_data.get('amount') or 0))
+        return StaffTransactions.objects.create(**validated_data)
     
+    @transaction.atomic
     def update(self, instance, validated_data):
-        print("HERE")
-        old_staff = instance.staff
+        old_staff_id = instance.staff_id
         old_amount = instance.amount
-        print(old_amount)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
-        instance.refresh_from_db()
-        new_staff = instance.staff
-
-        if old_staff == new_staff:
-            new_staff.due = new_staff.due - instance.amount + old_amount
-            print(new_staff.due)
-            new_staff.save()
-            print(new_staff.due)
-            staff = Staff.objects.get(id = new_staff.id)
-            print(staff.due)
-
-        else:
-            old_staff.due = old_staff.due + old_amount
-            new_staff.due = new_staff.due - instance.amount
-            old_staff.save()
-            new_staff.save()
-
+        ledger.repost(Staff, old_staff_id, old_amount, instance.staff_id, instance.amount)
         return instance
     
     def get_staff_name(self,obj):
@@ -1427,34 +1431,19 @@ class DebtorTransactionSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        transaction = DebtorTransaction.objects.create(**validated_data)
-        debtor = transaction.debtor
-        debtor.due = (debtor.due - transaction.amount) if debtor.due is not None else -transaction.amount
-        debtor.save()
-        transaction.due = debtor.due
-        transaction.save()
-        return transaction
+        validated_data.pop('due', None)
+        debtor = validated_data['debtor']
+        debtor.due = ledger.post(Debtor, debtor.pk, -(validated_data.get('amount') or 0))
+        return DebtorTransaction.objects.create(due=debtor.due, **validated_data)
     
     @transaction.atomic
     def update(self, instance, validated_data):
-        old_debtor = instance.debtor
+        validated_data.pop('due', None)
+        old_debtor_id = instance.debtor_id
         old_amount = instance.amount
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
-        instance.refresh_from_db()
-        new_debtor = instance.debtor
-
-        if old_debtor == new_debtor:
-            new_debtor.due = (new_debtor.due - instance.amount + old_amount) if new_debtor.due is not None else -instance.amount + old_amount
-            new_debtor.save()
-
-        else:
-            old_debtor.due = old_debtor.due + old_amount
-            new_debtor.due = (new_debtor.due - instance.amount) if new_debtor.due is not None else -instance.amount
-            old_debtor.save()
-            new_debtor.save()
-        instance.due = new_debtor.due
+        instance.due = ledger.repost(Debtor, old_debtor_id, old_amount, instance.debtor_id, instance.amount)
         instance.save()
         return instance
     
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+
+from allinventory import versions
+from allinventory.models import Brand, Product
+
+
+# Stock counters of a bill. Every product a bill touches is locked with one
+# SELECT ... FOR NO KEY UPDATE ORDER BY id, then their brands the same way,
+# so two tills selling overlapping baskets take their locks in the same
+# order: one waits for the other instead of deadlocking. The count and stock
+# deltas are summed per row in Python and applied with one UPDATE ... CASE
+# per table.
+#
+# apply() must run before the bill's lines are inserted. On PostgreSQL each
+# line's foreign key check holds FOR KEY SHARE on its product until commit;
+# taken first, those share locks would make two tills wait on each other's
+# products. NO KEY UPDATE does not conflict with KEY SHARE, so bills of other
+# kinds that merely reference a product are not blocked either.
+
+def _add(model, counts, values):
+    if not counts:
+        return
+    stock = model._meta.get_field('stock')
+
+    def deltas(by_pk, output_field):
+        return Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in by_pk.items()],
+            default=Value(0), output_field=output_field,
+        )
+
+    model.objects.filter(pk__in=counts).update(
+        count=Coalesce(F('count'), Value(0)) + deltas(counts, IntegerField()),
+        stock=Coalesce(F('stock'), Value(0, output_field=stock)) + deltas(values, stock),
+    )
+
+
+def apply(lines, sign):
+    """Add sign * quantity of every line (anything with product_id and
+    quantity) to its product's and brand's count, and its value at the
+    product's selling price to their stock. Returns the locked products.
+    Call it before inserting the lines."""
+    products = {
+        product.pk: product
+        for product in Product.objects.select_for_update(no_key=True).filter(pk__in={line.product_id for line in lines})
+        .order_by('id').only('id', 'brand_id', 'selling_price', 'enterprise_id', 'branch_id')
+    }
+    counts, values = defaultdict(int), defaultdict(float)
+    brand_counts, brand_values = defaultdict(int), defaultdict(float)
+    for line in lines:
+        product = products[line.product_id]
+        quantity = sign * (line.quantity or 0)
+        value = quantity * (product.selling_price or 0)
+        counts[product.pk] += quantity
+        values[product.pk] += value
+        brand_counts[product.brand_id] += quantity
+        brand_values[product.brand_id] += value
+
+    # Brands are locked in id order too before the grouped UPDATE takes them.
+    list(Brand.objects.select_for_update(no_key=True).filter(pk__in=brand_counts).order_by('id').values_list('id', flat=True))
+    _add(Product, counts, {pk: round(value) for pk, value in values.items()})
+    _add(Brand, brand_counts, brand_values)
+    # The UPDATEs bypass Product.save, which would bump the catalog version.
+    for enterprise_id, branch_id in {(product.enterprise_id, product.branch_id) for product in products.values()}:
+        versions.schedule_touch(enterprise_id, branch_id)
+    return products
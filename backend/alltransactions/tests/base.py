@@ -0,0 +1,28 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from enterprise.models import Enterprise, Branch, Person
+from userauth.models import User
+
+
+class BranchTestCase(TestCase):
+    """An enterprise with one branch and a signed-in Admin of it.
+
+    self.common holds the enterprise and branch, for the many rows that
+    take both. Subclasses that need a differently named branch set
+    branch_name; ones that need more data extend setUpTestData or setUp,
+    calling super() first."""
+
+    branch_name = "Main"
+    role = "Admin"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        cls.branch = Branch.objects.create(name=cls.branch_name, enterprise=cls.enterprise)
+        cls.common = {'enterprise': cls.enterprise, 'branch': cls.branch}
+        cls.user = User.objects.create_user(email="admin@example.com", name="Admin", password="x")
+        cls.person = Person.objects.create(user=cls.user, role=cls.role, **cls.common)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
@@ -0,0 +1,72 @@
+from django.db import transaction
+from django.utils import timezone
+from allinventory.models import Brand, Product
+from alltransactions import bills
+from alltransactions.models import SalesTransaction, BillSequence
+from alltransactions.serializers import SalesTransactionSerializer
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Branch
+
+
+class BillSequenceTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name="Other", enterprise=self.enterprise)
+        brand = Brand.objects.create(name="Brand", **self.common)
+        self.product = Product.objects.create(name="Cable", brand=brand, selling_price=10, count=50, **self.common)
+        today = timezone.now().date()
+        for bill_no in ("7", "INV-99", "3"):
+            SalesTransaction.objects.create(date=today, bill_no=bill_no, **self.common)
+
+    def sell(self, branch=None, bill_no=None):
+        data = {
+            'enterprise': self.enterprise.id, 'branch': (branch or self.branch).id, 'person': self.person.pk,
+            'date': timezone.now().date().isoformat(), 'name': "Customer", 'method': 'cash', 'discount': 0,
+            'sales': [{'product': self.product.id, 'quantity': 1, 'unit_price': 10}],
+        }
+        if bill_no:
+            data['bill_no'] = bill_no
+        serializer = SalesTransactionSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save().bill_no
+
+    def test_bills_are_numbered_per_branch_after_existing_ones(self):
+        self.assertEqual([self.sell(), self.sell()], ["8", "9"])
+        self.assertEqual(self.sell(self.other_branch), "1")
+        self.assertEqual(self.sell(bill_no="MANUAL-1"), "MANUAL-1")
+        self.assertEqual(self.sell(), "10")
+
+    def test_rolled_back_bill_returns_its_number(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.sell()
+            raise RuntimeError
+        self.assertEqual(self.sell(), "8")
+
+    def test_reserve_block_and_preview(self):
+        client = self.client
+        preview = client.get('/alltransaction/next-bill-no/', {'branch': self.branch.id})
+        self.assertEqual(preview.data['bill_no'], "8")
+        self.assertEqual(client.get('/alltransaction/next-bill-no/', {'branch': self.branch.id}).data['bill_no'], "8")
+
+        block = client.post('/alltransaction/bill-no/reserve/', {'branch': self.branch.id, 'count': 5}, format='json')
+        self.assertEqual(block.status_code, 201)
+        self.assertEqual(block.data['bill_numbers'], ["8", "9", "10", "11", "12"])
+        self.assertEqual(self.sell(), "13")
+
+        bad = client.post('/alltransaction/bill-no/reserve/', {'branch': self.branch.id, 'kind': 'x'}, format='json')
+        self.assertEqual(bad.status_code, 400)
+        self.assertEqual(client.get('/alltransaction/next-bill-no/', {'branch': 'main'}).status_code, 400)
+
+    def test_typed_in_number_moves_the_sequence(self):
+        self.assertEqual(self.sell(), "8")
+        self.assertEqual(self.sell(bill_no="15"), "15")
+        self.assertEqual(self.sell(), "16")
+        self.assertEqual(self.sell(bill_no="12"), "12")
+        self.assertEqual(self.sell(), "17")
+        self.assertEqual(self.sell(self.other_branch, bill_no="4"), "4")
+        self.assertEqual(self.sell(self.other_branch), "5")
+
+    def test_kinds_have_their_own_sequence(self):
+        self.assertEqual(bills.allocate(self.enterprise.id, self.branch.id, 'return', 2), ["1", "2"])
+        self.assertEqual(bills.allocate(self.enterprise.id, None, 'purchase'), ["1"])
+        self.assertEqual(BillSequence.objects.count(), 2)
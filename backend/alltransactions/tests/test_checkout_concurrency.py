@@ -0,0 +1,79 @@
+import random
+import threading
+import time
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from allinventory.models import Brand, Product
+from alltransactions.models import Sales
+from alltransactions.serializers import SalesTransactionSerializer
+from enterprise.models import Enterprise, Branch, Person
+from userauth.models import User
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class CheckoutConcurrencyTestCase(TransactionTestCase):
+    """Tills selling overlapping baskets in different orders: every sale
+    commits (no deadlock or lock error) and no stock movement is lost. Only
+    meaningful on a database with row locks (PostgreSQL); SQLite serialises
+    every writer, so there is nothing to deadlock on."""
+    TILLS = 6
+    CHECKOUTS = 10
+    PRODUCTS = 8
+
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        common = {'enterprise': self.enterprise, 'branch': self.branch}
+        self.brands = [Brand.objects.create(name=f"Brand {i}", count=400, stock=4000, **common) for i in range(2)]
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}", brand=self.brands[i % 2], selling_price=10, count=100, stock=1000, **common
+            )
+            for i in range(self.PRODUCTS)
+        ]
+        user = User.objects.create_user(email="admin@example.com", name="Admin", password="x")
+        self.person = Person.objects.create(user=user, role="Admin", **common)
+
+    def checkout(self, basket):
+        serializer = SalesTransactionSerializer(data={
+            'enterprise': self.enterprise.id, 'branch': self.branch.id, 'person': self.person.pk,
+            'date': timezone.now().date().isoformat(), 'name': "Customer", 'method': 'cash', 'discount': 0,
+            'sales': [{'product': product.id, 'quantity': 1, 'unit_price': 10} for product in basket],
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def test_concurrent_checkouts(self):
+        errors = []
+
+        def till(seed):
+            shuffle = random.Random(seed)
+            try:
+                for _ in range(self.CHECKOUTS):
+                    basket = list(self.products)
+                    shuffle.shuffle(basket)
+                    self.checkout(basket)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=till, args=(seed,)) for seed in range(self.TILLS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(errors, [])
+        sold = self.TILLS * self.CHECKOUTS
+        print(f"\n{sold} checkouts of {self.PRODUCTS} lines by {self.TILLS} tills in {elapsed:.2f}s "
+              f"({sold / elapsed:.1f} checkouts/s)")
+        self.assertEqual(Sales.objects.count(), sold * self.PRODUCTS)
+        for product in Product.objects.all():
+            self.assertEqual((product.count, product.stock), (100 - sold, 1000 - sold * 10))
+        per_brand = sold * self.PRODUCTS // 2
+        for brand in Brand.objects.all():
+            self.assertEqual((brand.count, brand.stock), (400 - per_brand, 4000 - per_brand * 10))
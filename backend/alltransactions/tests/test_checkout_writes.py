@@ -0,0 +1,65 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from allinventory.models import Brand, Product
+from alltransactions.models import Vendor, PurchaseTransaction, SalesTransaction
+from alltransactions.serializers import PurchaseTransactionSerializer, SalesTransactionSerializer
+from alltransactions.tests.base import BranchTestCase
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class CheckoutWriteBudgetTestCase(BranchTestCase):
+    """A bill writes its lines with one INSERT, its header once, and each
+    touched product once: the writes per extra line stay at one."""
+
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name="Brand", **self.common)
+        self.products = [
+            Product.objects.create(name=f"Product {i}", brand=brand, selling_price=15, count=100, stock=1500, **self.common)
+            for i in range(10)
+        ]
+        self.vendor = Vendor.objects.create(name="Vendor", **self.common)
+
+    def header(self):
+        return {
+            'enterprise': self.enterprise.id, 'branch': self.branch.id, 'person': self.person.pk,
+            'date': timezone.now().date().isoformat(),
+        }
+
+    def writes(self, serializer_class, data):
+        serializer = serializer_class(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as ctx:
+            txn = serializer.save()
+        return txn, sum(query['sql'].lstrip().upper().startswith(WRITES) for query in ctx.captured_queries)
+
+    def sell(self, lines):
+        return self.writes(SalesTransactionSerializer, {
+            **self.header(), 'name': "Customer", 'bill_no': f"S{lines}", 'method': 'cash', 'discount': 5,
+            'sales': [{'product': product.id, 'quantity': 2, 'unit_price': 15} for product in self.products[:lines]],
+        })
+
+    def buy(self, lines):
+        return self.writes(PurchaseTransactionSerializer, {
+            **self.header(), 'vendor': self.vendor.id, 'bill_no': f"P{lines}", 'method': 'credit',
+            'purchase': [{'product': product.id, 'quantity': 3, 'unit_price': 10} for product in self.products[:lines]],
+        })
+
+    def test_sales_checkout(self):
+        txn, small = self.sell(2)
+        self.assertEqual(SalesTransaction.objects.get(pk=txn.pk).total_amount, 2 * 30 - 5)
+        self.assertEqual(sorted(txn.sales.values_list('total_price', flat=True)), [30, 30])
+        txn, large = self.sell(10)
+        self.assertEqual(SalesTransaction.objects.get(pk=txn.pk).total_amount, 10 * 30 - 5)
+        self.assertLessEqual(large - small, 8)
+
+    def test_purchase_checkout(self):
+        txn, small = self.buy(2)
+        self.assertEqual(PurchaseTransaction.objects.get(pk=txn.pk).total_amount, 60)
+        txn, large = self.buy(10)
+        self.assertEqual(PurchaseTransaction.objects.get(pk=txn.pk).total_amount, 300)
+        self.assertLessEqual(large - small, 8)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].count, 106)
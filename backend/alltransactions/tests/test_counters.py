@@ -0,0 +1,81 @@
+import datetime
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from allinventory.models import Brand as ProductBrand, Product
+from alltransactions.counters import reconcile_branch
+from alltransactions.models import Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales
+from alltransactions.tests.base import BranchTestCase
+from inventory.models import Brand as PhoneBrand, Phone, Item
+
+
+class StockCounterTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.phone_brand = PhoneBrand.objects.create(name="Brand", count=99, stock=1, **self.common)
+        self.phone = Phone.objects.create(name="Phone", brand=self.phone_brand, selling_price=100, count=7, stock=700, **self.common)
+        self.empty_phone = Phone.objects.create(name="Empty", brand=self.phone_brand, selling_price=50, count=0, stock=0, **self.common)
+        Item.objects.bulk_create([Item(imei_number=f"{n:015d}", phone=self.phone) for n in range(3)])
+
+        self.product_brand = ProductBrand.objects.create(name="Brand", count=0, stock=0, **self.common)
+        self.product = Product.objects.create(name="Cable", brand=self.product_brand, selling_price=10, count=4, stock=0, **self.common)
+
+        vendor = Vendor.objects.create(name="Vendor", **self.common)
+        day = datetime.date(2024, 1, 1)
+        purchase_txn = PurchaseTransaction.objects.create(date=day, vendor=vendor, bill_no="P1", person=self.person, **self.common)
+        Purchase.objects.create(purchase_transaction=purchase_txn, product=self.product, quantity=10, unit_price=5)
+        Purchase.objects.create(purchase_transaction=purchase_txn, product=self.product, quantity=3, unit_price=5, returned=True)
+        sales_txn = SalesTransaction.objects.create(date=day, name="Customer", bill_no="S1", person=self.person, **self.common)
+        Sales.objects.create(sales_transaction=sales_txn, product=self.product, quantity=4, unit_price=10)
+
+    def test_drift_is_reported_and_fixed(self):
+        drifts = reconcile_branch(self.branch.id)
+        fields = {(d.model, d.pk, d.field) for d in drifts}
+        self.assertIn(('inventory.Phone', self.phone.pk, 'count'), fields)
+        self.assertNotIn(('inventory.Phone', self.empty_phone.pk, 'count'), fields)
+
+        self.phone.refresh_from_db()
+        self.phone_brand.refresh_from_db()
+        self.assertEqual((self.phone.count, self.phone.stock), (3, 300))
+        self.assertEqual((self.phone_brand.count, self.phone_brand.stock), (3, 300))
+
+        # Product counts are kept unless recounted; their valuation is fixed.
+        self.product.refresh_from_db()
+        self.product_brand.refresh_from_db()
+        self.assertEqual((self.product.count, self.product.stock), (4, 40))
+        self.assertEqual((self.product_brand.count, self.product_brand.stock), (4, 40))
+
+        self.assertEqual(reconcile_branch(self.branch.id), [])
+
+    def test_recount_products_from_quantities(self):
+        reconcile_branch(self.branch.id, recount_products=True)
+        self.product.refresh_from_db()
+        self.product_brand.refresh_from_db()
+        self.assertEqual((self.product.count, self.product.stock), (6, 60))
+        self.assertEqual(self.product_brand.count, 6)
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('reconcile_stock_counters', '--dry-run', stdout=out)
+        self.assertIn(f"inventory.Phone {self.phone.pk} count: 7 -> 3", out.getvalue())
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.count, 7)
+        call_command('reconcile_stock_counters', stdout=StringIO())
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.count, 3)
+
+    def test_sale_during_the_scan_is_kept(self):
+        from alltransactions import counters, stock
+        scan = counters._product_rows
+
+        def scan_then_sell(branch_id, recount):
+            rows = scan(branch_id, recount)
+            stock.apply([Sales(product=self.product, quantity=1)], -1)
+            return rows
+
+        with mock.patch.object(counters, '_product_rows', scan_then_sell):
+            reconcile_branch(self.branch.id, recount_products=True)
+        self.product.refresh_from_db()
+        self.product_brand.refresh_from_db()
+        self.assertEqual((self.product.count, self.product.stock), (5, 50))
+        self.assertEqual((self.product_brand.count, self.product_brand.stock), (5, 50))
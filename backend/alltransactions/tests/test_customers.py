@@ -0,0 +1,113 @@
+import datetime
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.utils import timezone
+from allinventory.models import Brand, Product
+from alltransactions import customers
+from alltransactions.models import CustomerAccount, SalesTransaction
+from alltransactions.serializers import SalesTransactionSerializer, SalesReturnSerializer
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Enterprise
+
+PHONE = "9800000001"
+
+
+class CustomerTotalsTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name="Brand", **self.common)
+        self.product = Product.objects.create(name="Cable", brand=brand, selling_price=10, count=50, **self.common)
+
+    def sell(self, quantity, phone_number=PHONE, discount=0):
+        serializer = SalesTransactionSerializer(data={
+            'enterprise': self.enterprise.id, 'branch': self.branch.id, 'person': self.person.pk,
+            'date': timezone.now().date().isoformat(), 'name': "Customer", 'phone_number': phone_number,
+            'method': 'cash', 'discount': discount,
+            'sales': [{'product': self.product.id, 'quantity': quantity, 'unit_price': 10}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def account(self, enterprise=None):
+        return CustomerAccount.objects.get(enterprise=enterprise or self.enterprise, phone_number=PHONE)
+
+    def panel(self):
+        return self.client.get(f'/alltransaction/customer-total/{PHONE}/').data
+
+    def test_sales_and_returns_move_the_totals(self):
+        self.sell(3)
+        bill = self.sell(2, discount=5)
+        customer = self.account()
+        self.assertEqual((customer.total_spent, customer.visits), (45, 2))
+        self.assertEqual(customer.last_visit, timezone.now().date())
+
+        returns = SalesReturnSerializer()
+        sales_return = returns.create({
+            'sales_transaction': bill, 'date': bill.date, 'enterprise': self.enterprise,
+            'branch': self.branch, 'sales_ids': list(bill.sales.all()),
+        })
+        self.assertEqual(self.account().total_spent, 25)
+        returns.delete(sales_return)
+        self.assertEqual(self.account().total_spent, 45)
+
+        response = self.client.delete(f'/alltransaction/salestransaction/{bill.id}/')
+        self.assertEqual(response.status_code, 200)
+        customer = self.account()
+        self.assertEqual((customer.total_spent, customer.visits), (30, 1))
+
+    def test_panel_is_one_read_without_side_effects(self):
+        with self.assertNumQueries(1):
+            data = self.panel()
+        self.assertEqual((data['total_spent'], data['visits']), (0, 0))
+        self.assertFalse(CustomerAccount.objects.exists())
+
+        self.sell(4)
+        with self.assertNumQueries(1):
+            data = self.panel()
+        self.assertEqual((data['total_spent'], data['visits'], data['name']), (40, 1, "Customer"))
+
+    def test_rebuild_matches_incremental_totals(self):
+        self.sell(3)
+        self.sell(1, phone_number="")
+        SalesTransaction.objects.create(
+            enterprise=self.enterprise, branch=self.branch, date=datetime.date(2024, 1, 1),
+            phone_number=PHONE, total_amount=100,
+        )
+        call_command('rebuild_customer_totals', stdout=StringIO())
+        customer = self.account()
+        self.assertEqual((customer.total_spent, customer.visits), (130, 2))
+        self.assertEqual(customer.last_visit, timezone.now().date())
+        self.assertEqual(CustomerAccount.objects.count(), 1)
+
+    def test_accounts_are_per_enterprise(self):
+        other = Enterprise.objects.create(name="Other Enterprise")
+        self.sell(3)
+        customers.record(other.id, PHONE, 100, visits=1, day=datetime.date(2024, 1, 1))
+        self.assertEqual((self.account().total_spent, self.account(other).total_spent), (30, 100))
+        self.assertEqual(self.panel()['total_spent'], 30)
+
+        SalesTransaction.objects.create(enterprise=other, date=datetime.date(2024, 1, 1), phone_number=PHONE, total_amount=70)
+        CustomerAccount.objects.filter(enterprise=other).delete()
+        self.assertEqual(customers.rebuild(missing_only=True), 1)
+        self.assertEqual((self.account().total_spent, self.account(other).total_spent), (30, 70))
+        customers.rebuild()
+        self.assertEqual((self.account().visits, self.account(other).visits), (1, 1))
+
+    def test_rebuild_leaves_accounts_a_sale_moved(self):
+        self.sell(3)
+        CustomerAccount.objects.update(total_spent=0, visits=0)
+        totals = customers._totals
+
+        def totals_then_sell(bills, returned):
+            result = totals(bills, returned)
+            self.sell(1)
+            return result
+
+        with mock.patch.object(customers, '_totals', totals_then_sell):
+            self.assertEqual(customers.rebuild(), 0)
+        customer = self.account()
+        self.assertEqual((customer.total_spent, customer.visits), (10, 1))
+        self.assertEqual(customers.rebuild(), 1)
+        customer = self.account()
+        self.assertEqual((customer.total_spent, customer.visits), (40, 2))
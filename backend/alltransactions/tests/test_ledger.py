@@ -0,0 +1,84 @@
+import datetime
+import threading
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from alltransactions import ledger
+from alltransactions.models import Vendor, VendorTransactions, Debtor, DebtorTransaction
+from alltransactions.serializers import VendorTransactionSerializer, DebtorTransactionSerializer
+from enterprise.models import Enterprise
+
+
+class LedgerTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.vendor = Vendor.objects.create(name="Vendor", due=None, enterprise=self.enterprise)
+        self.debtor = Debtor.objects.create(name="Debtor", due=100, enterprise=self.enterprise)
+
+    def test_post_returns_new_due(self):
+        self.assertEqual(ledger.post(Vendor, self.vendor.pk, 50), 50)
+        self.assertEqual(ledger.post(Vendor, self.vendor.pk, -20), 30)
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.due, 30)
+
+    def test_debtor_transaction_snapshot_update_and_delete(self):
+        other = Debtor.objects.create(name="Other", due=0, enterprise=self.enterprise)
+        txn = DebtorTransactionSerializer().create({
+            'debtor': self.debtor, 'amount': 40, 'date': datetime.date.today(), 'enterprise': self.enterprise,
+        })
+        self.assertEqual(txn.due, 60)
+        self.assertEqual(self.debtor.due, 60)
+
+        serializer = DebtorTransactionSerializer(txn, data={'amount': 10}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        txn = serializer.save()
+        self.assertEqual(txn.due, 90)
+
+        serializer = DebtorTransactionSerializer(txn, data={'debtor': other.pk}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        txn = serializer.save()
+        self.debtor.refresh_from_db()
+        self.assertEqual((self.debtor.due, txn.due), (100, -10))
+
+        DebtorTransaction.objects.get(pk=txn.pk).delete()
+        other.refresh_from_db()
+        self.assertEqual(other.due, 0)
+
+
+class LedgerConcurrencyTestCase(TransactionTestCase):
+    THREADS = 8
+    POSTINGS = 25
+
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.vendor = Vendor.objects.create(name="Vendor", due=0, enterprise=self.enterprise)
+
+    def test_concurrent_postings_are_not_lost(self):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(self.POSTINGS):
+                    VendorTransactionSerializer().create({
+                        'vendor': Vendor.objects.get(pk=self.vendor.pk),
+                        'amount': 1,
+                        'date': datetime.date.today(),
+                        'enterprise': self.enterprise,
+                    })
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        total = self.THREADS * self.POSTINGS
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.due, -total)
+        # Every posting saw a distinct balance: no two read the same `due`
+        snapshots = sorted(VendorTransactions.objects.values_list('due', flat=True))
+        self.assertEqual(snapshots, [float(-n) for n in range(total, 0, -1)])
@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from allinventory.models import Brand as ProductBrand, Product
+from alltransactions import merge
+from alltransactions.models import Vendor
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Branch, MergeJob
+from inventory.models import Brand as PhoneBrand, Phone
+
+
+class BranchMergeTestCase(BranchTestCase):
+    branch_name = "Target"
+
+    def setUp(self):
+        super().setUp()
+        self.target = self.branch
+        self.source = Branch.objects.create(name="Source", enterprise=self.enterprise)
+
+        self.vendor = Vendor.objects.create(name="Vendor", enterprise=self.enterprise, branch=self.source)
+        for b in range(3):
+            brand = ProductBrand.objects.create(name=f"Brand {b}", enterprise=self.enterprise, branch=self.source)
+            for p in range(4):
+                product = Product.objects.create(
+                    name=f"Product {b}{p}", uid=f"20000000{b}{p:03d}", brand=brand,
+                    enterprise=self.enterprise, branch=self.source, selling_price=10 * p,
+                )
+                product.vendor.add(self.vendor)
+            phone_brand = PhoneBrand.objects.create(name=f"Brand {b}", enterprise=self.enterprise, branch=self.source)
+            for p in range(4):
+                Phone.objects.create(name=f"Phone {b}{p}", brand=phone_brand, enterprise=self.enterprise, branch=self.source)
+
+        # The target already has one brand and one of its products.
+        self.target_brand = ProductBrand.objects.create(name="brand 0", enterprise=self.enterprise, branch=self.target)
+        Product.objects.create(name="PRODUCT 00", brand=self.target_brand, enterprise=self.enterprise, branch=self.target)
+
+    def test_brand_merge_copies_missing_brands_only(self):
+        response = self.client.post(f'/allinventory/brand/branch/{self.target.id}/merge/{self.source.id}/')
+        self.assertEqual(response.data, "Merged")
+        names = sorted(ProductBrand.objects.filter(branch=self.target).values_list('name', flat=True))
+        self.assertEqual(names, ["Brand 1", "Brand 2", "brand 0"])
+
+        self.client.post(f'/inventory/brand/branch/{self.target.id}/merge/{self.source.id}/')
+        self.assertEqual(PhoneBrand.objects.filter(branch=self.target).count(), 3)
+
+    def test_item_merge_is_set_based(self):
+        with CaptureQueriesContext(connection) as queries:
+            created = merge.merge_items('product', self.source.id, self.target.id, self.target_brand)
+        self.assertEqual(created, 3)
+        self.assertLessEqual(len(queries), 8)
+
+        copies = Product.objects.filter(branch=self.target, brand=self.target_brand).exclude(name="PRODUCT 00")
+        self.assertEqual(sorted(copies.values_list('uid', flat=True)), ["200000000001", "200000000002", "200000000003"])
+        self.assertTrue(all(list(copy.vendor.all()) == [self.vendor] for copy in copies))
+
+    def test_copies_never_reuse_a_target_uid(self):
+        other_brand = ProductBrand.objects.create(name="Other", enterprise=self.enterprise, branch=self.target)
+        Product.objects.create(name="Local", uid="200000000001", brand=other_brand, enterprise=self.enterprise, branch=self.target)
+        self.assertEqual(merge.merge_items('product', self.source.id, self.target.id, self.target_brand), 3)
+
+        copy = Product.objects.get(branch=self.target, name="Product 01")
+        self.assertNotIn(copy.uid, ["", "200000000001"])
+        self.assertEqual(Product.objects.get(branch=self.target, name="Product 02").uid, "200000000002")
+
+    def test_full_catalog_clone_records_job_progress(self):
+        job = MergeJob.objects.create(
+            enterprise=self.enterprise, source=self.source, target=self.target, kind='product', items=True,
+        )
+        merge.run(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.done, job.total), (3, 3))
+        self.assertEqual(Product.objects.filter(branch=self.target).count(), 12)
+
+        response = self.client.get(f'/enterprise/mergejob/{job.id}/')
+        self.assertEqual(response.data['status'], 'done')
+
+    def test_background_merge_queues_a_job(self):
+        phone_brand = PhoneBrand.objects.create(name="Brand 1", enterprise=self.enterprise, branch=self.target)
+        response = self.client.post(
+            f'/inventory/product/branch/{self.target.id}/brand/{phone_brand.id}/merge/{self.source.id}/?background=true'
+        )
+        self.assertEqual(response.status_code, 202)
+        job = MergeJob.objects.get(id=response.data['id'])
+        self.assertEqual((job.kind, job.brand, job.status), ('phone', phone_brand.id, 'queued'))
+        merge.run(job.id)
+        self.assertEqual(Phone.objects.filter(branch=self.target, brand=phone_brand).count(), 4)
+
+    def test_interrupted_jobs_are_failed_or_resumed(self):
+        common = {'enterprise': self.enterprise, 'source': self.source, 'target': self.target, 'kind': 'product'}
+        stuck = MergeJob.objects.create(status='running', **common)
+        finished = MergeJob.objects.create(status='done', **common)
+        self.assertEqual(merge.recover(), [stuck.pk])
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, 'failed')
+        self.assertEqual(MergeJob.objects.get(pk=finished.pk).status, 'done')
+
+        queued = MergeJob.objects.create(items=True, **common)
+        self.assertEqual(merge.recover(resume=True), [queued.pk])
+        self.assertEqual(MergeJob.objects.get(pk=queued.pk).status, 'done')
+        self.assertEqual(Product.objects.filter(branch=self.target).count(), 12)
@@ -0,0 +1,70 @@
+import datetime
+from allinventory.models import Brand, Product
+from alltransactions import movements
+from alltransactions.models import Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales, ProductStockSnapshot
+from alltransactions.tests.base import BranchTestCase
+
+
+class ProductMovementTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        brand = Brand.objects.create(name="Brand", **self.common)
+        self.product = Product.objects.create(name="Cable", brand=brand, selling_price=10, **self.common)
+        self.vendor = Vendor.objects.create(name="Vendor", **self.common)
+
+        self.buy(datetime.date(2024, 1, 1), 10)
+        self.sell(datetime.date(2024, 1, 5), 3)
+        self.buy(datetime.date(2024, 2, 1), 5, returned=True)
+        self.buy(datetime.date(2024, 2, 3), 4)
+        self.sell(datetime.date(2024, 2, 3), 2)
+        self.sell(datetime.date(2024, 3, 1), 1)
+
+    def buy(self, day, quantity, returned=False):
+        txn = PurchaseTransaction.objects.create(date=day, vendor=self.vendor, person=self.person, **self.common)
+        return Purchase.objects.create(
+            purchase_transaction=txn, product=self.product, quantity=quantity, unit_price=5, returned=returned
+        )
+
+    def sell(self, day, quantity):
+        txn = SalesTransaction.objects.create(date=day, name="Customer", person=self.person, **self.common)
+        return Sales.objects.create(sales_transaction=txn, product=self.product, quantity=quantity, unit_price=10)
+
+    def test_ledger_orders_rows_and_keeps_a_running_balance(self):
+        rows = list(movements.ledger(self.product.id, opening=0))
+        self.assertEqual(
+            [(row['type'], row['date'], row['quantity'], row['balance']) for row in rows],
+            [
+                ('purchase', datetime.date(2024, 1, 1), 10, 10),
+                ('sales', datetime.date(2024, 1, 5), 3, 7),
+                ('purchase', datetime.date(2024, 2, 3), 4, 11),
+                ('sales', datetime.date(2024, 2, 3), 2, 9),
+                ('sales', datetime.date(2024, 3, 1), 1, 8),
+            ],
+        )
+        self.assertIn('purchase_transaction', rows[0])
+        self.assertIn('sales_transaction', rows[1])
+        self.assertEqual(rows[0]['product_name'], "Cable")
+
+    def test_opening_quantity_uses_and_extends_snapshots(self):
+        start = datetime.date(2024, 2, 3)
+        self.assertEqual(movements.opening_quantity(self.product.id, start), 7)
+
+        self.assertEqual(movements.take_snapshots(datetime.date(2024, 1, 31)), 1)
+        self.assertEqual(ProductStockSnapshot.objects.get(product=self.product).quantity, 7)
+        with self.assertNumQueries(3):
+            self.assertEqual(movements.opening_quantity(self.product.id, start), 7)
+
+    def test_invalidate_drops_later_snapshots(self):
+        movements.take_snapshots(datetime.date(2024, 1, 31))
+        movements.take_snapshots(datetime.date(2024, 2, 29))
+        movements.invalidate([self.product.id], datetime.date(2024, 2, 3))
+        self.assertEqual(
+            list(ProductStockSnapshot.objects.values_list('date', flat=True)), [datetime.date(2024, 1, 31)]
+        )
+
+    def test_report_view(self):
+        response = self.client.get(f'/allinventory/report/product/{self.product.id}/', {'start_date': '2024-02-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['opening_quantity'], 7)
+        self.assertEqual(response.data['closing_quantity'], 8)
+        self.assertEqual([row['balance'] for row in response.data['transactions']], [11, 9, 8])
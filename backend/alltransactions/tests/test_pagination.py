@@ -0,0 +1,67 @@
+import datetime
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from alltransactions.models import Staff, StaffTransactions
+from alltransactions.tests.base import BranchTestCase
+
+
+class CursorPaginationTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        staff = Staff.objects.create(name="Staff", **self.common)
+        # Three rows per day so pages have to break ties on id
+        StaffTransactions.objects.bulk_create([
+            StaffTransactions(
+                date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i // 3),
+                staff=staff, amount=i, desc=f"t{i}", **self.common,
+            )
+            for i in range(23)
+        ])
+        self.expected = list(StaffTransactions.objects.order_by('-date', '-id').values_list('id', flat=True))
+        self.url = f'/alltransaction/stafftransaction/branch/{self.branch.id}/'
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_walks_forward_and_back(self):
+        response = self.client.get(self.url, {'cursor': '', 'page_size': 5})
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+
+        pages = [self.ids(response)]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(self.ids(response))
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.data['previous'])
+            self.assertEqual(self.ids(response), page)
+        self.assertIsNone(response.data['previous'])
+
+    def test_deep_page_costs_the_same_as_the_first(self):
+        counts = []
+        response = self.client.get(self.url, {'cursor': '', 'page_size': 2})
+        while response.data['next']:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(response.data['next'])
+            if len(response.data['results']) == 2:
+                counts.append(len(ctx.captured_queries))
+            self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(len(counts), 10)
+        self.assertEqual(len(set(counts)), 1)
+
+    def test_count_and_page_size_cap(self):
+        response = self.client.get(self.url, {'cursor': '', 'count': 'true', 'page_size': 1000})
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(len(response.data['results']), 23)
+
+        response = self.client.get(self.url, {'page_size': 7, 'page': 2})
+        self.assertEqual(response.data['count'], 23)
+        self.assertEqual(self.ids(response), self.expected[7:14])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,53 @@
+import datetime
+import json
+from alltransactions.models import Vendor
+from alltransactions.serializers import VendorTransactionSerializer
+from alltransactions.tests.base import BranchTestCase
+
+
+class VendorStatementTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.vendor = Vendor.objects.create(name="Vendor", due=0, **self.common)
+        self.url = f'/alltransaction/vendor/statement/{self.vendor.id}/'
+
+        # Purchases on credit are negative postings, payments positive.
+        # The payment of Jan 5 is entered last, after the Feb purchase.
+        for day, amount in [(1, -1000), (10, -500), (20, 300)]:
+            self.post(datetime.date(2024, 1, day), amount)
+        self.post(datetime.date(2024, 2, 1), -200)
+        self.post(datetime.date(2024, 1, 5), 400)
+
+    def post(self, day, amount):
+        VendorTransactionSerializer().create({
+            'vendor': self.vendor, 'date': day, 'amount': amount, 'enterprise': self.enterprise, 'branch': self.branch,
+        })
+
+    def statement(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_running_balance_follows_date_order(self):
+        data = json.loads(self.statement())
+        self.assertEqual(data['vendor_data']['name'], "Vendor")
+        self.assertEqual(data['opening_balance'], 0)
+        self.assertEqual(
+            [(row['date'], row['due']) for row in data['vendor_transactions']],
+            [('2024-01-01', 1000), ('2024-01-05', 600), ('2024-01-10', 1100), ('2024-01-20', 800), ('2024-02-01', 1000)],
+        )
+        self.assertEqual(data['closing_balance'], 1000)
+        self.assertEqual(data['vendor_transactions'][0]['vendor_name'], "Vendor")
+
+    def test_range_has_opening_and_closing_balance(self):
+        data = json.loads(self.statement(start_date='2024-01-06', end_date='2024-01-31'))
+        self.assertEqual(data['opening_balance'], 600)
+        self.assertEqual([row['due'] for row in data['vendor_transactions']], [1100, 800])
+        self.assertEqual(data['closing_balance'], 800)
+
+    def test_csv(self):
+        lines = self.statement(output='csv', start_date='2024-01-06').splitlines()
+        self.assertEqual(lines[0], 'opening_balance,600.0')
+        self.assertTrue(lines[1].startswith('id,date,'))
+        self.assertEqual(len(lines), 2 + 3 + 1)
+        self.assertEqual(lines[-1], 'closing_balance,1000.0')
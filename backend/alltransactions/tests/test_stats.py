@@ -0,0 +1,56 @@
+import datetime
+from django.utils import timezone
+from rest_framework.test import APIClient
+from allinventory.models import Brand, Product
+from alltransactions.models import Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Branch
+
+
+class StatsViewTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_branch = Branch.objects.create(name="Other", enterprise=self.enterprise)
+        brand = Brand.objects.create(name="Brand", **self.common)
+        self.product = Product.objects.create(name="Cable", brand=brand, selling_price=10, cost_price=6, **self.common)
+        self.vendor = Vendor.objects.create(name="Vendor", **self.common)
+
+        today = timezone.now().date()
+        earlier = today.replace(day=1) if today.day > 1 else today
+        self.sell(self.branch, today, 3, 10)
+        self.sell(self.branch, earlier, 2, 9)
+        self.sell(self.other_branch, today, 1, 10)
+        self.sell(self.other_branch, datetime.date(2000, 1, 1), 5, 10)
+        txn = PurchaseTransaction.objects.create(
+            date=today, vendor=self.vendor, enterprise=self.enterprise, branch=self.branch
+        )
+        Purchase.objects.create(purchase_transaction=txn, product=self.product, quantity=4, unit_price=6)
+        txn.calculate_total_amount()
+
+    def sell(self, branch, day, quantity, unit_price):
+        txn = SalesTransaction.objects.create(date=day, name="Customer", enterprise=self.enterprise, branch=branch)
+        Sales.objects.create(sales_transaction=txn, product=self.product, quantity=quantity, unit_price=unit_price)
+        txn.calculate_total_amount()
+
+    def test_enterprise_figures_in_a_fixed_number_of_queries(self):
+        with self.assertNumQueries(6):
+            response = self.client.get('/alltransaction/stats/')
+        self.assertEqual(response.status_code, 200)
+        monthly, daily = response.data['monthly'], response.data['daily']
+        self.assertEqual((monthly['sales'], monthly['stamt'], monthly['profit']), (3, 58, 12 + 6 + 4))
+        self.assertEqual((monthly['purchases'], monthly['ptamt']), (1, 24))
+        if timezone.now().date().day > 1:
+            self.assertEqual((daily['sales'], daily['dailystamt'], daily['profit']), (2, 40, 16))
+        self.assertEqual((daily['purchases'], daily['dailyptamt']), (1, 24))
+        self.assertNotIn('branches', response.data)
+
+    def test_branch_breakdown(self):
+        with self.assertNumQueries(7):
+            response = self.client.get('/alltransaction/stats/', {'breakdown': 'branch'})
+        main, other = response.data['branches']
+        self.assertEqual((main['name'], main['monthly']['stamt'], main['monthly']['purchases']), ("Main", 48, 1))
+        self.assertEqual((other['name'], other['monthly']['stamt'], other['monthly']['profit']), ("Other", 10, 4))
+        self.assertEqual(main['monthly']['stamt'] + other['monthly']['stamt'], response.data['monthly']['stamt'])
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get('/alltransaction/stats/').status_code, 401)
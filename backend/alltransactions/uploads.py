@@ -0,0 +1,44 @@
+import codecs
+import csv
+import zipfile
+
+import openpyxl
+from openpyxl.utils.exceptions import InvalidFileException
+
+
+# Spreadsheet uploads shared by the stock and catalog imports. Rows are
+# yielded one at a time, so an upload is never loaded whole. A file that
+# cannot be read raises ImportFormatError, which the views answer with 400.
+
+class ImportFormatError(Exception):
+    pass
+
+
+def _xlsx_rows(upload):
+    workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if cell is None else str(cell).strip() for cell in row]
+    finally:
+        workbook.close()
+
+
+def _csv_rows(upload):
+    for row in csv.reader(codecs.iterdecode(upload, 'utf-8-sig')):
+        yield [cell.strip() for cell in row]
+
+
+def iter_rows(upload):
+    """Yield the rows of an uploaded CSV or XLSX file as lists of strings."""
+    name = (upload.name or '').lower()
+    try:
+        if name.endswith('.xlsx'):
+            yield from _xlsx_rows(upload)
+        else:
+            yield from _csv_rows(upload)
+    except UnicodeDecodeError:
+        raise ImportFormatError("The CSV is not UTF-8 encoded; save it as \"CSV UTF-8\" and upload it again.")
+    except csv.Error as e:
+        raise ImportFormatError(f"The CSV file is malformed: {e}")
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        raise ImportFormatError("The XLSX file is corrupt or not an Excel workbook.")
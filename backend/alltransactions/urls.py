@@ -29,6 +29,7 @@ urlpatterns = [
     path('purchase-report/',views.PurchaseReportView.as_view(), name='purchasereport'),
     path('purchase-report/branch/<int:branch>/',views.PurchaseReportView.as_view(), name='purchasereport'),
     path('next-bill-no/',views.NextBillNo.as_view(), name='nextbillno'),
+    path('bill-no/reserve/',views.ReserveBillNumbers.as_view(), name='reservebillnumbers'),
     path('stafftransaction/',views.StaffTransactionView.as_view(), name='stafftransaction'),
     path('stafftransaction/branch/<int:branch>/',views.StaffTransactionView.as_view(), name='stafftransaction'),
     path('stafftransaction/staff/<int:staff_pk>/',views.StaffTransactionView.as_view(), name='stafftransaction'),
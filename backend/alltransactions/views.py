@@ -6,23 +6,29 @@ from rest_framework import status
 from .models import PurchaseTransaction,SalesTransaction,Vendor,VendorTransactions,SalesReturn,Purchase,Sales,PurchaseReturn,StaffTransactions,Staff
 from rest_framework.permissions import IsAuthenticated
 from allinventory.models import Product,Brand
+from enterprise.models import Branch
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 from datetime import date, datetime,time
 from django.utils.dateparse import parse_date
-from rest_framework.pagination import PageNumberPagination
+from .pagination import TransactionPagination
 from django.utils.timezone import make_aware,localtime
-from django.db.models import Max,Q
-from .models import Customer
+from django.db.models import Q
+from .models import CustomerAccount
 from django.db import transaction
 from .models import Debtor, DebtorTransaction
 from .serializers import DebtorSerializer, DebtorTransactionSerializer
-from django.db.models.functions import Cast
-from django.db.models import IntegerField
+from .search import rank
+from .statements import STATEMENT_FIELDS, Statement
+from .plans import QueryPlanMixin
+from . import bills, customers, dashboard, movements
+from django.db.models import F, Prefetch, Sum
 
 # Create your views here.
 
-class PurchaseTransactionView(APIView):
+class PurchaseTransactionView(QueryPlanMixin, APIView):
+    select_related = ['vendor', 'person__user']
+    prefetch_related = [Prefetch('purchase', queryset=Purchase.objects.select_related('product'))]
     
     def post(self, request, format=None):
         user = request.user
@@ -42,36 +48,32 @@ class PurchaseTransactionView(APIView):
         search = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        transactions = PurchaseTransaction.objects.filter(enterprise=enterprise)
+        transactions = self.plan(PurchaseTransaction.objects.filter(enterprise=enterprise))
 
         if pk:
-            purchase_transaction = PurchaseTransaction.objects.get(id=pk)
+            purchase_transaction = transactions.get(id=pk)
             serializer = PurchaseTransactionSerializer(purchase_transaction)
             return Response(serializer.data)
         
         if branch:
-            transactions = PurchaseTransaction.objects.filter(enterprise=enterprise,branch=branch)
-        
-        if search:
-            phone_transactions = transactions.filter(purchase__product__name__startswith = search)
-            vendor_trasactions = transactions.filter(vendor__name__icontains = search)
-            bill_transactions = transactions.filter(bill_no__iexact = search)
-            transactions = phone_transactions.union(vendor_trasactions,bill_transactions)
+            transactions = transactions.filter(branch=branch)
         
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
 
         if start_date and end_date:
-            transactions = PurchaseTransaction.objects.filter(
+            transactions = transactions.filter(
                 date__range=(start_date, end_date)
             )
 
-        transactions = transactions.order_by('-date','-id')
+        if search:
+            transactions = rank(transactions, search)
+        else:
+            transactions = transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(transactions, request)
 
         serializer = PurchaseTransactionSerializer(paginated_transactions, many=True)
@@ -103,6 +105,7 @@ class PurchaseTransactionView(APIView):
 
             purchase_transaction = PurchaseTransaction.objects.get(id=pk)
             purchases = purchase_transaction.purchase.all()
+            movements.invalidate_lines(purchases, purchase_transaction.date)
             returned_amount = 0
 
             # In‐memory caches
@@ -144,7 +147,9 @@ class PurchaseTransactionView(APIView):
             return Response("Deleted")
 
 
-class SalesTransactionView(APIView):
+class SalesTransactionView(QueryPlanMixin, APIView):
+    select_related = ['enterprise', 'person__user']
+    prefetch_related = [Prefetch('sales', queryset=Sales.objects.select_related('product'))]
         
     def post(self, request, format=None):
         user = request.user
@@ -163,37 +168,32 @@ class SalesTransactionView(APIView):
         search = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        transactions = SalesTransaction.objects.filter(enterprise=enterprise)
+        transactions = self.plan(SalesTransaction.objects.filter(enterprise=enterprise))
 
         if pk:
-            sales_transaction = SalesTransaction.objects.get(id=pk)
+            sales_transaction = transactions.get(id=pk)
             serializer = SalesTransactionSerializer(sales_transaction)
             return Response(serializer.data)
         
         if branch:
-            transactions = SalesTransaction.objects.filter(enterprise=enterprise,branch=branch)
-        
-        if search:
-            product_transactions = transactions.filter(sales__product__name__startswith = search)
-            customer_transactions = transactions.filter(name__icontains = search)
-            phone_transactions = transactions.filter(phone_number__icontains = search)
-            transactions = product_transactions.union(customer_transactions,phone_transactions)
+            transactions = transactions.filter(branch=branch)
         
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
 
         if start_date and end_date:
-            
-            transactions = SalesTransaction.objects.filter(
+            transactions = transactions.filter(
                 date__range=(start_date, end_date)
             )
 
-        transactions = transactions.order_by('-date','-id')
+        if search:
+            transactions = rank(transactions, search)
+        else:
+            transactions = transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(transactions, request)
 
         serializer = SalesTransactionSerializer(paginated_transactions, many=True)
@@ -252,6 +252,13 @@ class SalesTransactionView(APIView):
         modify_stock = request.GET.get('flag')
         if role != "Admin":
             return Response("Unauthorized")
+        movements.invalidate_lines(sales_transaction.sales.all(), sales_transaction.date)
+        # Returned lines were already taken off the customer's spend
+        refunded = sales_transaction.sales.filter(returned=True).aggregate(total=Sum('total_price'))['total'] or 0
+        customers.record(
+            sales_transaction.enterprise_id, sales_transaction.phone_number,
+            refunded - (sales_transaction.total_amount or 0), visits=-1,
+        )
         if modify_stock == 'false':
             sales_transaction.delete()
             return Response("Deleted")
@@ -340,27 +347,28 @@ class VendorView(APIView):
         vendor.delete()
         return Response("Deleted")
 
-class VendorTransactionView(APIView):
+class VendorTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['vendor']
 
     def get(self,request,branch=None,pk=None):
         role = request.user.person.role
         if role != "Admin":
             return Response("Unauthorized")
         if pk:
-            vendor_transactions = VendorTransactions.objects.get(id=pk)
+            vendor_transactions = self.plan(VendorTransactions.objects).get(id=pk)
             serializer = VendorTransactionSerializer(vendor_transactions)
             return Response(serializer.data)
         query = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        vendor_transactions = VendorTransactions.objects.filter(enterprise = request.user.person.enterprise)
+        vendor_transactions = self.plan(VendorTransactions.objects.filter(enterprise = request.user.person.enterprise))
         if branch:
             vendor_transactions = vendor_transactions.filter(branch = branch)
         if query:
-            vendor_transactions_name = vendor_transactions.filter(vendor__name__icontains=query,enterprise = request.user.person.enterprise)
-            vendor_transactions_brand = vendor_transactions.filter(vendor__brand__name__icontains=query,enterprise = request.user.person.enterprise)
-            vendor_transactions = vendor_transactions_name.union(vendor_transactions_brand)
+            vendor_transactions = vendor_transactions.filter(
+                Q(vendor__name__icontains=query) | Q(vendor__brand__name__icontains=query)
+            )
 
         if start_date and end_date:
             start_date = parse_date(start_date)
@@ -374,8 +382,7 @@ class VendorTransactionView(APIView):
 
         vendor_transactions = vendor_transactions.order_by('-date','-id')
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(vendor_transactions, request)
 
         serializer = VendorTransactionSerializer(paginated_transactions, many=True)
@@ -418,101 +425,66 @@ class VendorTransactionView(APIView):
         return Response("Deleted")
     
 class StatsView(APIView):
-    # permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated]
 
     def get(self,request):
-        print("HERE")
-
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-
+        today = timezone.now().date()
+        start_date = parse_date(request.GET.get('start_date') or '')
+        end_date = parse_date(request.GET.get('end_date') or '')
         if not start_date or not end_date:
-            today = timezone.now().date()
             start_date = today.replace(day=1)  # First day of the current month
             end_date = today
-        
-        start_date = parse_date(start_date) if isinstance(start_date, str) else start_date
-        end_date = parse_date(end_date) if isinstance(end_date, str) else end_date
-
 
         enterprise = request.user.person.enterprise
-    
+
         allstock = Product.objects.filter(brand__enterprise = enterprise).count()
         allbrands = Brand.objects.filter(enterprise = enterprise).count()
 
-        monthlypurchases = Purchase.objects.filter(purchase_transaction__enterprise = enterprise,purchase_transaction__date__range=(start_date, end_date))
-        monthlysales = Sales.objects.filter(sales_transaction__enterprise = enterprise,sales_transaction__date__range=(start_date, end_date))
-
-        dailypurchases = Purchase.objects.filter(purchase_transaction__enterprise = enterprise,purchase_transaction__date = today)
-        dailysales = Sales.objects.filter(sales_transaction__enterprise = enterprise,sales_transaction__date = today)
-
-
-
-
-        ptamt = 0
-        dailyptamt = 0
-
-        pts = PurchaseTransaction.objects.filter(enterprise = enterprise,date__range=(start_date, end_date))
-        if pts:
-            for pt in pts:
-                # #print(pt.total_amount)
-                ptamt = (pt.total_amount+ptamt) if pt.total_amount else ptamt
-
-        pts = PurchaseTransaction.objects.filter(enterprise = enterprise,date = today)
-        if pts:
-            for pt in pts:
-                # #print(pt.total_amount)
-                dailyptamt += pt.total_amount if pt.total_amount else dailyptamt
-
-        stamt = 0
-        dailystamt = 0
-       
-
-        sts = SalesTransaction.objects.filter(enterprise = enterprise,date__range=(start_date, end_date))
-        if sts:
-            for st in sts:
-                stamt = (st.total_amount + stamt) if st.total_amount else stamt
-        
-        sts = SalesTransaction.objects.filter(enterprise=enterprise,date = today)
-        if sts:
-            for st in sts:
-                dailystamt = (st.total_amount + dailystamt) if st.total_amount else dailystamt
-
-        daily_profit = 0
-        for sale in dailysales:
-            product = sale.product
-            daily_profit += sale.unit_price - product.cost_price
-
-        monthly_profit = 0
-        for sale in monthlysales:
-            product = sale.product
-            monthly_profit += sale.unit_price - product.cost_price
-
-        stat = { 
+        branches = dashboard.figures(enterprise, start_date, end_date, today)
+        stat = {
             "enterprise" : enterprise.name,
+            **self.periods(dashboard.total(branches)),
+            "stock": allstock,
+            "brands" : allbrands
+        }
+        # ?breakdown=branch adds the same figures for every branch
+        if request.GET.get('breakdown') == 'branch':
+            stat["branches"] = [
+                {"id": branch.id, "name": branch.name, **self.periods(branches.get(branch.id, {}))}
+                for branch in Branch.objects.filter(enterprise=enterprise).order_by('id')
+            ]
+        return Response(stat)
+
+    @staticmethod
+    def periods(figures):
+        daily = figures.get('daily', dict.fromkeys(dashboard.FIELDS, 0))
+        monthly = figures.get('monthly', dict.fromkeys(dashboard.FIELDS, 0))
+        return {
             "daily":{
-                "purchases" : dailypurchases.count(),
-                "dailyptamt":dailyptamt,
-                "sales": dailysales.count(),
-                "dailystamt":dailystamt,
-                "profit": round(daily_profit,2)
+                "purchases" : daily['purchases'],
+                "dailyptamt": daily['ptamt'],
+                "sales": daily['sales'],
+                "dailystamt": daily['stamt'],
+                "profit": round(daily['profit'],2)
             },
             "monthly":{
-                "purchases" : monthlypurchases.count(),
-                "ptamt":ptamt,
-                "stamt":stamt,
-                "sales": monthlysales.count(),
-                "profit": round(monthly_profit,2)
+                "purchases" : monthly['purchases'],
+                "ptamt": monthly['ptamt'],
+                "stamt": monthly['stamt'],
+                "sales": monthly['sales'],
+                "profit": round(monthly['profit'],2)
             },
-            "stock": allstock,
-            "brands" : allbrands
         }
-        return Response(stat)
-    
 
-class PurchaseReturnView(APIView):
+
+class PurchaseReturnView(QueryPlanMixin, APIView):
 
     permission_classes = [IsAuthenticated]
+    select_related = ['purchase_transaction__vendor', 'purchase_transaction__person__user']
+    prefetch_related = [
+        Prefetch('purchases', queryset=Purchase.objects.select_related('product', 'purchase_transaction')),
+        Prefetch('purchase_transaction__purchase', queryset=Purchase.objects.select_related('product')),
+    ]
 
 
     def get(self, request,branch=None):
@@ -522,7 +494,7 @@ class PurchaseReturnView(APIView):
         end_date = request.GET.get('end_date')
 
         # Base QuerySet
-        purchase_returns = PurchaseReturn.objects.filter(enterprise=enterprise)
+        purchase_returns = self.plan(PurchaseReturn.objects.filter(enterprise=enterprise))
 
         if branch:
             purchase_returns = purchase_returns.filter(branch=branch)
@@ -531,15 +503,13 @@ class PurchaseReturnView(APIView):
         # 1) Search Filter
         # -----------------
         if search:
-            name_filter = purchase_returns.filter(purchase_transaction__vendor__name__icontains=search)
-            # amount_filter = purchase_returns.filter(amount__icontains=search)
-            product_name = purchase_returns.filter(purchases__product__name__icontains=search)
-            
-            # union() will merge the two QuerySets without duplicates.
-            purchase_returns = name_filter.union(product_name)
+            matches = (
+                Q(purchase_transaction__vendor__name__icontains=search)
+                | Q(purchases__product__name__icontains=search)
+            )
             if search.isdigit():
-                id = purchase_returns.filter(id__icontains=search)
-                purchase_returns = purchase_returns.union(id)
+                matches |= Q(id__icontains=search)
+            purchase_returns = purchase_returns.filter(matches).distinct()
 
         # ---------------------
         # 2) Date Range Filter
@@ -558,10 +528,9 @@ class PurchaseReturnView(APIView):
         # ---------------------------------
         # 3) Sort and Paginate the Results
         # ---------------------------------
-        purchase_returns = purchase_returns.order_by('-id')  # Sorting
+        purchase_returns = purchase_returns.order_by('-date', '-id')  # Sorting
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(purchase_returns, request)
 
         serializer = PurchaseReturnSerializer(paginated_data, many=True)
@@ -746,33 +715,63 @@ class PurchaseReportView(APIView):
         return Response(list)
      
 class NextBillNo(APIView):
+    """The bill number the next sale (or ?kind=purchase/return) of
+    ?branch= will get. Only a preview: the number is taken when the bill
+    is created without one."""
+    permission_classes = [IsAuthenticated]
+
     def get(self, request):
-        max_bill_no = SalesTransaction.objects.filter(
-            enterprise=request.user.person.enterprise
-        ).aggregate(
-            max_bill_no=Max(Cast('bill_no', output_field=IntegerField()))
-        )['max_bill_no']
-        
-        if max_bill_no is None:
-            next_bill_no = 1
-        else:
-            next_bill_no = max_bill_no + 1
-            
-        return Response({'bill_no': str(next_bill_no)})
-    
-class StaffTransactionView(APIView):
+        enterprise = request.user.person.enterprise
+        kind = request.GET.get('kind', 'sales')
+        if kind not in bills.KINDS:
+            return Response({"error": f"Unknown kind {kind}"}, status=status.HTTP_400_BAD_REQUEST)
+        branch = request.GET.get('branch') or request.user.person.branch_id
+        try:
+            branch = int(branch) if branch else None
+        except ValueError:
+            return Response({"error": "branch must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        if branch and not Branch.objects.filter(id=branch, enterprise=enterprise).exists():
+            return Response({"error": "Unknown branch"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'bill_no': bills.peek(enterprise.id, branch, kind)})
+
+
+class ReserveBillNumbers(APIView):
+    """Take a block of bill numbers for a till that bills offline and sends
+    its bills with these numbers later. Body: {"branch", "kind", "count"}."""
     permission_classes = [IsAuthenticated]
+    MAX_BLOCK = 1000
+
+    def post(self, request):
+        enterprise = request.user.person.enterprise
+        kind = request.data.get('kind', 'sales')
+        try:
+            count = int(request.data.get('count', 1))
+            branch = int(request.data['branch'])
+        except (KeyError, TypeError, ValueError):
+            return Response({"error": "branch and count must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if kind not in bills.KINDS or not 1 <= count <= self.MAX_BLOCK:
+            return Response({"error": f"kind must be one of {', '.join(bills.KINDS)} and count 1-{self.MAX_BLOCK}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not Branch.objects.filter(id=branch, enterprise=enterprise).exists():
+            return Response({"error": "Unknown branch"}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            numbers = bills.allocate(enterprise.id, branch, kind, count)
+        return Response({'kind': kind, 'branch': branch, 'bill_numbers': numbers}, status=status.HTTP_201_CREATED)
+
+
+class StaffTransactionView(QueryPlanMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    select_related = ['staff']
 
     def get(self,request,pk=None,branch=None, staff_pk = None):
         if pk:
-            staff_transactions = StaffTransactions.objects.get(id=pk)
+            staff_transactions = self.plan(StaffTransactions.objects).get(id=pk)
             serializer = StaffTransactionSerializer(staff_transactions)
             return Response(serializer.data)
 
         query = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        staff_transactions = StaffTransactions.objects.filter(enterprise = request.user.person.enterprise)
+        staff_transactions = self.plan(StaffTransactions.objects.filter(enterprise = request.user.person.enterprise))
         if branch:
             staff_transactions = staff_transactions.filter(branch = branch)
 
@@ -794,10 +793,9 @@ class StaffTransactionView(APIView):
                 date__range=(start_date, end_date)
             )
 
-        staff_transactions = staff_transactions.order_by('-id')
+        staff_transactions = staff_transactions.order_by('-date', '-id')
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(staff_transactions, request)
 
         serializer = StaffTransactionSerializer(paginated_transactions, many=True)
@@ -850,20 +848,24 @@ class CustomerTotalView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self,request,pk):
-        customer = Customer.objects.filter(phone_number=pk).first()
-        if customer:
-            sales = SalesTransaction.objects.filter(phone_number=customer.phone_number,enterprise=request.user.person.enterprise)
-            total_amount = 0
-            for sale in sales:
-                total_amount += sale.total_amount
-            return Response(f"RS. {total_amount}")
-        else:
-            customer = Customer.objects.create(phone_number=pk,enterprise=request.user.person.enterprise)
-            return Response("Customer created")
-
-class SalesReturnView(APIView):
+        # One row read through the (enterprise, phone_number) unique index;
+        # the totals are kept by the sales serializers
+        customer = CustomerAccount.objects.filter(
+            enterprise=request.user.person.enterprise, phone_number=pk
+        ).values('phone_number', 'name', 'total_spent', 'visits', 'last_visit').first()
+        if customer is None:
+            customer = {'phone_number': pk, 'name': '', 'total_spent': 0, 'visits': 0, 'last_visit': None}
+        customer['total_spent'] = customer['total_spent'] or 0
+        return Response(customer)
+
+class SalesReturnView(QueryPlanMixin, APIView):
 
     permission_classes = [IsAuthenticated]
+    select_related = ['sales_transaction__enterprise', 'sales_transaction__person__user']
+    prefetch_related = [
+        Prefetch('sales', queryset=Sales.objects.select_related('product', 'sales_transaction')),
+        Prefetch('sales_transaction__sales', queryset=Sales.objects.select_related('product')),
+    ]
 
 
     def get(self, request,branch=None):
@@ -873,7 +875,7 @@ class SalesReturnView(APIView):
         end_date = request.GET.get('end_date')
 
         # Base QuerySet
-        sales_returns = SalesReturn.objects.filter(enterprise=enterprise)
+        sales_returns = self.plan(SalesReturn.objects.filter(enterprise=enterprise))
 
         if branch:
             sales_returns = sales_returns.filter(branch=branch)
@@ -882,15 +884,13 @@ class SalesReturnView(APIView):
         # 1) Search Filter
         # -----------------
         if search:
-            name_filter = sales_returns.filter(sales_transaction__customer_name=search)
-            # amount_filter = purchase_returns.filter(amount__icontains=search)
-            product_name = sales_returns.filter(sales__product__name__icontains=search)
-            
-            # union() will merge the two QuerySets without duplicates.
-            sales_returns = name_filter.union(product_name)
+            matches = (
+                Q(sales_transaction__name__icontains=search)
+                | Q(sales__product__name__icontains=search)
+            )
             if search.isdigit():
-                id = sales_returns.filter(id__icontains=search)
-                sales_returns = sales_returns.union(id)
+                matches |= Q(id__icontains=search)
+            sales_returns = sales_returns.filter(matches).distinct()
 
         # ---------------------
         # 2) Date Range Filter
@@ -909,10 +909,9 @@ class SalesReturnView(APIView):
         # ---------------------------------
         # 3) Sort and Paginate the Results
         # ---------------------------------
-        sales_returns = sales_returns.order_by('-id')  # Sorting
+        sales_returns = sales_returns.order_by('-date', '-id')  # Sorting
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(sales_returns, request)
 
         serializer = SalesReturnSerializer(paginated_data, many=True)
@@ -976,12 +975,13 @@ class DebtorsView(APIView):
         debtor.delete()
         return Response("Deleted", status=status.HTTP_204_NO_CONTENT)
     
-class DebtorTransactionView(APIView):
+class DebtorTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['debtor']
 
     def get(self, request, debtor_pk=None, pk=None, branch=None):
         enterprise = request.user.person.enterprise
-        debtor_transactions = DebtorTransaction.objects.filter(enterprise=enterprise)
+        debtor_transactions = self.plan(DebtorTransaction.objects.filter(enterprise=enterprise))
         
         query = request.GET.get('search')
         start_date = request.GET.get('start_date')
@@ -990,7 +990,7 @@ class DebtorTransactionView(APIView):
             debtor_transactions = debtor_transactions.filter(branch=branch)
 
         if pk:
-            debtor_transactions = DebtorTransaction.objects.filter(id=pk, enterprise=enterprise).first()
+            debtor_transactions = self.plan(DebtorTransaction.objects.filter(id=pk, enterprise=enterprise)).first()
             serializer = DebtorTransactionSerializer(debtor_transactions)
             return Response(serializer.data)
         
@@ -1015,8 +1015,7 @@ class DebtorTransactionView(APIView):
         debtor_transactions = debtor_transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(debtor_transactions, request)
 
         serializer = DebtorTransactionSerializer(paginated_data, many=True)
@@ -1066,31 +1065,22 @@ class VendorStatementView(APIView):
         if not vendor:
             return Response("Vendor not found", status=status.HTTP_404_NOT_FOUND)
 
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-
-        if start_date and end_date:
-            start_date = parse_date(start_date)
-            end_date = parse_date(end_date)
-
-    
-        if start_date and end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__range=(start_date, end_date)
-            )
-        elif start_date and not end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__gte=start_date
-            )
-        elif not start_date and end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__lte=end_date
-            )
-
-        vendor_transactions = vendor_transactions.order_by('id')
-        vendor = VendorSerializer(vendor).data 
-        vts = VendorTransactionSerializer(vendor_transactions, many=True).data
-        return Response({'vendor_data': vendor, 'vendor_transactions': vts})
+        start_date = parse_date(request.GET.get('start_date') or '')
+        end_date = parse_date(request.GET.get('end_date') or '')
+
+        statement = Statement(
+            vendor_transactions.annotate(vendor_name=F('vendor__name')),
+            vendor.due,
+            start=start_date,
+            end=end_date,
+            fields=STATEMENT_FIELDS,
+        )
+        return statement.response(
+            request,
+            {'vendor_data': VendorSerializer(vendor).data},
+            'vendor_transactions',
+            f'statement-{vendor.name}',
+        )
     
 class DebtorStatementView(APIView):
     permission_classes = [IsAuthenticated]
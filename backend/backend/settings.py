@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'inventory',
     'transaction',
     'userauth',
@@ -192,6 +193,10 @@ dotenv.load_dotenv()
 
 PASSWORD_RESET_TIMEOUT = 900
 
+# Seconds a brand valuation list may be served from the cache (0 disables it).
+# Needs a cache shared by all workers; see inventory/valuation.py.
+BRAND_VALUATION_CACHE_SECONDS = int(os.getenv('BRAND_VALUATION_CACHE_SECONDS', '0'))
+
 
 # Email Configuration
 EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend"
@@ -8,6 +8,28 @@ python manage.py makemigrations allinventory alltransactions enterprise userauth
 echo "===> Running migrations..."
 python manage.py migrate --noinput
 
+# No merge thread survives a restart; fail the jobs it left behind
+echo "===> Recovering interrupted merge jobs..."
+python manage.py recover_merge_jobs
+
+echo "===> Backfilling IMEI registry..."
+python manage.py backfill_imei_registry
+
+echo "===> Rebuilding daily summaries..."
+python manage.py rebuild_daily_summaries
+
+echo "===> Building transaction search documents..."
+python manage.py rebuild_search_documents
+python manage.py rebuild_product_search_documents
+
+# Only report drift at boot; the scheduler service fixes it at night
+echo "===> Checking stock counters..."
+python manage.py reconcile_stock_counters --dry-run --quiet
+
+# Accounts that do not exist yet; the scheduler rebuilds the rest at night
+echo "===> Creating missing customer accounts..."
+python manage.py rebuild_customer_totals --missing
+
 # 2. (Optional) Re-collect static files if anything changed
 echo "===> Collecting static files..."
 python manage.py collectstatic --noinput
@@ -44,3 +44,34 @@ class Branch(models.Model):
     enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE,related_name='branch')
     def __str__(self):
         return f"{self.name} - {self.enterprise.name}"
+
+
+class MergeJob(models.Model):
+    """A catalog merge from one branch into another, run in the background.
+    done/total count the rows written so far, for progress reporting."""
+    KIND_CHOICES = [
+        ('phone', 'Phone'),
+        ('product', 'Product'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='merge_jobs')
+    source = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='+')
+    target = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    brand = models.IntegerField(null=True, blank=True)
+    items = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Merge {self.kind} {self.source_id} -> {self.target_id}: {self.status}"
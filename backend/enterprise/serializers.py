@@ -1,4 +1,4 @@
-from .models import Enterprise,Person, Branch
+from .models import Enterprise,Person, Branch, MergeJob
 from rest_framework import serializers
 
 
@@ -14,4 +14,9 @@ class BranchSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_enterprise_name(self, obj):
-        return obj.enterprise.name if obj.enterprise else None
\ No newline at end of file
+        return obj.enterprise.name if obj.enterprise else None
+
+class MergeJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MergeJob
+        fields = '__all__'
@@ -9,5 +9,6 @@ urlpatterns = [
     path('staffbranch/<int:id>/',views.BranchStaffView.as_view(),name='branch_staff'),
     path('role/',views.RoleView.as_view(),name='user_role'),
     path('info/',views.EnterpriseInfoView.as_view(),name='enterprise_info'),
+    path('mergejob/<int:id>/',views.MergeJobView.as_view(),name='merge_job'),
    
 ]
\ No newline at end of file
@@ -1,11 +1,12 @@
 from django.shortcuts import render
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.utils.dateparse import parse_date
 from datetime import datetime, date
-from .serializers import BranchSerializer, EnterpriseSerializer
-from .models import Branch, Enterprise
+from .serializers import BranchSerializer, EnterpriseSerializer, MergeJobSerializer
+from .models import Branch, Enterprise, MergeJob
 from alltransactions.models import Staff
 from alltransactions.serializers import StaffSerializer
 
@@ -90,4 +91,14 @@ class EnterpriseInfoView(APIView):
     def get(self, request):
         enterprise = request.user.person.enterprise
         serializer = EnterpriseSerializer(enterprise)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+class MergeJobView(APIView):
+    """Progress of a background branch merge."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        job = MergeJob.objects.filter(id=id, enterprise=request.user.person.enterprise).first()
+        if job is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(MergeJobSerializer(job).data)
@@ -41,8 +41,14 @@ class Phone(models.Model):
     #     self.save()
 
 class Item(models.Model):
-    imei_number = models.CharField(max_length=15,validators=[MinLengthValidator(15)])
+    imei_number = models.CharField(max_length=15,validators=[MinLengthValidator(15)],db_index=True)
     phone = models.ForeignKey(Phone, related_name="item",on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['phone', 'imei_number']),
+        ]
+
     def __str__(self):
         return f"Item {self.imei_number} - "
 
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from . models import Brand,Phone,Item
+from . import valuation
 
 class BrandSerializer(serializers.ModelSerializer):
     items = serializers.SerializerMethodField(read_only = True)
@@ -8,21 +9,25 @@ class BrandSerializer(serializers.ModelSerializer):
         model = Brand
         fields = '__all__'
 
+    # Lists pass brands through valuation.annotate(); a lone brand falls back
+    # to one aggregate query.
     def get_items(self,obj):
-        items = Item.objects.filter(phone__brand = obj).count()
-        return items
+        if not hasattr(obj, 'item_count'):
+            obj.item_count, obj.item_value = valuation.totals(obj)
+        return obj.item_count
     
     def get_amount(self,obj):
-        items = Item.objects.filter(phone__brand = obj)
-        amount = 0
-        for item in items:
-            amount = (amount + item.phone.selling_price) if item.phone.selling_price else amount
-        return amount
+        if not hasattr(obj, 'item_value'):
+            obj.item_count, obj.item_value = valuation.totals(obj)
+        return obj.item_value
 
 
 
 
 class PhoneSerializer(serializers.ModelSerializer):
+    """IMEIs are only listed when the view passes include_imeis in the context
+    (and prefetches the in-stock IMEI records as `in_stock_records`);
+    otherwise a phone carries its count alone."""
     brand_name = serializers.SerializerMethodField(read_only = True)
     imeis = serializers.SerializerMethodField(read_only= True)
 
@@ -30,13 +35,13 @@ class PhoneSerializer(serializers.ModelSerializer):
         model = Phone 
         fields = "__all__"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_imeis'):
+            self.fields.pop('imeis')
     
     def get_brand_name(self,obj):
         return obj.brand.name
 
     def get_imeis(self,obj):
-        imeis = obj.item.all()
-        list = []
-        for imei in imeis:
-            list.append(imei.imei_number)
-        return list
\ No newline at end of file
+        return [record.imei_number for record in obj.in_stock_records]
@@ -0,0 +1,64 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Enterprise
+from inventory.models import Brand, Phone
+from transaction.models import IMEIRecord
+
+
+class PhoneIMEITestCase(BranchTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        brand = Brand.objects.create(name="Brand", **cls.common)
+        cls.phones = [
+            Phone.objects.create(name=f"Phone {p}", brand=brand, count=5, **cls.common)
+            for p in range(4)
+        ]
+        IMEIRecord.objects.bulk_create([
+            IMEIRecord(
+                imei_number=f"{p}{'1' if n < 3 else '2'}{n:013d}", phone=phone, state='in_stock', **cls.common,
+            )
+            for p, phone in enumerate(cls.phones) for n in range(5)
+        ] + [
+            IMEIRecord(imei_number=f"{p}90000000000000", phone=phone, enterprise=cls.enterprise, state='sold')
+            for p, phone in enumerate(cls.phones)
+        ])
+
+        other = Enterprise.objects.create(name="Other")
+        cls.foreign = Phone.objects.create(name="Foreign", brand=Brand.objects.create(name="B", enterprise=other))
+
+    def test_list_has_no_imeis_by_default(self):
+        response = self.client.get(f'/inventory/phone/branch/{self.branch.id}/')
+        self.assertEqual(len(response.json()), 4)
+        self.assertNotIn('imeis', response.json()[0])
+        self.assertEqual(response.json()[0]['count'], 5)
+
+    def test_include_imeis_uses_one_prefetch(self):
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(f'/inventory/phone/branch/{self.branch.id}/?include=imeis')
+        Phone.objects.create(name="Extra", brand=self.phones[0].brand, branch=self.branch)
+        with CaptureQueriesContext(connection) as more:
+            response = self.client.get(f'/inventory/phone/branch/{self.branch.id}/?include=imeis')
+        self.assertEqual(len(few), len(more))
+        rows = {row['name']: row['imeis'] for row in response.json()}
+        self.assertEqual(len(rows['Phone 1']), 5)
+        self.assertEqual(rows['Extra'], [])
+
+    def test_imei_pages_follow_cursor(self):
+        phone = self.phones[2]
+        response = self.client.get(f'/inventory/phone/{phone.id}/imeis/?page_size=2')
+        seen = response.json()['results']
+        while response.json()['next']:
+            response = self.client.get(response.json()['next'])
+            seen += response.json()['results']
+        self.assertEqual(seen, [f"2{'1' if n < 3 else '2'}{n:013d}" for n in range(5)])
+
+    def test_prefix_filter(self):
+        phone = self.phones[3]
+        response = self.client.get(f'/inventory/phone/{phone.id}/imeis/?prefix=32')
+        self.assertEqual(response.json()['results'], ['320000000000003', '320000000000004'])
+
+    def test_other_enterprise_phone_is_not_found(self):
+        response = self.client.get(f'/inventory/phone/{self.foreign.id}/imeis/')
+        self.assertEqual(response.status_code, 404)
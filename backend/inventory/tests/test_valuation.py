@@ -0,0 +1,63 @@
+import datetime
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from alltransactions.tests.base import BranchTestCase
+from inventory.models import Brand, Phone, Item
+from inventory import valuation
+from transaction.rollups import schedule_refresh
+
+
+class BrandValuationTestCase(BranchTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.brands = []
+        for b in range(3):
+            brand = Brand.objects.create(name=f"Brand {b}", **cls.common)
+            cls.brands.append(brand)
+            for p in range(b + 1):
+                phone = Phone.objects.create(name=f"Phone {b}{p}", brand=brand, selling_price=100 * (p + 1), **cls.common)
+                for n in range(p):
+                    Item.objects.create(imei_number=f"{b}{p}{n:013d}", phone=phone)
+        # A phone without a price and one without items count as nothing.
+        Phone.objects.create(name="Unpriced", brand=cls.brands[0], branch=cls.branch, selling_price=None)
+        Item.objects.create(imei_number="9" * 15, phone=Phone.objects.get(name="Unpriced"))
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/inventory/brand/branch/{self.branch.id}/')
+        self.assertEqual(response.status_code, 200)
+        return {row['name']: (row['items'], row['amount']) for row in response.json()}, len(queries)
+
+    def test_counts_and_values(self):
+        data, _ = self.get()
+        self.assertEqual(data, {
+            'Brand 0': (1, 0),
+            'Brand 1': (1, 200),
+            'Brand 2': (3, 200 + 2 * 300),
+        })
+
+    def test_query_count_does_not_grow_with_brands(self):
+        _, before = self.get()
+        for b in range(3, 8):
+            brand = Brand.objects.create(name=f"Brand {b}", enterprise=self.enterprise, branch=self.branch)
+            phone = Phone.objects.create(name=f"Phone {b}", brand=brand, branch=self.branch, selling_price=10)
+            Item.objects.create(imei_number=f"{b}" * 15, phone=phone)
+        _, after = self.get()
+        self.assertEqual(before, after)
+
+    @override_settings(BRAND_VALUATION_CACHE_SECONDS=60)
+    def test_snapshot_is_dropped_on_stock_move(self):
+        valuation.invalidate(self.enterprise.id, self.branch.id)
+        first, _ = self.get()
+        _, cached = self.get()
+        self.assertLessEqual(cached, 3)
+
+        phone = Phone.objects.get(name="Phone 11")
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.objects.create(imei_number="1" * 15, phone=phone)
+            schedule_refresh((self.enterprise.id, self.branch.id, datetime.date(2024, 1, 1)))
+        data, _ = self.get()
+        self.assertEqual(data['Brand 1'], (2, 400))
+        self.assertNotEqual(first, data)
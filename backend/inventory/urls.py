@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import BrandView,PhoneView, PhoneIMEIView,generate_barcode, MergeBrandView, MergeProductBrandView
+from .views import BrandView,PhoneView, PhoneIMEIView, PhoneItemView,generate_barcode, MergeBrandView, MergeProductBrandView
 
 urlpatterns = [
     path('brand/',BrandView.as_view(), name='brand'),
@@ -7,6 +7,7 @@ urlpatterns = [
     path('phone/',PhoneView.as_view(),name = 'phone'),
     path('phone/imeis/<str:id>/', PhoneIMEIView.as_view(), name='phoneimei'),
     path('phone/<int:id>/',PhoneView.as_view(),name = 'phone'),
+    path('phone/<int:id>/imeis/', PhoneItemView.as_view(), name='phoneitems'),
     path('phone/branch/<int:branch>/', PhoneView.as_view()),
     path('deletephone/<int:id>/',PhoneView.as_view(),name = 'phone'),
     path('brand/branch/<int:branch>/', BrandView.as_view()),
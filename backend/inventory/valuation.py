@@ -0,0 +1,55 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+# Brand valuation: the item count and stock value of every brand in one
+# grouped query (brand -> phone -> item), instead of one count and one item
+# scan per brand. The serialized list can also be kept as a snapshot in the
+# cache for BRAND_VALUATION_CACHE_SECONDS; every commit that moves stock drops
+# the snapshot of its branch. With several workers the snapshot only stays
+# correct if CACHES points at a shared backend (redis, memcached, database).
+
+def annotate(queryset):
+    return queryset.annotate(
+        item_count=Count('phone__item'),
+        item_value=Coalesce(Sum('phone__item__phone__selling_price'), Value(0.0)),
+    )
+
+
+def totals(brand):
+    """Item count and value of one brand that was not annotated."""
+    return annotate(type(brand).objects.filter(pk=brand.pk)).values_list('item_count', 'item_value').get()
+
+
+def cache_key(enterprise_id, branch_id=None):
+    return f"brand-valuation:{enterprise_id}:{branch_id or 'all'}"
+
+
+def snapshot(enterprise_id, branch_id, build):
+    """Return the cached brand list of a branch, calling build() on a miss."""
+    timeout = getattr(settings, 'BRAND_VALUATION_CACHE_SECONDS', 0)
+    if not timeout:
+        return build()
+    key = cache_key(enterprise_id, branch_id)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout)
+    return data
+
+
+def invalidate(enterprise_id, branch_id=None):
+    keys = [cache_key(enterprise_id)]
+    if branch_id:
+        keys.append(cache_key(enterprise_id, branch_id))
+    cache.delete_many(keys)
+
+
+def schedule_invalidate(enterprise_id, branch_id=None):
+    """Drop the snapshot once the surrounding database transaction commits."""
+    transaction.on_commit(partial(invalidate, enterprise_id, branch_id))
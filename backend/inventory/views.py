@@ -1,16 +1,21 @@
 from django.shortcuts import render
-from .models import Brand, Phone, Item
+from .models import Brand, Phone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from alltransactions.merge import BranchMergeMixin
 from .serializers import BrandSerializer,PhoneSerializer
+from . import valuation
 from rest_framework.decorators import api_view
 from barcode import EAN13
 from barcode.writer import SVGWriter
 import io
 from django.http import FileResponse
 from enterprise.models import Branch
+from transaction.models import IMEIRecord
 from rest_framework import status
+from rest_framework.pagination import CursorPagination
+from django.db.models import Prefetch
 
 
 
@@ -29,19 +34,23 @@ class BrandView(APIView):
                 return Response(serializer.data)
             else:
                 return Response([])
-        brands=Brand.objects.all()
-        brands = Brand.objects.filter(enterprise = request.user.person.enterprise)
-        if branch:
-            brands = brands.filter(branch=branch)
-        serializer = BrandSerializer(brands,many=True)
-        return Response(serializer.data)
+        enterprise = request.user.person.enterprise
+
+        def build():
+            brands = Brand.objects.filter(enterprise = enterprise)
+            if branch:
+                brands = brands.filter(branch=branch)
+            return BrandSerializer(valuation.annotate(brands).order_by('id'),many=True).data
+
+        return Response(valuation.snapshot(enterprise.id, branch, build))
 
     def post(self,request,*args, **kwargs):
         data = request.data
         data["enterprise"] = request.user.person.enterprise.id
         serializer = BrandSerializer(data=data)
         if serializer.is_valid(raise_exception = True):
-            serializer.save()
+            brand = serializer.save()
+            valuation.schedule_invalidate(brand.enterprise_id, brand.branch_id)
             return Response(serializer.data)
         
     def delete(self,request,id):
@@ -49,24 +58,32 @@ class BrandView(APIView):
             return Response("UNAUTHORIZED")
         brand = Brand.objects.get(id=id)
         brand.delete()
+        valuation.schedule_invalidate(brand.enterprise_id, brand.branch_id)
         return Response("DELETED")
         
 class PhoneView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self,request,id=None, branch=None,*args, **kwargs):
-        phones=Phone.objects.all()
-        phones = Phone.objects.filter(brand__enterprise = request.user.person.enterprise)
+        phones = Phone.objects.filter(brand__enterprise = request.user.person.enterprise).select_related('brand')
+        context = {'include_imeis': 'imeis' in request.GET.get('include', '').split(',')}
+        if context['include_imeis']:
+            phones = phones.prefetch_related(Prefetch(
+                'imei_records',
+                queryset=IMEIRecord.objects.filter(state__in=IMEIRecord.IN_STOCK_STATES)
+                .only('phone_id', 'imei_number').order_by('imei_number'),
+                to_attr='in_stock_records',
+            ))
         if id:
             try:
-                phone = Phone.objects.get(id=id)
-                serializer = PhoneSerializer(phone)
+                phone = phones.get(id=id)
+                serializer = PhoneSerializer(phone, context=context)
                 return Response(serializer.data)
             except Phone.DoesNotExist:
                 return Response(status=status.HTTP_404_NOT_FOUND)
         if branch:
             phones = phones.filter(branch=branch)
-        serializer = PhoneSerializer(phones,many=True)
+        serializer = PhoneSerializer(phones,many=True,context=context)
         return Response(serializer.data)
 
     def post(self,request,*args, **kwargs):
@@ -75,7 +92,8 @@ class PhoneView(APIView):
         serializer = PhoneSerializer(data=data)
         if serializer.is_valid(raise_exception = True):
             #print("YAHA SAMMAAA")
-            serializer.save()
+            phone = serializer.save()
+            valuation.schedule_invalidate(phone.brand.enterprise_id, phone.branch_id)
             return Response(serializer.data)
         
     def patch(self,request,id):
@@ -98,6 +116,7 @@ class PhoneView(APIView):
             phone.brand.stock = phone.brand.stock - old_stock + phone.stock
             phone.brand.save()
             phone.save()
+            valuation.schedule_invalidate(phone.brand.enterprise_id, phone.branch_id)
             return Response(serializer.data)
         return Response(serializer.errors)
     
@@ -107,6 +126,7 @@ class PhoneView(APIView):
             return Response("UNAUTHORIZED")
         phone = Phone.objects.get(id=id)
         phone.delete()
+        valuation.schedule_invalidate(phone.brand.enterprise_id, phone.branch_id)
         return Response("DELETED")
 
 class PhoneIMEIView(APIView):
@@ -115,19 +135,44 @@ class PhoneIMEIView(APIView):
 
     def get(self,request,id,branch=None):
         user = request.user
-        phone = Phone.objects.filter(id = id).first()
-        if branch:
-            phone = phone.filter(branch=branch).first()
-        #print(phone)
-        items = Item.objects.filter(phone=phone)
+        phones = Phone.objects.filter(id = id, brand__enterprise = user.person.enterprise)
         if branch:
-            items = items.filter(branch=branch)
-        imei_list = []
+            phones = phones.filter(branch=branch)
+        phone = phones.first()
+        if not phone:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        imei_list = list(
+            IMEIRecord.objects.filter(phone=phone, state__in=IMEIRecord.IN_STOCK_STATES)
+            .order_by('imei_number')
+            .values_list('imei_number', flat=True)
+        )
 
-        for item in items:
-            imei_list.append(item.imei_number)
-            
         return Response({"phone":phone.name,"list":imei_list})
+
+
+class IMEIPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'imei_number'
+
+
+class PhoneItemView(APIView):
+    """In-stock IMEIs of one phone, walked by cursor in IMEI order.
+    ?prefix= narrows the page to IMEIs starting with the given digits."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self,request,id):
+        phone = Phone.objects.filter(id=id, brand__enterprise=request.user.person.enterprise).first()
+        if not phone:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        records = IMEIRecord.objects.filter(phone=phone, state__in=IMEIRecord.IN_STOCK_STATES)
+        prefix = request.GET.get('prefix')
+        if prefix:
+            records = records.filter(imei_number__startswith=prefix)
+        paginator = IMEIPagination()
+        page = paginator.paginate_queryset(records.only('id', 'imei_number'), request, view=self)
+        return paginator.get_paginated_response([record.imei_number for record in page])
     
 @api_view(['GET'])
 def generate_barcode(request):
@@ -142,30 +187,16 @@ def generate_barcode(request):
 
 
 
-class MergeBrandView(APIView):
+class MergeBrandView(BranchMergeMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    kind = 'phone'
+
     def post(self,request,selfbranch,mergebranch,format=None):
-        
-        branch = Branch.objects.get(id=mergebranch)
-        print(branch.name)
-        # return Response("Merged")
+        return self.merge(request, selfbranch, mergebranch)
 
-        for brand in Brand.objects.filter(branch=branch):
-            if brand.name in Brand.objects.filter(branch_id=selfbranch).values_list('name',flat=True):
-                continue
-            Brand.objects.create(name=brand.name,enterprise=brand.enterprise,branch_id=selfbranch)
-        return Response("Merged")
+class MergeProductBrandView(BranchMergeMixin, APIView):
+    permission_classes = [IsAuthenticated]
+    kind = 'phone'
 
-class MergeProductBrandView(APIView):
     def post(self,request,selfbranch,mergebranch,brand,format=None):
-        print("MERGING PRODUCTS")
-        brand = Brand.objects.get(id=brand)
-        phones = Phone.objects.filter(branch_id=mergebranch,brand__name__iexact=brand.name)
-        print("THERESASDSAD ",phones)
-        for phone in Phone.objects.filter(branch_id=mergebranch,brand__name__iexact=brand.name):
-            if Phone.objects.filter(branch_id=selfbranch, brand=brand, name__iexact=phone.name).exists():
-                print("HERE")
-                continue
-            p = Phone.objects.create(name=phone.name,enterprise=phone.enterprise,branch_id=selfbranch,cost_price=phone.cost_price,selling_price=phone.selling_price,brand_id=brand.id)
-            print("CREATED",p)
-            
-        return Response("Merged")
\ No newline at end of file
+        return self.merge(request, selfbranch, mergebranch, brand)
\ No newline at end of file
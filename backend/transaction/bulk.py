@@ -0,0 +1,97 @@
+from collections import Counter, defaultdict
+
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+from inventory.models import Brand, Phone, Item
+from .models import Purchase, IMEIRecord
+
+
+# Bulk path for phone purchases. Purchase.save creates the Item and the
+# IMEIRecord one row at a time; here the same rows are written with a fixed
+# number of statements whatever the size of the invoice.
+
+BATCH_SIZE = 1000
+
+
+def imei_errors(enterprise, imeis):
+    """Return {imei: message} for IMEIs that cannot be purchased: wrong
+    length, repeated in the batch, or already in stock in the enterprise."""
+    errors = {}
+    for imei, count in Counter(imeis).items():
+        if len(imei) != 15 or not imei.isdigit():
+            errors[imei] = "IMEI must be 15 digits."
+        elif count > 1:
+            errors[imei] = "IMEI is repeated."
+
+    candidates = [imei for imei in set(imeis) if imei not in errors]
+    in_stock = IMEIRecord.objects.filter(
+        enterprise=enterprise,
+        imei_number__in=candidates,
+        state__in=IMEIRecord.IN_STOCK_STATES,
+    ).values_list('imei_number', flat=True)
+    for imei in in_stock:
+        errors[imei] = "IMEI is already in stock."
+    return errors
+
+
+def create_purchases(txn, items):
+    """Create the purchase lines of txn from dicts with phone (a Phone),
+    imei_number and unit_price. Updates Item, IMEIRecord and the phone/brand
+    counters. Returns (purchases, phones) where phones maps id to Phone."""
+    phones = Phone.objects.in_bulk({item['phone'].pk for item in items})
+
+    purchases = Purchase.objects.bulk_create(
+        [
+            Purchase(
+                purchase_transaction=txn,
+                phone=phones[item['phone'].pk],
+                imei_number=item['imei_number'],
+                unit_price=item['unit_price'],
+            )
+            for item in items
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+    Item.objects.bulk_create(
+        [Item(imei_number=p.imei_number, phone=p.phone) for p in purchases],
+        batch_size=BATCH_SIZE,
+    )
+    IMEIRecord.objects.bulk_create(
+        [
+            IMEIRecord(
+                enterprise_id=txn.enterprise_id,
+                branch_id=txn.branch_id,
+                imei_number=p.imei_number,
+                phone=p.phone,
+                purchase=p,
+                sale=None,
+                state='in_stock',
+            )
+            for p in purchases
+        ],
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['enterprise', 'imei_number'],
+        update_fields=['branch', 'phone', 'purchase', 'sale', 'state'],
+    )
+
+    # Stock moves at selling price, same as the single-row path
+    phone_counts = Counter(p.phone_id for p in purchases)
+    brand_deltas = defaultdict(lambda: [0, 0])
+    for phone_id, count in phone_counts.items():
+        phone = phones[phone_id]
+        Phone.objects.filter(pk=phone_id).update(
+            count=Coalesce(F('count'), 0) + count,
+            stock=Coalesce(F('stock'), 0.0) + Coalesce(F('selling_price'), 0.0) * count,
+        )
+        brand_deltas[phone.brand_id][0] += count
+        brand_deltas[phone.brand_id][1] += (phone.selling_price or 0) * count
+    for brand_id, (count, stock) in brand_deltas.items():
+        Brand.objects.filter(pk=brand_id).update(
+            count=Coalesce(F('count'), 0) + count,
+            stock=Coalesce(F('stock'), 0.0) + stock,
+        )
+
+    return purchases, phones
@@ -0,0 +1,105 @@
+from alltransactions.uploads import ImportFormatError, iter_rows
+
+from .bulk import create_purchases, imei_errors
+
+
+# Streaming stock intake. The upload is read row by row (never loaded whole),
+# checked in chunks against the IMEI registry and written through the bulk
+# purchase path. Only the IMEIs seen so far and the error report stay in memory.
+
+CHUNK_SIZE = 1000
+COLUMNS = ('phone', 'imei_number', 'unit_price')
+
+
+def _column_map(header):
+    """Column positions from a header row, or None if the row is data."""
+    names = [cell.lower().replace(' ', '_') for cell in header]
+    if not any('imei' in name for name in names):
+        return None
+    positions = {}
+    for index, name in enumerate(names):
+        if 'imei' in name:
+            positions['imei_number'] = index
+        elif 'price' in name:
+            positions['unit_price'] = index
+        elif 'phone' in name or 'model' in name:
+            positions['phone'] = index
+    missing = [column for column in COLUMNS if column not in positions]
+    if missing:
+        raise ImportFormatError(f"Missing column(s): {', '.join(missing)}")
+    return positions
+
+
+class PurchaseImport:
+    """Import the rows of one upload into a single purchase transaction."""
+
+    def __init__(self, txn, phones):
+        self.txn = txn
+        self.phones_by_id = {phone.id: phone for phone in phones}
+        self.phones_by_name = {phone.name.lower(): phone for phone in phones}
+        self.seen = set()
+        self.errors = []
+        self.imported = 0
+        self.total = 0
+
+    def _error(self, row_number, imei, message):
+        self.errors.append({'row': row_number, 'imei_number': imei, 'error': message})
+
+    def _parse(self, row_number, row, positions):
+        try:
+            values = {column: row[positions[column]] for column in COLUMNS}
+        except IndexError:
+            self._error(row_number, None, "Row has too few columns.")
+            return None
+
+        phone_ref = values['phone']
+        phone = self.phones_by_id.get(int(phone_ref)) if phone_ref.isdigit() else None
+        phone = phone or self.phones_by_name.get(phone_ref.lower())
+        if phone is None:
+            self._error(row_number, values['imei_number'], f"Unknown phone '{phone_ref}'.")
+            return None
+        try:
+            unit_price = float(values['unit_price'])
+        except ValueError:
+            self._error(row_number, values['imei_number'], "Unit price is not a number.")
+            return None
+        return {'phone': phone, 'imei_number': values['imei_number'], 'unit_price': unit_price}
+
+    def _flush(self, chunk):
+        if not chunk:
+            return
+        errors = imei_errors(self.txn.enterprise, list(dict.fromkeys(item['imei_number'] for _, item in chunk)))
+        valid = []
+        for row_number, item in chunk:
+            imei = item['imei_number']
+            if imei in errors:
+                self._error(row_number, imei, errors[imei])
+            elif imei in self.seen:
+                self._error(row_number, imei, "IMEI is repeated.")
+            else:
+                self.seen.add(imei)
+                valid.append(item)
+        if valid:
+            create_purchases(self.txn, valid)
+            self.imported += len(valid)
+            self.total += sum(item['unit_price'] for item in valid)
+
+    def run(self, rows):
+        positions = dict(zip(COLUMNS, range(len(COLUMNS))))
+        chunk = []
+        for row_number, row in enumerate(rows, start=1):
+            if not any(row):
+                continue
+            if row_number == 1:
+                header = _column_map(row)
+                if header:
+                    positions = header
+                    continue
+            item = self._parse(row_number, row, positions)
+            if item:
+                chunk.append((row_number, item))
+            if len(chunk) >= CHUNK_SIZE:
+                self._flush(chunk)
+                chunk = []
+        self._flush(chunk)
+        self.errors.sort(key=lambda error: error['row'])
@@ -0,0 +1,76 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from transaction.models import IMEIRecord, Purchase, Sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Create missing IMEIRecord rows from existing purchase and sales lines, "
+        "and link sales to the purchase line that costs them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        existing = set(IMEIRecord.objects.values_list('enterprise_id', 'imei_number'))
+
+        # Latest purchase / sale line wins for each (enterprise, imei)
+        purchases = {}
+        for purchase in Purchase.objects.select_related('purchase_transaction').order_by('id').iterator(chunk_size=batch_size):
+            key = (purchase.purchase_transaction.enterprise_id, purchase.imei_number)
+            if key not in existing:
+                purchases[key] = purchase
+
+        sales = {}
+        for sale in Sales.objects.select_related('sales_transaction').order_by('id').iterator(chunk_size=batch_size):
+            key = (sale.sales_transaction.enterprise_id, sale.imei_number)
+            if key in purchases:
+                sales[key] = sale
+
+        records = []
+        for key, purchase in purchases.items():
+            sale = sales.get(key)
+            if purchase.returned:
+                state = 'returned_to_vendor'
+            elif sale and sale.returned:
+                state = 'returned_by_customer'
+            elif sale:
+                state = 'sold'
+            else:
+                state = 'in_stock'
+            records.append(IMEIRecord(
+                enterprise_id=key[0],
+                imei_number=key[1],
+                branch_id=purchase.purchase_transaction.branch_id,
+                phone_id=purchase.phone_id,
+                purchase=purchase,
+                sale=sale,
+                state=state,
+            ))
+
+        IMEIRecord.objects.bulk_create(records, batch_size=batch_size, ignore_conflicts=True)
+        self.stdout.write(self.style.SUCCESS(f"Created {len(records)} IMEI records"))
+
+        # A sale is costed by the latest purchase of its IMEI on or before its date
+        unlinked = list(Sales.objects.filter(purchase__isnull=True).select_related('sales_transaction'))
+        bought = defaultdict(list)
+        for purchase in Purchase.objects.filter(
+            imei_number__in={sale.imei_number for sale in unlinked}
+        ).select_related('purchase_transaction').order_by('purchase_transaction__date', 'id'):
+            bought[(purchase.purchase_transaction.enterprise_id, purchase.imei_number)].append(purchase)
+        linked = []
+        for sale in unlinked:
+            txn = sale.sales_transaction
+            earlier = [p for p in bought[(txn.enterprise_id, sale.imei_number)] if p.purchase_transaction.date <= txn.date]
+            if earlier:
+                sale.purchase = earlier[-1]
+                linked.append(sale)
+        Sales.objects.bulk_update(linked, ['purchase'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"Linked {len(linked)} sales to their purchase"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from alltransactions.customers import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute customer spend, visit counts and last visits from sales bills and returns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enterprise', type=int, help="Only rebuild this enterprise id")
+        parser.add_argument(
+            '--missing', action='store_true',
+            help="Only create the accounts that do not exist yet, leaving live totals alone",
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild(enterprise_id=options['enterprise'], missing_only=options['missing'])
+        verb = "Created" if options['missing'] else "Rebuilt"
+        self.stdout.write(self.style.SUCCESS(f"{verb} totals for {count} customers"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from transaction.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute DailyBranchSummary rows from purchase, sales and return transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enterprise', type=int, help="Only rebuild this enterprise id")
+        parser.add_argument('--start', help="First date to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--end', help="Last date to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        count = rebuild(enterprise_id=options['enterprise'], start=start, end=end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} daily summaries"))
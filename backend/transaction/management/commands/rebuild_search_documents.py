@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from alltransactions.search import rebuild
+from transaction.models import PurchaseTransaction, SalesTransaction
+
+
+class Command(BaseCommand):
+    help = "Build the search_document of phone transactions that have none (or of every one with --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        sources = [
+            (PurchaseTransaction, ['vendor'], 'purchase__phone'),
+            (SalesTransaction, [], 'sales__phone'),
+        ]
+        for model, related, lines in sources:
+            updated = rebuild(model, related, lines, everything=options['all'], batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Indexed {updated} {model._meta.label} rows"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from alltransactions.counters import branches, reconcile_branch
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute count/stock of phones, products and their brands branch by branch, "
+        "report the rows that drifted and fix them (run nightly by run_schedule)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--enterprise', type=int, help="Only reconcile this enterprise id")
+        parser.add_argument('--branch', type=int, help="Only reconcile this branch id")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without writing")
+        parser.add_argument(
+            '--recount-products', action='store_true',
+            help="Derive product counts from purchase/sale quantities instead of keeping the stored count",
+        )
+        parser.add_argument('--quiet', action='store_true', help="Only print the per-branch totals")
+
+    def handle(self, *args, **options):
+        ids = [options['branch']] if options['branch'] else branches(options['enterprise'])
+        total = 0
+        for branch_id in ids:
+            drifts = reconcile_branch(
+                branch_id, recount_products=options['recount_products'], fix=not options['dry_run']
+            )
+            total += len(drifts)
+            if not options['quiet']:
+                for drift in drifts:
+                    self.stdout.write(
+                        f"{drift.model} {drift.pk} {drift.field}: {drift.stored} -> {drift.actual}"
+                    )
+            if drifts:
+                self.stdout.write(f"Branch {branch_id}: {len(drifts)} drifted values")
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} drifted values in {len(ids)} branches"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from alltransactions.merge import recover
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark merge jobs left queued or running by a restart as failed "
+        "(or run them again with --resume); run before the web server starts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resume', action='store_true', help="Run the interrupted jobs again instead")
+
+    def handle(self, *args, **options):
+        jobs = recover(resume=options['resume'])
+        verb = "Resumed" if options['resume'] else "Failed"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(jobs)} interrupted merge jobs"))
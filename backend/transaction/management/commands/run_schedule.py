@@ -0,0 +1,34 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from transaction.schedule import JOBS, next_run
+
+# Sleep in short steps so a suspended host or clock change does not skip a run
+MAX_SLEEP = 300
+
+
+class Command(BaseCommand):
+    help = "Run the periodic maintenance jobs of transaction.schedule, forever"
+
+    def handle(self, *args, **options):
+        due = {job: next_run(job, timezone.localtime()) for job in JOBS}
+        for job, at in due.items():
+            self.stdout.write(f"{job.command} next runs at {at:%Y-%m-%d %H:%M}")
+        while True:
+            job = min(due, key=due.get)
+            wait = (due[job] - timezone.localtime()).total_seconds()
+            if wait > 0:
+                time.sleep(min(wait, MAX_SLEEP))
+                continue
+            self.stdout.write(f"===> {job.command} {' '.join(job.args)}")
+            try:
+                call_command(job.command, *job.args, stdout=self.stdout, stderr=self.stderr)
+            except Exception as e:
+                self.stderr.write(f"{job.command} failed: {e!r}")
+            finally:
+                connections.close_all()
+            due[job] = next_run(job, timezone.localtime())
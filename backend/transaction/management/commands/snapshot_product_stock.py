@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from allinventory.models import Product
+from alltransactions.movements import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Record per-product stock snapshots that product reports start from"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Snapshot date (YYYY-MM-DD); defaults to the end of last month")
+        parser.add_argument('--enterprise', type=int, help="Only snapshot this enterprise id")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            day = parse_date(options['date'])
+            if day is None:
+                raise CommandError(f"Invalid date {options['date']!r}")
+        else:
+            day = timezone.now().date().replace(day=1) - datetime.timedelta(days=1)
+        products = Product.objects.all()
+        if options['enterprise'] is not None:
+            products = products.filter(enterprise_id=options['enterprise'])
+        count = take_snapshots(day, products)
+        self.stdout.write(self.style.SUCCESS(f"Recorded {count} stock snapshots for {day}"))
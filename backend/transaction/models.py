@@ -2,8 +2,10 @@ from django.db import models
 from inventory.models import Brand, Phone,Item
 from enterprise.models import Enterprise
 from django.core.validators import MinLengthValidator
+from django.utils import timezone
 from django.db import transaction
 from alltransactions.models import Debtor, DebtorTransaction
+from alltransactions import ledger, search
 
 class Vendor(models.Model):
     name = models.CharField(max_length=255)
@@ -32,6 +34,10 @@ class PurchaseTransaction(models.Model):
     cashout_date = models.DateField(null=True)
     branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE, related_name='purchase_transaction_branch',null=True,blank=True)
     person = models.ForeignKey('enterprise.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='purchase_transactions')
+    search_document = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
 
     def calculate_total_amount(self):
         total = sum(purchase.unit_price for purchase in self.purchase.all())
@@ -39,6 +45,14 @@ class PurchaseTransaction(models.Model):
         self.save()
         return self.total_amount
 
+    def build_search_document(self, lines=None):
+        lines = self.purchase.select_related('phone') if lines is None else lines
+        return search.document(self.bill_no, self.vendor.name, *(part for line in lines for part in (line.phone.name, line.imei_number)))
+
+    def update_search_document(self):
+        self.search_document = self.build_search_document()
+        PurchaseTransaction.objects.filter(pk=self.pk).update(search_document=self.search_document)
+
     
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
@@ -92,6 +106,9 @@ class Purchase(models.Model):
             
             item = Item.objects.create(imei_number = self.imei_number,phone=self.phone)
             phone.save()
+            super().save(*args, **kwargs)
+            IMEIRecord.register_purchase(self)
+            return
 
         super().save(*args, **kwargs)
 
@@ -99,6 +116,7 @@ class Purchase(models.Model):
         item = Item.objects.filter(imei_number=self.imei_number).first()
         if item:
             item.delete()
+        IMEIRecord.objects.filter(purchase=self).delete()
         super().delete(*args, **kwargs)
 
 
@@ -119,6 +137,10 @@ class SalesTransaction(models.Model):
     amount_paid = models.FloatField(null=True,blank=True,default=0)
     emi_debtor = models.ForeignKey('transaction.EMIDebtor', on_delete=models.CASCADE, null=True, blank=True, related_name='sales_transaction_emi',default=None)
     person = models.ForeignKey('enterprise.Person', on_delete=models.SET_NULL, null=True, blank=True, related_name='sales_transactions')
+    search_document = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
 
     def calculate_total_amount(self):
         total = sum(sale.unit_price for sale in self.sales.all())
@@ -127,6 +149,15 @@ class SalesTransaction(models.Model):
         self.total_amount = total
         self.save()
         return self.total_amount    
+
+    def build_search_document(self, lines=None):
+        lines = self.sales.select_related('phone') if lines is None else lines
+        return search.document(self.bill_no, self.name, self.phone_number, *(part for line in lines for part in (line.phone.name, line.imei_number)))
+
+    def update_search_document(self):
+        self.search_document = self.build_search_document()
+        SalesTransaction.objects.filter(pk=self.pk).update(search_document=self.search_document)
+
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
 
@@ -156,6 +187,9 @@ class Sales(models.Model):
         blank=True,
         related_name='purchases'
     )
+    # The purchase line the handset came from when it was sold; costs the sale
+    # even after the IMEI is bought again (set by IMEIRecord.mark_sold)
+    purchase = models.ForeignKey(Purchase, on_delete=models.SET_NULL, null=True, blank=True, related_name='sold_as')
 
     def __str__(self):
         return f"{self.phone} @ {self.unit_price} - {self.sales_transaction.branch.name if self.sales_transaction.branch else 'Unknown Branch'} at {self.sales_transaction.enterprise.name}"
@@ -167,9 +201,9 @@ class Sales(models.Model):
         if self.pk is None:  # Only update stock for new purchases
             print("HERE checking")
             self.checkit()
-            purchase = Purchase.objects.filter(imei_number = self.imei_number).first()
-            if purchase:
-                self.profit = self.unit_price - purchase.unit_price
+            record = IMEIRecord.lookup(self.sales_transaction.enterprise_id, self.imei_number)
+            if record and record.purchase:
+                self.profit = self.unit_price - record.purchase.unit_price
             self.save()
 
     def checkit(self, *args, **kwargs):
@@ -206,7 +240,8 @@ class Sales(models.Model):
                 scheme.save()
 
 
-        purchase_date = Purchase.objects.filter(imei_number = self.imei_number, purchase_transaction__branch=self.sales_transaction.branch).first().purchase_transaction.date
+        record = IMEIRecord.lookup(self.sales_transaction.enterprise_id, self.imei_number, self.sales_transaction.branch_id)
+        purchase_date = record.purchase.purchase_transaction.date
         pps = PriceProtection.objects.filter(enterprise=self.sales_transaction.enterprise,branch=self.sales_transaction.branch, phone=self.phone, from_date__lte=self.sales_transaction.date, to_date__gte=self.sales_transaction.date)
         prev_pps = PriceProtection.objects.filter(sales=self)
         print("For sale id:", self.pk, "found price protections:", pps)
@@ -216,7 +251,6 @@ class Sales(models.Model):
                 pp.calculate_receivable()
 
         pps = pps.filter(from_date__gte = purchase_date)
-        print("HERE for sale id:", self.pk, "filtered price protections:", pps, "with purchase date:", purchase_date, "from purchase transaction:", Purchase.objects.filter(imei_number = self.imei_number).first().purchase_transaction.id)
         if pps.exists():
             for pp in pps:
                 pp.sales.add(self)
@@ -231,6 +265,7 @@ class Sales(models.Model):
         if item:
             item.delete()
         super().save(*args, **kwargs)  # Save again after processing the schemes and pp
+        IMEIRecord.mark_sold(self)
 
 
 class Scheme(models.Model):
@@ -325,11 +360,13 @@ class VendorTransaction(models.Model):
     base = models.BooleanField(default=False)
     type = models.CharField(max_length=20,choices=(('base','base'),('return','return'),('payment','payment')),default='base')
     due = models.FloatField(null=True, blank=True, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
     
     @transaction.atomic
     def delete(self, *args, **kwargs):
-        self.vendor.due = self.vendor.due + self.amount
-        self.vendor.save() 
+        ledger.post(Vendor, self.vendor_id, self.amount)
         super().delete(*args, **kwargs)
 
     def __str__(self):
@@ -360,11 +397,128 @@ class EMIDebtorTransaction(models.Model):
     sales_transaction = models.ForeignKey(SalesTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name='emi_sales_transaction')  
     desc = models.TextField(null=True, blank=True)
     due = models.FloatField(null=True, blank=True, default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', '-date', '-id'])]
+
     def __str__(self):
         return f"EMI Transaction of {self.amount} for {self.debtor.name} on {self.date} - {self.branch.name if self.branch else 'Unknown Branch'} at {self.enterprise.name}"
 
     @transaction.atomic
     def delete(self, *args, **kwargs):
-        self.debtor.due = self.debtor.due + self.amount
-        self.debtor.save()
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        ledger.post(EMIDebtor, self.debtor_id, self.amount)
+        super().delete(*args, **kwargs)
+
+class IMEIRecord(models.Model):
+    """One row per IMEI per enterprise, tracking where the handset currently is."""
+    STATE_CHOICES = [
+        ('in_stock', 'In Stock'),
+        ('sold', 'Sold'),
+        ('returned_to_vendor', 'Returned To Vendor'),
+        ('returned_by_customer', 'Returned By Customer'),
+    ]
+    IN_STOCK_STATES = ('in_stock', 'returned_by_customer')
+
+    imei_number = models.CharField(max_length=15,validators=[MinLengthValidator(15)])
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='imei_records')
+    branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE, related_name='imei_records',null=True,blank=True)
+    phone = models.ForeignKey(Phone, on_delete=models.CASCADE, related_name='imei_records')
+    purchase = models.ForeignKey(Purchase, on_delete=models.SET_NULL, null=True, blank=True, related_name='imei_record')
+    sale = models.ForeignKey(Sales, on_delete=models.SET_NULL, null=True, blank=True, related_name='imei_record')
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='in_stock')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'imei_number'], name='unique_imei_per_enterprise'),
+        ]
+        indexes = [
+            models.Index(fields=['branch', 'state']),
+            models.Index(fields=['phone', 'state']),
+        ]
+
+    @classmethod
+    def register_purchase(cls, purchase):
+        """Point the IMEI at this purchase line (new purchase or edited IMEI/phone).
+        Editing a line keeps its handset's state and sale; only buying an IMEI
+        another line bought before (a rebuy) puts it back in stock."""
+        txn = purchase.purchase_transaction
+        fields = {
+            'branch_id': txn.branch_id, 'phone_id': purchase.phone_id, 'purchase': purchase,
+            'updated_at': timezone.now(),
+        }
+        current = cls.objects.filter(enterprise_id=txn.enterprise_id, imei_number=purchase.imei_number).first()
+        previous = cls.objects.filter(purchase=purchase).exclude(imei_number=purchase.imei_number)
+        if current is None:
+            # The line's IMEI was edited: its record moves to the new number with its history
+            record = previous.first()
+            if record is None:
+                cls.objects.create(enterprise_id=txn.enterprise_id, imei_number=purchase.imei_number, **fields)
+                return
+            cls.objects.filter(pk=record.pk).update(imei_number=purchase.imei_number, **fields)
+            return
+        previous.delete()
+        if current.purchase_id != purchase.pk:
+            # A handset sold or returned to the vendor and bought again is back in stock
+            fields.update(state='in_stock', sale=None)
+        cls.objects.filter(pk=current.pk).update(**fields)
+
+    @classmethod
+    def mark_sold(cls, sale):
+        txn = sale.sales_transaction
+        # If the sale's IMEI was edited, the previous handset is back on the shelf
+        cls.objects.filter(sale=sale).exclude(imei_number=sale.imei_number).update(state='in_stock', sale=None)
+        cls.objects.filter(enterprise_id=txn.enterprise_id, imei_number=sale.imei_number).update(
+            sale=sale, state='returned_by_customer' if sale.returned else 'sold'
+        )
+        # Cost the sale from the purchase current now, unless it already has the
+        # purchase of this IMEI (an edit after a rebuy keeps the original cost)
+        record = cls.objects.filter(enterprise_id=txn.enterprise_id, imei_number=sale.imei_number).first()
+        if record and record.purchase_id and (sale.purchase_id is None or sale.purchase.imei_number != sale.imei_number):
+            sale.purchase_id = record.purchase_id
+            Sales.objects.filter(pk=sale.pk).update(purchase=record.purchase_id)
+
+    @classmethod
+    def restock(cls, sales):
+        """Sales lines removed or deleted: their handsets are in stock again."""
+        cls.objects.filter(sale__in=sales).update(state='in_stock', sale=None)
+
+    @classmethod
+    def lookup(cls, enterprise_id, imei_number, branch_id=None):
+        qs = cls.objects.select_related('purchase__purchase_transaction').filter(
+            enterprise_id=enterprise_id, imei_number=imei_number
+        )
+        if branch_id is not None:
+            qs = qs.filter(branch_id=branch_id)
+        return qs.first()
+
+    def __str__(self):
+        return f"IMEI {self.imei_number} ({self.state}) - {self.branch.name if self.branch else 'Unknown Branch'} at {self.enterprise.name}"
+
+
+class DailyBranchSummary(models.Model):
+    """Per-day, per-branch totals used by the dashboard. Rebuilt from the
+    transactions of that day whenever they change (see transaction.rollups)."""
+    enterprise = models.ForeignKey(Enterprise, on_delete=models.CASCADE, related_name='daily_summaries')
+    branch = models.ForeignKey('enterprise.Branch', on_delete=models.CASCADE, related_name='daily_summaries',null=True,blank=True)
+    date = models.DateField()
+    purchases = models.IntegerField(default=0)
+    purchase_amount = models.FloatField(default=0)
+    sales = models.IntegerField(default=0)
+    sales_amount = models.FloatField(default=0)
+    profit = models.FloatField(default=0)
+    purchase_returns = models.IntegerField(default=0)
+    purchase_return_amount = models.FloatField(default=0)
+    sales_returns = models.IntegerField(default=0)
+    sales_return_amount = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['enterprise', 'branch', 'date'], name='unique_daily_branch_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['enterprise', 'date']),
+        ]
+
+    def __str__(self):
+        return f"Summary {self.date} - {self.branch.name if self.branch else 'Unknown Branch'} at {self.enterprise.name}"
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from .models import Sales, Scheme, PriceProtection, PPItems, Purchase
+
+
+# Set-based counterpart of Sales.checkit for a whole scheme / price protection.
+# checkit stays the single-sale path (a sale being created or edited); these
+# helpers are used when the scheme or price protection itself changes and
+# every sale in its window has to be matched again.
+
+BATCH_SIZE = 1000
+
+
+def _window_sales(obj):
+    return Sales.objects.filter(
+        phone=obj.phone,
+        sales_transaction__enterprise=obj.enterprise,
+        sales_transaction__branch=obj.branch,
+        sales_transaction__date__gte=obj.from_date,
+        sales_transaction__date__lte=obj.to_date,
+    )
+
+
+def _sync_membership(through, owner_field, owner_id, eligible_ids):
+    """Insert/delete through rows so the membership equals eligible_ids.
+    Returns the (added, removed) sale id sets."""
+    current = set(
+        through.objects.filter(**{owner_field: owner_id}).values_list('sales_id', flat=True)
+    )
+    added = eligible_ids - current
+    removed = current - eligible_ids
+
+    if removed:
+        through.objects.filter(**{owner_field: owner_id, 'sales_id__in': removed}).delete()
+    if added:
+        through.objects.bulk_create(
+            [through(**{owner_field: owner_id, 'sales_id': sale_id}) for sale_id in added],
+            batch_size=BATCH_SIZE,
+        )
+    return added, removed
+
+
+@transaction.atomic
+def reconcile_scheme(scheme):
+    eligible = set(_window_sales(scheme).values_list('id', flat=True))
+    added, removed = _sync_membership(Scheme.sales.through, 'scheme_id', scheme.pk, eligible)
+    scheme.calculate_receivable()
+    return added, removed
+
+
+@transaction.atomic
+def reconcile_price_protection(pp):
+    # Same rule as checkit: the phone must have been bought (in this branch)
+    # on or before the day the price protection starts.
+    purchase_date = Purchase.objects.filter(
+        imei_number=OuterRef('imei_number'),
+        purchase_transaction__branch=OuterRef('sales_transaction__branch'),
+    ).order_by('id').values('purchase_transaction__date')[:1]
+
+    eligible = {
+        sale_id: (phone_id, imei)
+        for sale_id, phone_id, imei in _window_sales(pp)
+        .annotate(purchase_date=Subquery(purchase_date))
+        .filter(purchase_date__lte=pp.from_date)
+        .values_list('id', 'phone_id', 'imei_number')
+    }
+    added, removed = _sync_membership(
+        PriceProtection.sales.through, 'priceprotection_id', pp.pk, set(eligible)
+    )
+
+    if removed:
+        PPItems.objects.filter(
+            pp=pp,
+            imei_number__in=Sales.objects.filter(id__in=removed).values('imei_number'),
+        ).delete()
+    if added:
+        existing = set(
+            PPItems.objects.filter(pp=pp).values_list('imei_number', flat=True)
+        )
+        PPItems.objects.bulk_create(
+            [
+                PPItems(pp=pp, phone_id=eligible[sale_id][0], imei_number=eligible[sale_id][1])
+                for sale_id in added
+                if eligible[sale_id][1] not in existing
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    pp.calculate_receivable()
+    return added, removed
@@ -0,0 +1,127 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from inventory import valuation
+
+from .models import DailyBranchSummary, Purchase, PurchaseTransaction, Sales, SalesTransaction
+
+
+# DailyBranchSummary maintenance. A summary row is never patched with deltas:
+# whenever a transaction touching (enterprise, branch, date) commits, that
+# day's row is recomputed from the source tables with a handful of grouped
+# aggregates. The same aggregates, unscoped, rebuild the whole table.
+
+FIELDS = [
+    'purchases', 'purchase_amount', 'sales', 'sales_amount', 'profit',
+    'purchase_returns', 'purchase_return_amount', 'sales_returns', 'sales_return_amount',
+]
+
+
+def _scope(prefix, filters):
+    return {prefix + key: value for key, value in filters.items()}
+
+
+def _group(qs, prefix, **aggregates):
+    return qs.order_by().values_list(
+        prefix + 'enterprise_id', prefix + 'branch_id', prefix + 'date'
+    ).annotate(**aggregates)
+
+
+def collect(**filters):
+    """Return {(enterprise_id, branch_id, date): {field: value}} for the days
+    matching filters (enterprise_id, branch_id, date, date__gte, date__lte...)."""
+    queries = [
+        (
+            _group(PurchaseTransaction.objects.filter(**filters), '',
+                   purchase_amount=Sum('total_amount')),
+            ['purchase_amount'],
+        ),
+        (
+            _group(Purchase.objects.filter(**_scope('purchase_transaction__', filters)), 'purchase_transaction__',
+                   purchases=Count('id')),
+            ['purchases'],
+        ),
+        (
+            _group(SalesTransaction.objects.filter(**filters), '',
+                   sales_amount=Sum('total_amount')),
+            ['sales_amount'],
+        ),
+        (
+            _group(
+                Sales.objects.filter(**_scope('sales_transaction__', filters))
+                .annotate(purchase_price=F('purchase__unit_price')),
+                'sales_transaction__',
+                sales=Count('id'),
+                profit=Sum(F('unit_price') - F('purchase_price')),
+            ),
+            ['sales', 'profit'],
+        ),
+        (
+            _group(Purchase.objects.filter(**_scope('purchase_return__', filters)), 'purchase_return__',
+                   purchase_returns=Count('id'), purchase_return_amount=Sum('unit_price')),
+            ['purchase_returns', 'purchase_return_amount'],
+        ),
+        (
+            _group(Sales.objects.filter(**_scope('sales_return__', filters)), 'sales_return__',
+                   sales_returns=Count('id'), sales_return_amount=Sum('unit_price')),
+            ['sales_returns', 'sales_return_amount'],
+        ),
+    ]
+
+    days = {}
+    for qs, fields in queries:
+        for enterprise_id, branch_id, date, *values in qs:
+            if enterprise_id is None:
+                continue
+            row = days.setdefault((enterprise_id, branch_id, date), dict.fromkeys(FIELDS, 0))
+            for field, value in zip(fields, values):
+                row[field] = value or 0
+    return days
+
+
+def refresh(enterprise_id, branch_id, date):
+    values = collect(enterprise_id=enterprise_id, branch_id=branch_id, date=date).get(
+        (enterprise_id, branch_id, date), dict.fromkeys(FIELDS, 0)
+    )
+    DailyBranchSummary.objects.update_or_create(
+        enterprise_id=enterprise_id, branch_id=branch_id, date=date, defaults=values
+    )
+
+
+def day_key(obj):
+    """Summary key of a purchase/sales transaction or return."""
+    return (obj.enterprise_id, obj.branch_id, obj.date)
+
+
+def schedule_refresh(*keys):
+    """Refresh the given summary rows once the surrounding database
+    transaction commits. Every stock move passes through here, so the brand
+    valuation snapshot of the branch is dropped at the same time."""
+    for key in set(keys):
+        transaction.on_commit(partial(refresh, *key))
+    for enterprise_id, branch_id in {key[:2] for key in keys}:
+        valuation.schedule_invalidate(enterprise_id, branch_id)
+
+
+@transaction.atomic
+def rebuild(enterprise_id=None, start=None, end=None):
+    filters = {}
+    if enterprise_id is not None:
+        filters['enterprise_id'] = enterprise_id
+    if start is not None:
+        filters['date__gte'] = start
+    if end is not None:
+        filters['date__lte'] = end
+
+    days = collect(**filters)
+    DailyBranchSummary.objects.filter(**filters).delete()
+    DailyBranchSummary.objects.bulk_create(
+        [
+            DailyBranchSummary(enterprise_id=e, branch_id=b, date=d, **values)
+            for (e, b, d), values in days.items()
+        ],
+        batch_size=1000,
+    )
+    return len(days)
@@ -0,0 +1,29 @@
+import datetime
+from collections import namedtuple
+
+
+# Periodic maintenance. The jobs below change data that tills write at the
+# same time, so they run at night from the `scheduler` service (manage.py
+# run_schedule) instead of on every container boot. A job runs daily at
+# `hour`, or monthly on `day` (1-28) at `hour`, in the project time zone.
+
+Job = namedtuple('Job', 'command args hour day', defaults=((), 3, None))
+
+JOBS = [
+    Job('reconcile_stock_counters', ('--quiet',), hour=3),
+    # Month-end stock, the starting point of product movement reports
+    Job('snapshot_product_stock', hour=2, day=1),
+    Job('rebuild_customer_totals', hour=4),
+]
+
+
+def next_run(job, now):
+    """First time at or after now (an aware local datetime) that job is due."""
+    at = now.replace(hour=job.hour, minute=0, second=0, microsecond=0)
+    if job.day is None:
+        return at if at >= now else at + datetime.timedelta(days=1)
+    at = at.replace(day=job.day)
+    if at < now:
+        month = at.replace(day=1) + datetime.timedelta(days=32)
+        at = month.replace(day=job.day)
+    return at
@@ -2,12 +2,16 @@ from rest_framework import serializers
 from .models import Vendor, Phone, Purchase, PurchaseTransaction,Sales, SalesTransaction,Scheme,Subscheme,Item, PriceProtection,PurchaseReturn, SalesReturn
 from inventory.models import Brand
 from django.db import transaction
-from .models import VendorTransaction, EMIDebtor,EMIDebtorTransaction
+from .models import VendorTransaction, EMIDebtor,EMIDebtorTransaction, IMEIRecord
 from django.utils.timezone import localtime
 from transaction.models import VendorTransaction
 from alltransactions.models import Debtor, DebtorTransaction
 from alltransactions.serializers import DebtorTransactionSerializer
+from alltransactions import ledger
 from django.utils import timezone
+from .reconcile import reconcile_scheme, reconcile_price_protection
+from .rollups import schedule_refresh, day_key
+from .bulk import create_purchases, imei_errors
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
@@ -537,41 +541,39 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
             cache[phone_id] = Phone.objects.select_for_update().get(id=phone_id)
         return cache[phone_id]
 
+    def validate(self, attrs):
+        if self.instance is None and attrs.get('purchase'):
+            imeis = [item['imei_number'] for item in attrs['purchase']]
+            errors = imei_errors(attrs['enterprise'], imeis)
+            if errors:
+                raise serializers.ValidationError({'purchase': [f"{imei}: {msg}" for imei, msg in errors.items()]})
+        return attrs
+
     @transaction.atomic
     def create(self, validated_data):
         purchase_items = validated_data.pop('purchase', [])
         txn = PurchaseTransaction.objects.create(**validated_data)
 
-        phones_cache = {}
-        brands_cache = {}
-
-        # Create each purchase and update stocks
-        for item_data in purchase_items:
-            phone_obj = self._get_locked_phone(item_data['phone'].id, phones_cache)
-            Purchase.objects.create(purchase_transaction=txn, **item_data)
-
-            # Update phone
-            phone_obj.count = (phone_obj.count or 0) + 1
-            phone_obj.stock = (phone_obj.stock or 0) + phone_obj.selling_price
-            phone_obj.save()
-
-            # Update brand
-            brand_obj = phone_obj.brand
-            if brand_obj.id not in brands_cache:
-                # Already locked via phone FK
-                brands_cache[brand_obj.id] = brand_obj
-            brand = brands_cache[brand_obj.id]
-            brand.count = (brand.count or 0) + 1
-            brand.stock = (brand.stock or 0) + phone_obj.selling_price
-            brand.save()
+        # All lines are written in bulk; counters move with one F() update per phone/brand
+        purchases, phones = create_purchases(txn, purchase_items)
 
         desc = f'Purchase made for transaction {txn.bill_no}, Items:'
+        for purchase in purchases:
+            desc += f' {phones[purchase.phone_id].name} (IMEI: {purchase.imei_number}),'
 
+        total = sum(purchase.unit_price for purchase in purchases)
+        txn.total_amount = total
+        txn.save(update_fields=['total_amount'])
+        self.record_vendor_transactions(txn, desc)
+        txn.update_search_document()
 
-        for purchase in txn.purchase.all():
-            desc += f' {purchase.phone.name} (IMEI: {purchase.imei_number}),'
+        schedule_refresh(day_key(txn))
+        return txn
+
+    def record_vendor_transactions(self, txn, desc):
+        """Post the base (and cash/cheque payment) vendor transactions of a new purchase."""
+        total = txn.total_amount or 0
         # Record base vendor transaction
-        total = txn.calculate_total_amount()
         base_data = {
             'vendor': txn.vendor,
             'date': txn.date,
@@ -598,8 +600,6 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                 })
             VendorTransactionSerializer().create(pay_data)
 
-        return txn
-
     @transaction.atomic
     def update(self, instance, validated_data):
         # Preserve old transaction info
@@ -607,6 +607,7 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
         old_vendor = instance.vendor
         old_total = instance.total_amount
         old_date = instance.date
+        old_key = day_key(instance)
 
         # Update simple fields
         for field in ['vendor', 'date', 'enterprise', 'bill_no', 'method', 'cheque_number', 'cashout_date']:
@@ -639,7 +640,8 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
 
                 # Handle IMEI change
                 new_imei = data.get('imei_number')
-                if new_imei and new_imei != purchase_inst.imei_number:
+                imei_changed = bool(new_imei and new_imei != purchase_inst.imei_number)
+                if imei_changed:
                     Item.objects.filter(imei_number=purchase_inst.imei_number, phone=purchase_inst.phone).delete()
                     Item.objects.create(imei_number=new_imei, phone=purchase_inst.phone)
 
@@ -681,12 +683,15 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                         item.phone = np
                         item.save()
                     purchase_inst.phone = np
+                    imei_changed = True
 
                 # Update remaining fields
                 for field, val in data.items():
                     if field not in ('id', 'phone','returned'):
                         setattr(purchase_inst, field, val)
                 purchase_inst.save()
+                if imei_changed:
+                    IMEIRecord.register_purchase(purchase_inst)
 
             else:
                 # New purchase
@@ -768,11 +773,16 @@ class PurchaseTransactionSerializer(serializers.ModelSerializer):
                 VendorTransactionSerializer().create(pay)
 
         # Link to sales
-        for purchase in instance.purchase.all():
-            sale = Sales.objects.filter(imei_number=purchase.imei_number).first()
-            if sale:
-                sale.checkit()
+        records = IMEIRecord.objects.filter(
+            purchase__purchase_transaction=instance, sale__isnull=False
+        ).select_related('sale__sales_transaction', 'sale__phone')
+        for record in records:
+            record.sale.checkit()
 
+        instance.update_search_document()
+
+        # Purchase prices feed the profit of the days these phones were sold on
+        schedule_refresh(old_key, day_key(instance), *(day_key(r.sale.sales_transaction) for r in records))
         return instance
 
 
@@ -1012,6 +1022,8 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
                 'branch': txn.branch,
                 'enterprise': txn.enterprise
             })
+        txn.update_search_document()
+        schedule_refresh(day_key(txn))
         return txn
 
 
@@ -1024,6 +1036,7 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
         old_debtor = instance.debtor
         old_credited_amount = instance.credited_amount or 0
         old_amount_paid = instance.amount_paid or 0
+        old_key = day_key(instance)
         sales_data = validated_data.pop('sales', [])
         
         # Update top-level fields
@@ -1140,6 +1153,7 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
             bd.count = (bd.count or 0) + 1
             bd.stock = (bd.stock or 0) + ph.selling_price
             bd.save()
+            IMEIRecord.restock([rem])
             rem.delete()
         
         new_method = instance.method
@@ -1196,6 +1210,8 @@ class SalesTransactionSerializer(serializers.ModelSerializer):
         # Recalculate total
         instance.total_amount = instance.calculate_total_amount()
         instance.save()
+        instance.update_search_document()
+        schedule_refresh(old_key, day_key(instance))
         return instance
 
     def get_enterprise_name(self, obj):
@@ -1236,18 +1252,12 @@ class SchemeSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         subschemes_data = validated_data.pop('subscheme')
-        scheme = Scheme.objects.create(**validated_data)
-        for subscheme_data in subschemes_data:
-            Subscheme.objects.create(scheme=scheme, **subscheme_data)
-
-        enterprise = scheme.enterprise
-
+        with transaction.atomic():
+            scheme = Scheme.objects.create(**validated_data)
+            for subscheme_data in subschemes_data:
+                Subscheme.objects.create(scheme=scheme, **subscheme_data)
 
-        sales = Sales.objects.filter(sales_transaction__enterprise = enterprise, sales_transaction__branch=scheme.branch, sales_transaction__date__gte=scheme.from_date,sales_transaction__date__lte=scheme.to_date )
-        #print(sales)
-        for sale in sales:
-            sale.checkit()
-        scheme.calculate_receivable()
+            reconcile_scheme(scheme)
 
         return scheme
     
@@ -1280,17 +1290,8 @@ class SchemeSerializer(serializers.ModelSerializer):
             for subscheme in existing_subschemes.values():
                 subscheme.delete()
 
-            # Recalculate receivable if necessary
-            enterprise = instance.enterprise.id
-
-
-            sales = Sales.objects.filter(sales_transaction__enterprise = enterprise, sales_transaction__branch=instance.branch, sales_transaction__date__gte=instance.from_date,sales_transaction__date__lte=instance.to_date)
-            other_sales = instance.sales.all()
-            sales = sales.union(other_sales)
-            print(sales)
-            for sale in sales:
-                sale.checkit()
-            instance.calculate_receivable()
+            # Re-match the sales in the (possibly changed) window and recalculate receivable
+            reconcile_scheme(instance)
 
 
         return instance
@@ -1325,11 +1326,9 @@ class PriceProtectionSerializer(serializers.ModelSerializer):
 
 
     def create(self, validated_data):
-        pp = PriceProtection.objects.create(**validated_data)
-        sales = Sales.objects.filter(sales_transaction__enterprise = pp.enterprise, sales_transaction__branch=pp.branch, sales_transaction__date__gte=pp.from_date,sales_transaction__date__lte=pp.to_date )
-        for sale in sales:
-            sale.checkit()
-        pp.calculate_receivable()
+        with transaction.atomic():
+            pp = PriceProtection.objects.create(**validated_data)
+            reconcile_price_protection(pp)
         return pp
         
 
@@ -1342,15 +1341,7 @@ class PriceProtectionSerializer(serializers.ModelSerializer):
             
             instance.save()
 
-            enterprise = instance.enterprise.id
-
-            sales = Sales.objects.filter(sales_transaction__enterprise = enterprise, sales_transaction__branch=instance.branch,sales_transaction__date__gte=instance.from_date,sales_transaction__date__lte=instance.to_date )
-            other_sales = instance.sales.all()
-            sales = sales.union(other_sales)
-            for sale in sales:
-                sale.checkit()
-                self.calculate_receivable(instance)
-            instance.calculate_receivable()
+            reconcile_price_protection(instance)
             return instance
     
     def calculate_receivable(self, instance):
@@ -1387,38 +1378,23 @@ class VendorTransactionSerializer(serializers.ModelSerializer):
         model = VendorTransaction
         fields = '__all__'
 
+    @transaction.atomic
     def create(self, validated_data):
+        validated_data.pop('due', None)
         vendor = validated_data['vendor']
-        amount = validated_data['amount']
-        vendor.due = (vendor.due - amount) if vendor.due is not None else -amount
-        vendor.save()
-
-        transaction = VendorTransaction.objects.create(**validated_data)
-        return transaction
+        vendor.due = ledger.post(Vendor, vendor.pk, -(validated_data.get('amount') or 0))
+        return VendorTransaction.objects.create(due=vendor.due, **validated_data)
     
+    @transaction.atomic
     def update(self, instance, validated_data):
-
-        old_vendor = instance.vendor
+        validated_data.pop('due', None)
+        old_vendor_id = instance.vendor_id
         old_amount = instance.amount
-        
-        instance.vendor = validated_data.get('vendor', instance.vendor)
-        instance.date = validated_data.get('date', instance.date)
-        instance.amount = validated_data.get('amount', instance.amount)
-        instance.desc = validated_data.get('desc', instance.desc)
-        instance.method = validated_data.get('method', instance.method)
-        instance.cheque_number = validated_data.get('cheque_number', instance.cheque_number)
-        instance.cashout_date = validated_data.get('cashout_date', instance.cashout_date)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.due = ledger.repost(Vendor, old_vendor_id, old_amount, instance.vendor_id, instance.amount)
         instance.save()
-        new_vendor = instance.vendor
-        if old_vendor != new_vendor:
-            old_vendor.due = (old_vendor.due + old_amount) if old_vendor.due is not None else old_amount
-            new_vendor.due = (new_vendor.due - instance.amount) if new_vendor.due is not None else 0
-            old_vendor.save()
-            new_vendor.save()
-        else:
-            new_vendor.due = (new_vendor.due + old_amount - instance.amount) if new_vendor.due is not None else instance.amount
-            new_vendor.save()
-        return super().update(instance, validated_data)
+        return instance
     
 
     def get_vendor_name(self,obj):
@@ -1499,6 +1475,8 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
             if item:
                 item.delete()
 
+        IMEIRecord.objects.filter(purchase__in=purchase_ids).update(state='returned_to_vendor')
+
         # Create VendorTransaction
         VendorTransactionSerializer().create({
             'vendor': vendor,
@@ -1515,6 +1493,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
         vendor.refresh_from_db()
         print(vendor.due)
 
+        schedule_refresh(day_key(purchase_return))
         return purchase_return
 
     @transaction.atomic
@@ -1557,6 +1536,8 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
         for brand in brands_cache.values():
             brand.save()
 
+        IMEIRecord.objects.filter(purchase__in=purchase_ids).update(state='in_stock')
+
         # Delete vendor transaction
         vt = VendorTransaction.objects.filter(purchase_transaction=instance.purchase_transaction, type="return").first()
         print(vt)
@@ -1564,6 +1545,7 @@ class PurchaseReturnSerializer(serializers.ModelSerializer):
             vt.delete()
 
         # Delete purchase return record
+        schedule_refresh(day_key(instance))
         instance.delete()
 
         return instance
@@ -1592,32 +1574,20 @@ class EMIDebtorTransactionSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        transaction = EMIDebtorTransaction.objects.create(**validated_data)
-        debtor = transaction.debtor
-        debtor.due = (debtor.due - transaction.amount) if debtor.due is not None else -transaction.amount
-        debtor.save()
-        return transaction
+        validated_data.pop('due', None)
+        debtor = validated_data['debtor']
+        debtor.due = ledger.post(EMIDebtor, debtor.pk, -(validated_data.get('amount') or 0))
+        return EMIDebtorTransaction.objects.create(due=debtor.due, **validated_data)
     
     @transaction.atomic
     def update(self, instance, validated_data):
-        old_debtor = instance.debtor
+        validated_data.pop('due', None)
+        old_debtor_id = instance.debtor_id
         old_amount = instance.amount
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
+        instance.due = ledger.repost(EMIDebtor, old_debtor_id, old_amount, instance.debtor_id, instance.amount)
         instance.save()
-        instance.refresh_from_db()
-        new_debtor = instance.debtor
-
-        if old_debtor == new_debtor:
-            new_debtor.due = (new_debtor.due - instance.amount + old_amount) if new_debtor.due is not None else -instance.amount + old_amount
-            new_debtor.save()
-
-        else:
-            old_debtor.due = old_debtor.due + old_amount
-            new_debtor.due = (new_debtor.due - instance.amount) if new_debtor.due is not None else -instance.amount
-            old_debtor.save()
-            new_debtor.save()
-
         return instance
     
     def get_emi_debtor_name(self, obj):
@@ -1626,7 +1596,7 @@ class EMIDebtorTransactionSerializer(serializers.ModelSerializer):
 class SalesReturnSerializer(serializers.ModelSerializer):
 
     sales_transaction = SalesTransactionSerializer(read_only=True)
-    sales = SalesSerializer(many=True,read_only=True) ##related name
+    sales = SalesSerializer(many=True,read_only=True,source='purchases') ##related name
 
     # Write-only fields for accepting the IDs in the request
     sales_transaction_id = serializers.PrimaryKeyRelatedField(
@@ -1694,12 +1664,13 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         for brand in brands_cache.values():
             brand.save()
 
+        schedule_refresh(day_key(sales_return))
         return sales_return
 
 
     @transaction.atomic
     def delete(self, instance):
-        sales_ids = instance.sales.all()
+        sales_ids = instance.purchases.all()
 
         # Memory cache
         phones_cache = {}
@@ -1731,5 +1702,6 @@ class SalesReturnSerializer(serializers.ModelSerializer):
         for brand in brands_cache.values():
             brand.save()
 
+        schedule_refresh(day_key(instance))
         instance.delete()
         return instance
@@ -0,0 +1,84 @@
+import datetime
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from enterprise.models import Enterprise, Branch
+from inventory.models import Brand, Phone, Item
+from transaction.models import Vendor, PurchaseTransaction, IMEIRecord, VendorTransaction
+from transaction.serializers import PurchaseTransactionSerializer
+
+
+class BulkPurchaseTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Brand", enterprise=self.enterprise, branch=self.branch)
+        self.phones = [
+            Phone.objects.create(name=f"Phone {i}", brand=self.brand, enterprise=self.enterprise, branch=self.branch, selling_price=150)
+            for i in range(2)
+        ]
+        self.vendor = Vendor.objects.create(name="Vendor", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        self.next_imei = 0
+
+    def invoice(self, lines, method='credit'):
+        purchase = []
+        for i in range(lines):
+            self.next_imei += 1
+            purchase.append({
+                'phone': self.phones[i % 2].id,
+                'imei_number': f"{self.next_imei:015d}",
+                'unit_price': 100,
+            })
+        return {
+            'date': datetime.date(2024, 1, 1),
+            'vendor': self.vendor.id,
+            'enterprise': self.enterprise.id,
+            'branch': self.branch.id,
+            'bill_no': f"B{self.next_imei}",
+            'method': method,
+            'purchase': purchase,
+        }
+
+    def save(self, data):
+        serializer = PurchaseTransactionSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connection) as ctx:
+            txn = serializer.save()
+        return txn, len(ctx.captured_queries)
+
+    def test_query_count_is_constant(self):
+        _, small = self.save(self.invoice(4))
+        _, large = self.save(self.invoice(100))
+        self.assertEqual(small, large)
+
+    def test_rows_and_counters(self):
+        txn, _ = self.save(self.invoice(10, method='cash'))
+
+        self.assertEqual(txn.purchase.count(), 10)
+        self.assertEqual(txn.total_amount, 1000)
+        self.assertEqual(Item.objects.filter(phone__in=self.phones).count(), 10)
+        self.assertEqual(IMEIRecord.objects.filter(purchase__purchase_transaction=txn, state='in_stock').count(), 10)
+        for phone in self.phones:
+            phone.refresh_from_db()
+            self.assertEqual((phone.count, phone.stock), (5, 750))
+        self.brand.refresh_from_db()
+        self.assertEqual((self.brand.count, self.brand.stock), (10, 1500))
+
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.due, 0)
+        base = VendorTransaction.objects.get(purchase_transaction=txn, type='base')
+        self.assertIn("Phone 0 (IMEI: 000000000000001)", base.desc)
+
+    def test_rejects_bad_and_stocked_imeis(self):
+        self.save(self.invoice(2))
+        data = self.invoice(1)
+        data['purchase'] += [
+            {'phone': self.phones[0].id, 'imei_number': "000000000000001", 'unit_price': 100},
+            {'phone': self.phones[0].id, 'imei_number': "12345678901234X", 'unit_price': 100},
+        ]
+        data['purchase'].append(dict(data['purchase'][0]))
+        serializer = PurchaseTransactionSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        errors = serializer.errors['purchase']
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(PurchaseTransaction.objects.count(), 1)
@@ -0,0 +1,100 @@
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from enterprise.models import Enterprise, Branch
+from inventory.models import Brand, Phone
+from transaction.models import Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales, IMEIRecord
+
+
+class IMEIRecordTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Brand", enterprise=self.enterprise, branch=self.branch)
+        self.phone = Phone.objects.create(name="Phone", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        vendor = Vendor.objects.create(name="Vendor", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        self.purchase_transaction = PurchaseTransaction.objects.create(
+            date=datetime.date(2024, 1, 1), vendor=vendor, enterprise=self.enterprise, branch=self.branch
+        )
+        self.imei = "123456789012345"
+        self.purchase = Purchase.objects.create(
+            phone=self.phone, imei_number=self.imei, unit_price=100, purchase_transaction=self.purchase_transaction
+        )
+
+    def sell(self):
+        sales_transaction = SalesTransaction.objects.create(
+            date=datetime.date(2024, 1, 2), enterprise=self.enterprise, branch=self.branch
+        )
+        return Sales.objects.create(phone=self.phone, imei_number=self.imei, unit_price=130, sales_transaction=sales_transaction)
+
+    def test_lifecycle(self):
+        record = IMEIRecord.objects.get(enterprise=self.enterprise, imei_number=self.imei)
+        self.assertEqual(record.state, 'in_stock')
+        self.assertEqual(record.purchase, self.purchase)
+
+        sale = self.sell()
+        record.refresh_from_db()
+        self.assertEqual((record.state, record.sale), ('sold', sale))
+        self.assertEqual(sale.profit, 30)
+
+        sale.returned = True
+        sale.save()
+        record.refresh_from_db()
+        self.assertEqual(record.state, 'returned_by_customer')
+
+        IMEIRecord.restock([sale])
+        record.refresh_from_db()
+        self.assertEqual((record.state, record.sale), ('in_stock', None))
+
+        self.purchase.delete()
+        self.assertFalse(IMEIRecord.objects.filter(imei_number=self.imei).exists())
+
+    def test_backfill_creates_missing_records(self):
+        sale = self.sell()
+        IMEIRecord.objects.all().delete()
+
+        call_command('backfill_imei_registry', stdout=StringIO())
+        record = IMEIRecord.objects.get(enterprise=self.enterprise, imei_number=self.imei)
+        self.assertEqual((record.state, record.purchase, record.sale), ('sold', self.purchase, sale))
+
+        call_command('backfill_imei_registry', stdout=StringIO())
+        self.assertEqual(IMEIRecord.objects.count(), 1)
+
+    def test_handset_bought_again_is_back_in_stock(self):
+        self.sell()
+        again = Purchase.objects.create(
+            phone=self.phone, imei_number=self.imei, unit_price=90, purchase_transaction=self.purchase_transaction
+        )
+        record = IMEIRecord.objects.get(enterprise=self.enterprise, imei_number=self.imei)
+        self.assertEqual((record.state, record.sale, record.purchase), ('in_stock', None, again))
+
+    def test_editing_a_sold_line_keeps_its_sale(self):
+        sale = self.sell()
+        other = Phone.objects.create(name="Other", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        self.purchase.phone = other
+        self.purchase.save()
+        IMEIRecord.register_purchase(self.purchase)
+        record = IMEIRecord.objects.get(enterprise=self.enterprise, imei_number=self.imei)
+        self.assertEqual((record.state, record.sale, record.phone), ('sold', sale, other))
+
+        self.purchase.imei_number = "999999999999999"
+        self.purchase.save()
+        IMEIRecord.register_purchase(self.purchase)
+        record = IMEIRecord.objects.get(enterprise=self.enterprise)
+        self.assertEqual((record.imei_number, record.state, record.sale), ("999999999999999", 'sold', sale))
+
+    def test_earlier_sale_keeps_its_cost_after_a_rebuy(self):
+        sale = self.sell()
+        later = PurchaseTransaction.objects.create(
+            date=datetime.date(2024, 1, 5), vendor=self.purchase_transaction.vendor,
+            enterprise=self.enterprise, branch=self.branch,
+        )
+        Purchase.objects.create(phone=self.phone, imei_number=self.imei, unit_price=90, purchase_transaction=later)
+        sale.refresh_from_db()
+        sale.save()
+        self.assertEqual(Sales.objects.filter(pk=sale.pk).values_list('purchase__unit_price', flat=True).get(), 100)
+
+        Sales.objects.update(purchase=None)
+        call_command('backfill_imei_registry', stdout=StringIO())
+        self.assertEqual(Sales.objects.get(pk=sale.pk).purchase, self.purchase)
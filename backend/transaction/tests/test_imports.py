@@ -0,0 +1,83 @@
+import datetime
+from io import BytesIO
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from alltransactions.tests.base import BranchTestCase
+from inventory.models import Brand, Phone
+from transaction.models import Vendor, PurchaseTransaction, IMEIRecord
+
+
+class PurchaseImportViewTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.brand = Brand.objects.create(name="Brand", **self.common)
+        self.phone = Phone.objects.create(name="Galaxy A15", brand=self.brand, selling_price=150, **self.common)
+        self.vendor = Vendor.objects.create(name="Vendor", brand=self.brand, **self.common)
+        self.url = f'/transaction/purchasetransaction/import/branch/{self.branch.id}/'
+
+    def upload(self, content, name="stock.csv"):
+        return self.client.post(self.url, {
+            'file': SimpleUploadedFile(name, content if isinstance(content, bytes) else content.encode()),
+            'vendor': self.vendor.id,
+            'date': '2024-01-01',
+            'bill_no': 'IMP-1',
+        }, format='multipart')
+
+    def test_imports_valid_rows_and_reports_the_rest(self):
+        rows = ["Phone,IMEI,Unit Price"]
+        rows += [f"Galaxy A15,{i:015d},100" for i in range(1, 2501)]
+        rows += [
+            f"{self.phone.id},{1:015d},100",   # repeated
+            "Unknown,999999999999999,100",
+            "Galaxy A15,12345,100",
+            "Galaxy A15,888888888888888,abc",
+        ]
+        response = self.upload("\n".join(rows))
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['imported'], 2500)
+        self.assertEqual([e['row'] for e in response.data['errors']], [2502, 2503, 2504, 2505])
+
+        txn = PurchaseTransaction.objects.get(id=response.data['transaction'])
+        self.assertEqual(txn.date, datetime.date(2024, 1, 1))
+        self.assertEqual(txn.total_amount, 250000)
+        self.assertEqual(IMEIRecord.objects.filter(enterprise=self.enterprise, state='in_stock').count(), 2500)
+        self.phone.refresh_from_db()
+        self.assertEqual(self.phone.count, 2500)
+        self.vendor.refresh_from_db()
+        self.assertEqual(self.vendor.due, 250000)
+
+    def test_nothing_valid_creates_nothing(self):
+        response = self.upload("Galaxy A15,123,100\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertFalse(PurchaseTransaction.objects.exists())
+
+    def test_header_without_phone_column(self):
+        response = self.upload("IMEI,Price\n", name="stock.csv")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone", response.data['error'])
+
+    def test_imports_an_xlsx_workbook(self):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        sheet.append(["Phone", "IMEI", "Unit Price"])
+        sheet.append(["Galaxy A15", f"{1:015d}", 100])
+        sheet.append(["Galaxy A15", f"{2:015d}", 120.5])
+        content = BytesIO()
+        workbook.save(content)
+        response = self.upload(content.getvalue(), name="stock.xlsx")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(PurchaseTransaction.objects.get().total_amount, 220.5)
+
+    def test_unreadable_files_are_rejected(self):
+        for content, name in [
+            ("Phone,IMEI,Unit Price\nGaláxy,123456789012345,100\n".encode('cp1252'), "stock.csv"),
+            (b'Phone,IMEI,Unit Price\n"' + b'x' * 200000 + b'",123456789012345,100\n', "stock.csv"),
+            (b"not a workbook", "stock.xlsx"),
+        ]:
+            response = self.upload(content, name=name)
+            self.assertEqual(response.status_code, 400, name)
+            self.assertIn('error', response.data)
+        self.assertFalse(PurchaseTransaction.objects.exists())
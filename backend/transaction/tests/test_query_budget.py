@@ -0,0 +1,78 @@
+import datetime
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from alltransactions.tests.base import BranchTestCase
+from inventory.models import Brand, Phone
+from transaction.models import (
+    Vendor, PurchaseTransaction, Purchase, PurchaseReturn, SalesTransaction, Sales, SalesReturn,
+    VendorTransaction, EMIDebtor, EMIDebtorTransaction,
+)
+
+ROWS = 12
+
+
+class QueryBudgetTestCase(BranchTestCase):
+    """Every list endpoint runs the same number of queries for a page of 2
+    rows as for a page of 10, and detail views do not grow with line count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        common, person = cls.common, cls.person
+        brand = Brand.objects.create(name="Brand", **common)
+        phones = [Phone.objects.create(name=f"Phone {i}", brand=brand, selling_price=150, **common) for i in range(3)]
+        vendor = Vendor.objects.create(name="Vendor", brand=brand, **common)
+        debtor = EMIDebtor.objects.create(name="Debtor", **common)
+
+        for i in range(ROWS):
+            day = datetime.date(2024, 1, 1) + datetime.timedelta(days=i)
+            purchase_txn = PurchaseTransaction.objects.create(date=day, vendor=vendor, bill_no=f"P{i}", person=person, **common)
+            purchases = Purchase.objects.bulk_create([
+                Purchase(purchase_transaction=purchase_txn, phone=phone, imei_number=f"{i:07d}{n:08d}", unit_price=100)
+                for n, phone in enumerate(phones)
+            ])
+            purchase_return = PurchaseReturn.objects.create(purchase_transaction=purchase_txn, **common)
+            Purchase.objects.filter(pk=purchases[0].pk).update(purchase_return=purchase_return, returned=True)
+
+            sales_txn = SalesTransaction.objects.create(date=day, name="Customer", bill_no=f"S{i}", person=person, **common)
+            sales = Sales.objects.bulk_create([
+                Sales(sales_transaction=sales_txn, phone=p.phone, imei_number=p.imei_number, unit_price=150)
+                for p in purchases
+            ])
+            sales_return = SalesReturn.objects.create(sales_transaction=sales_txn, **common)
+            Sales.objects.filter(pk=sales[0].pk).update(sales_return=sales_return, returned=True)
+
+            VendorTransaction.objects.create(date=day, vendor=vendor, amount=100, purchase_transaction=purchase_txn, **common)
+            EMIDebtorTransaction.objects.create(date=day, debtor=debtor, amount=50, **common)
+
+        cls.purchase_txn = purchase_txn
+        cls.sales_txn = sales_txn
+
+    def queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200, getattr(response, 'data', None))
+        return len(ctx.captured_queries)
+
+    def test_list_endpoints(self):
+        for name in ['purchasetransaction', 'salestransaction', 'vendortransaction',
+                     'purchase-return', 'sales-return', 'emidebtortransaction']:
+            url = f'/transaction/{name}/branch/{self.branch.id}/'
+            for mode in ({}, {'cursor': ''}):
+                with self.subTest(endpoint=name, **mode):
+                    small = self.queries(url, {'page_size': 2, **mode})
+                    large = self.queries(url, {'page_size': 10, **mode})
+                    self.assertEqual(small, large)
+
+    def test_detail_endpoints(self):
+        for url, lines in [
+            (f'/transaction/purchasetransaction/{self.purchase_txn.pk}/', self.purchase_txn.purchase),
+            (f'/transaction/salestransaction/{self.sales_txn.pk}/', self.sales_txn.sales),
+        ]:
+            with self.subTest(url=url):
+                before = self.queries(url)
+                extra = lines.first()
+                extra.pk = None
+                extra.imei_number = "999999999999999"
+                extra.save()
+                self.assertEqual(self.queries(url), before)
@@ -0,0 +1,80 @@
+import datetime
+from django.test import TestCase
+from enterprise.models import Enterprise, Branch
+from inventory.models import Brand, Phone
+from transaction.models import (
+    Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales,
+    Scheme, Subscheme, PriceProtection, PPItems,
+)
+from transaction.reconcile import reconcile_scheme, reconcile_price_protection
+
+
+class ReconcileTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Brand", enterprise=self.enterprise, branch=self.branch)
+        self.phone = Phone.objects.create(name="Phone", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        self.vendor = Vendor.objects.create(name="Vendor", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+
+        purchase_transaction = PurchaseTransaction.objects.create(
+            date=datetime.date(2024, 1, 1), vendor=self.vendor, enterprise=self.enterprise, branch=self.branch
+        )
+        self.sales = []
+        for i, day in enumerate([5, 10, 20]):
+            imei = f"{i:015d}"
+            Purchase.objects.create(phone=self.phone, imei_number=imei, unit_price=100, purchase_transaction=purchase_transaction)
+            sales_transaction = SalesTransaction.objects.create(
+                date=datetime.date(2024, 1, day), enterprise=self.enterprise, branch=self.branch
+            )
+            self.sales.append(Sales.objects.create(
+                phone=self.phone, imei_number=imei, unit_price=150, sales_transaction=sales_transaction
+            ))
+
+    def test_scheme_membership_follows_window(self):
+        scheme = Scheme.objects.create(
+            from_date=datetime.date(2024, 1, 1), to_date=datetime.date(2024, 1, 12),
+            phone=self.phone, enterprise=self.enterprise, brand=self.brand, branch=self.branch
+        )
+        Subscheme.objects.create(scheme=scheme, lowerbound=1, upperbound=10, cashback=50)
+
+        reconcile_scheme(scheme)
+        self.assertEqual(set(scheme.sales.all()), {self.sales[0], self.sales[1]})
+        self.assertEqual(scheme.receivable, 100)
+
+        scheme.from_date = datetime.date(2024, 1, 8)
+        scheme.to_date = datetime.date(2024, 1, 31)
+        scheme.save()
+        added, removed = reconcile_scheme(scheme)
+        self.assertEqual(added, {self.sales[2].id})
+        self.assertEqual(removed, {self.sales[0].id})
+        self.assertEqual(set(scheme.sales.all()), {self.sales[1], self.sales[2]})
+
+    def test_price_protection_items_follow_membership(self):
+        pp = PriceProtection.objects.create(
+            from_date=datetime.date(2024, 1, 1), to_date=datetime.date(2024, 1, 12), price_drop=20,
+            phone=self.phone, enterprise=self.enterprise, brand=self.brand, branch=self.branch
+        )
+        reconcile_price_protection(pp)
+        self.assertEqual(pp.sales.count(), 2)
+        self.assertEqual(PPItems.objects.filter(pp=pp).count(), 2)
+        self.assertEqual(pp.receivable, 40)
+
+        # Running it again must not duplicate anything
+        reconcile_price_protection(pp)
+        self.assertEqual(PPItems.objects.filter(pp=pp).count(), 2)
+
+        pp.to_date = datetime.date(2024, 1, 6)
+        pp.save()
+        reconcile_price_protection(pp)
+        self.assertEqual(list(pp.sales.all()), [self.sales[0]])
+        self.assertEqual(list(PPItems.objects.filter(pp=pp).values_list('imei_number', flat=True)), [self.sales[0].imei_number])
+        self.assertEqual(pp.receivable, 20)
+
+    def test_price_protection_skips_phones_bought_after_start(self):
+        pp = PriceProtection.objects.create(
+            from_date=datetime.date(2023, 12, 1), to_date=datetime.date(2024, 1, 31), price_drop=20,
+            phone=self.phone, enterprise=self.enterprise, brand=self.brand, branch=self.branch
+        )
+        reconcile_price_protection(pp)
+        self.assertEqual(pp.sales.count(), 0)
@@ -0,0 +1,62 @@
+import datetime
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from enterprise.models import Enterprise, Branch, Person
+from inventory.models import Brand, Phone
+from userauth.models import User
+from transaction.models import Vendor, PurchaseTransaction, Purchase, SalesTransaction, Sales, DailyBranchSummary
+from transaction.rollups import collect, rebuild, refresh
+
+
+class DailyBranchSummaryTestCase(TestCase):
+    def setUp(self):
+        self.enterprise = Enterprise.objects.create(name="Test Enterprise")
+        self.branch = Branch.objects.create(name="Main", enterprise=self.enterprise)
+        self.brand = Brand.objects.create(name="Brand", enterprise=self.enterprise, branch=self.branch)
+        self.phone = Phone.objects.create(name="Phone", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+        vendor = Vendor.objects.create(name="Vendor", brand=self.brand, enterprise=self.enterprise, branch=self.branch)
+
+        self.today = timezone.now().date()
+        purchase_transaction = PurchaseTransaction.objects.create(
+            date=self.today, vendor=vendor, enterprise=self.enterprise, branch=self.branch, total_amount=300
+        )
+        sales_transaction = SalesTransaction.objects.create(
+            date=self.today, enterprise=self.enterprise, branch=self.branch, total_amount=260
+        )
+        for i in range(3):
+            imei = f"{i:015d}"
+            Purchase.objects.create(phone=self.phone, imei_number=imei, unit_price=100, purchase_transaction=purchase_transaction)
+            if i < 2:
+                Sales.objects.create(phone=self.phone, imei_number=imei, unit_price=130, sales_transaction=sales_transaction)
+
+    def test_collect_groups_by_branch_and_day(self):
+        days = collect(enterprise_id=self.enterprise.id)
+        self.assertEqual(days, {
+            (self.enterprise.id, self.branch.id, self.today): {
+                'purchases': 3, 'purchase_amount': 300, 'sales': 2, 'sales_amount': 260, 'profit': 60,
+                'purchase_returns': 0, 'purchase_return_amount': 0, 'sales_returns': 0, 'sales_return_amount': 0,
+            }
+        })
+
+    def test_refresh_and_rebuild_agree(self):
+        refresh(self.enterprise.id, self.branch.id, self.today)
+        refreshed = DailyBranchSummary.objects.values().get()
+        self.assertEqual(rebuild(enterprise_id=self.enterprise.id), 1)
+        rebuilt = DailyBranchSummary.objects.values().get()
+        refreshed.pop('id'), rebuilt.pop('id')
+        self.assertEqual(refreshed, rebuilt)
+
+    def test_stats_view_reads_rollups(self):
+        rebuild()
+        user = User.objects.create_user(email="admin@example.com", name="Admin", password="x")
+        Person.objects.create(user=user, enterprise=self.enterprise, branch=self.branch, role="Admin")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        with self.assertNumQueries(3):
+            response = client.get('/transaction/stats/')
+        self.assertEqual(response.data['daily'], {
+            'purchases': 3, 'dailyptamt': 300, 'sales': 2, 'dailystamt': 260, 'profit': 60
+        })
+        self.assertEqual(response.data['stock'], 1)
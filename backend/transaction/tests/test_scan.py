@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from allinventory.ean import check_digit
+from allinventory.models import Brand as ProductBrand, Product
+from alltransactions.tests.base import BranchTestCase
+from enterprise.models import Branch
+from inventory.models import Brand, Phone
+from transaction.models import IMEIRecord
+
+
+class ScanTestCase(BranchTestCase):
+    role = "Staff"
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_branch = Branch.objects.create(name="Other", enterprise=cls.enterprise)
+
+        brand = Brand.objects.create(name="Brand", enterprise=cls.enterprise, branch=cls.branch)
+        cls.phone = Phone.objects.create(name="Phone", brand=brand, branch=cls.branch, selling_price=500)
+        IMEIRecord.objects.create(enterprise=cls.enterprise, branch=cls.branch, phone=cls.phone, imei_number="111111111111111")
+        IMEIRecord.objects.create(enterprise=cls.enterprise, branch=cls.branch, phone=cls.phone, imei_number="222222222222222", state='sold')
+        IMEIRecord.objects.create(enterprise=cls.enterprise, branch=cls.other_branch, phone=cls.phone, imei_number="333333333333333")
+
+        product_brand = ProductBrand.objects.create(name="Brand", enterprise=cls.enterprise, branch=cls.branch)
+        cls.product = Product.objects.create(name="Cable", uid="400638133393", brand=product_brand, enterprise=cls.enterprise, branch=cls.branch, selling_price=20, count=4)
+        Product.objects.create(name="Cable", uid="400638133393", brand=product_brand, enterprise=cls.enterprise, branch=cls.other_branch, count=1)
+        Product.objects.create(name="Charger", uid="500000000001", brand=product_brand, enterprise=cls.enterprise, branch=cls.other_branch)
+
+    def scan(self, code):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/transaction/scan/{code}/')
+        return response, queries
+
+    def test_imei_resolves_to_phone(self):
+        response, _ = self.scan("111111111111111")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['type'], 'phone')
+        self.assertEqual(response.json()['id'], self.phone.id)
+        self.assertEqual(response.json()['price'], 500)
+        self.assertTrue(response.json()['available'])
+
+    def test_sold_imei_is_unavailable(self):
+        response, _ = self.scan("222222222222222")
+        self.assertFalse(response.json()['available'])
+
+    def test_ean13_resolves_to_branch_product(self):
+        response, _ = self.scan("400638133393" + check_digit("400638133393"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], self.product.id)
+        self.assertEqual(response.json()['count'], 4)
+
+    def test_other_branch_codes_are_rejected(self):
+        self.assertEqual(self.scan("333333333333333")[0].status_code, 403)
+        self.assertEqual(self.scan("500000000001")[0].status_code, 403)
+        response = self.client.get(f'/transaction/scan/branch/{self.other_branch.id}/111111111111111/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_and_malformed_codes(self):
+        self.assertEqual(self.scan("999999999999999")[0].status_code, 404)
+        self.assertEqual(self.scan("4006381333930")[0].status_code, 400)
+        self.assertEqual(self.scan("abc")[0].status_code, 400)
+
+    def test_one_lookup_per_scan(self):
+        _, imei_queries = self.scan("111111111111111")
+        _, product_queries = self.scan("400638133393")
+        self.assertEqual(len(imei_queries), len(product_queries))
+        self.assertLessEqual(len(product_queries), 3)
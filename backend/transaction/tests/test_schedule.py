@@ -0,0 +1,22 @@
+import datetime
+from django.test import SimpleTestCase
+from transaction.schedule import Job, next_run
+
+TZ = datetime.timezone(datetime.timedelta(hours=5, minutes=45))
+
+
+class ScheduleTestCase(SimpleTestCase):
+    def at(self, *args):
+        return datetime.datetime(*args, tzinfo=TZ)
+
+    def test_daily_job(self):
+        job = Job('reconcile_stock_counters', hour=3)
+        self.assertEqual(next_run(job, self.at(2024, 5, 10, 1, 30)), self.at(2024, 5, 10, 3))
+        self.assertEqual(next_run(job, self.at(2024, 5, 10, 3)), self.at(2024, 5, 10, 3))
+        self.assertEqual(next_run(job, self.at(2024, 5, 31, 3, 0, 1)), self.at(2024, 6, 1, 3))
+
+    def test_monthly_job(self):
+        job = Job('snapshot_product_stock', hour=2, day=1)
+        self.assertEqual(next_run(job, self.at(2024, 5, 1, 1)), self.at(2024, 5, 1, 2))
+        self.assertEqual(next_run(job, self.at(2024, 5, 1, 2, 5)), self.at(2024, 6, 1, 2))
+        self.assertEqual(next_run(job, self.at(2024, 12, 20)), self.at(2025, 1, 1, 2))
@@ -0,0 +1,80 @@
+import datetime
+from io import StringIO
+from django.core.management import call_command
+from alltransactions.tests.base import BranchTestCase
+from inventory.models import Brand, Phone
+from transaction.models import Vendor, PurchaseTransaction, SalesTransaction
+from transaction.serializers import PurchaseTransactionSerializer
+
+
+class TransactionSearchTestCase(BranchTestCase):
+    def setUp(self):
+        super().setUp()
+        self.brand = Brand.objects.create(name="Samsung", **self.common)
+        self.galaxy = Phone.objects.create(name="Galaxy A15", brand=self.brand, selling_price=150, **self.common)
+        self.note = Phone.objects.create(name="Redmi Note 13", brand=self.brand, selling_price=150, **self.common)
+        self.vendor = Vendor.objects.create(name="Hulas Traders", brand=self.brand, **self.common)
+        self.url = f'/transaction/purchasetransaction/branch/{self.branch.id}/'
+
+    def purchase(self, bill_no, phone, imei, day=1):
+        serializer = PurchaseTransactionSerializer(data={
+            'date': datetime.date(2024, 1, day),
+            'vendor': self.vendor.id,
+            'enterprise': self.enterprise.id,
+            'branch': self.branch.id,
+            'bill_no': bill_no,
+            'method': 'credit',
+            'purchase': [{'phone': phone.id, 'imei_number': imei, 'unit_price': 100}],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def search(self, term):
+        response = self.client.get(self.url, {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_document_is_written_on_create_and_update(self):
+        txn = self.purchase("B-7", self.galaxy, "111111111111111")
+        self.assertEqual(txn.search_document, " b 7 hulas traders galaxy a15 111111111111111 ")
+
+        self.assertEqual(self.search("galaxy"), [txn.id])
+        self.assertEqual(self.search("hulas"), [txn.id])
+        self.assertEqual(self.search("1111111"), [txn.id])
+        self.assertEqual(self.search("redmi"), [])
+
+        serializer = PurchaseTransactionSerializer(txn, data={
+            'purchase': [{'phone': self.note.id, 'imei_number': "111111111111111", 'unit_price': 100}],
+        }, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(self.search("redmi note"), [txn.id])
+        self.assertEqual(self.search("galaxy"), [])
+
+    def test_ranking(self):
+        substring = self.purchase("X-1", self.galaxy, "222222222222222", day=3)
+        prefix = self.purchase("X-2", self.note, "333333333333333", day=1)
+        exact = self.purchase("note", self.galaxy, "444444444444444", day=2)
+
+        # Bill no beats word prefix beats substring, then newest first
+        PurchaseTransaction.objects.filter(pk=substring.pk).update(search_document=" x 1 keynote ")
+        self.assertEqual(self.search("note"), [exact.id, prefix.id, substring.id])
+
+    def test_rebuild_command_fills_missing_documents(self):
+        txn = self.purchase("B-9", self.galaxy, "555555555555555")
+        PurchaseTransaction.objects.filter(pk=txn.pk).update(search_document='')
+        call_command('rebuild_search_documents', stdout=StringIO())
+        txn.refresh_from_db()
+        self.assertEqual(txn.search_document, " b 9 hulas traders galaxy a15 555555555555555 ")
+
+    def test_rebuild_skips_transactions_with_nothing_to_index(self):
+        empty = SalesTransaction.objects.create(date=datetime.date(2024, 1, 1), enterprise=self.enterprise, branch=self.branch)
+        out = StringIO()
+        call_command('rebuild_search_documents', stdout=out)
+        self.assertIn("Indexed 1 transaction.SalesTransaction rows", out.getvalue())
+        empty.refresh_from_db()
+        self.assertEqual(empty.search_document, " ")
+
+        out = StringIO()
+        call_command('rebuild_search_documents', stdout=out)
+        self.assertIn("Indexed 0 transaction.SalesTransaction rows", out.getvalue())
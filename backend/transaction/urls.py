@@ -6,6 +6,7 @@ urlpatterns = [
     path('purchasetransaction/', PurchaseTransactionView.as_view(), name='purchasetransaction-create'),
     path('purchasetransaction/branch/<int:branch>/', PurchaseTransactionView.as_view(), name='purchasetransaction-branch'),
     path('purchasetransaction/<int:pk>/', PurchaseTransactionChangeView.as_view(), name='purchasetransaction-create'),
+    path('purchasetransaction/import/branch/<int:branch>/', views.PurchaseImportView.as_view(), name='purchasetransaction-import'),
 
     path('salestransaction/', SalesTransactionView.as_view(), name='salestransaction-create'),
     path('salestransaction/branch/<int:branch>/', SalesTransactionView.as_view(), name='salestransaction-branch'),
@@ -76,6 +77,9 @@ urlpatterns = [
 
     path('emidebtor/statement/<int:debtorId>/', views.EMIDebtorStatementView.as_view(), name='emi_debtor_statement'),
 
+    path('scan/<str:code>/', views.ScanView.as_view(), name='scan'),
+    path('scan/branch/<int:branch>/<str:code>/', views.ScanView.as_view(), name='scan_branch'),
+
 
 
 ]
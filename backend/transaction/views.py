@@ -6,14 +6,19 @@ from .serializers import EMIDebtorTransactionSerializer, PurchaseTransactionSeri
 from inventory.serializers import BrandSerializer
 from rest_framework.permissions import IsAuthenticated
 from inventory.models import Item,Brand,Phone
+from allinventory.models import Product
+from allinventory.ean import uid_from_code
 from datetime import date, datetime, time
 from django.utils.dateparse import parse_date
-from rest_framework.pagination import PageNumberPagination
+from alltransactions.pagination import TransactionPagination
 from django.shortcuts import get_object_or_404
 from django.db import models
 from rest_framework import generics
 from django.utils import timezone
-from .models import VendorTransaction,EMIDebtorTransaction,EMIDebtor
+from .models import VendorTransaction,EMIDebtorTransaction,EMIDebtor,IMEIRecord,DailyBranchSummary
+from .rollups import schedule_refresh, day_key
+from .imports import PurchaseImport, ImportFormatError, iter_rows
+from enterprise.models import Branch
 from .serializers import VendorTransactionSerializer
 from django.db.models import Sum
 from django.db.models.functions import ExtractWeekDay
@@ -21,8 +26,14 @@ from django.utils.timezone import make_aware,localtime
 from django.db import transaction
 from alltransactions.models import DebtorTransaction, Debtor
 from django.db.models import Q
-class PurchaseTransactionView(APIView):
+from alltransactions.search import rank
+from alltransactions.statements import STATEMENT_FIELDS, Statement
+from alltransactions.plans import QueryPlanMixin
+from django.db.models import F, Prefetch
+class PurchaseTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['vendor', 'person__user']
+    prefetch_related = [Prefetch('purchase', queryset=Purchase.objects.select_related('phone'))]
 
     def get(self, request, branch=None):
         user = request.user
@@ -30,16 +41,9 @@ class PurchaseTransactionView(APIView):
         search = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        transactions = PurchaseTransaction.objects.filter(enterprise=enterprise)
+        transactions = self.plan(PurchaseTransaction.objects.filter(enterprise=enterprise))
         if branch:
             transactions = transactions.filter(branch=branch)
-        if search:
-            phone_transactions = transactions.filter(purchase__phone__name__icontains = search)
-            vendor_trasactions = transactions.filter(vendor__name__icontains = search)
-            imei_transactions = transactions.filter(purchase__imei_number__icontains = search)
-            bill_transactions = transactions.filter(bill_no__icontains = search)
-            transactions = phone_transactions.union(vendor_trasactions,imei_transactions,bill_transactions)
-        
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
@@ -48,18 +52,18 @@ class PurchaseTransactionView(APIView):
             start_date = datetime.combine(start_date, datetime.min.time())
             end_date = datetime.combine(end_date, datetime.max.time())
             
-            transactions = PurchaseTransaction.objects.filter(
+            transactions = transactions.filter(
                 date__range=(start_date, end_date)
             )
 
-        transactions = transactions.order_by('-date','-id')
+        if search:
+            transactions = rank(transactions, search)
+        else:
+            transactions = transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(transactions, request)
-        current_page = paginator.page.number if paginated_transactions else None
-        total_pages = paginator.page.paginator.num_pages if paginated_transactions else None
 
         serializer = PurchaseTransactionSerializer(paginated_transactions, many=True)
         return paginator.get_paginated_response(serializer.data)
@@ -76,9 +80,67 @@ class PurchaseTransactionView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
-class PurchaseTransactionChangeView(generics.RetrieveUpdateDestroyAPIView):
+class PurchaseImportView(APIView):
+    """Create one purchase transaction from an uploaded CSV/XLSX of
+    (phone, imei_number, unit_price) rows. Valid rows are imported and the
+    rest come back in a per-row error report."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, branch):
+        person = request.user.person
+        enterprise = person.enterprise
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"error": "No file uploaded"}, status=status.HTTP_400_BAD_REQUEST)
+        branch = get_object_or_404(Branch, id=branch, enterprise=enterprise)
+        vendor = get_object_or_404(Vendor, id=request.data.get('vendor'), enterprise=enterprise)
+        method = request.data.get('method', 'credit')
+        if method not in ('cash', 'cheque', 'credit'):
+            return Response({"error": "Invalid method"}, status=status.HTTP_400_BAD_REQUEST)
+        txn_date = parse_date(request.data.get('date') or '') or timezone.now().date()
+
+        phones = Phone.objects.filter(brand__enterprise=enterprise, branch=branch)
+        try:
+            with transaction.atomic():
+                txn = PurchaseTransaction.objects.create(
+                    date=txn_date,
+                    vendor=vendor,
+                    enterprise=enterprise,
+                    branch=branch,
+                    bill_no=request.data.get('bill_no'),
+                    method=method,
+                    cheque_number=request.data.get('cheque_number'),
+                    cashout_date=parse_date(request.data.get('cashout_date') or ''),
+                    person=person,
+                )
+                importer = PurchaseImport(txn, phones)
+                importer.run(iter_rows(upload))
+
+                if not importer.imported:
+                    transaction.set_rollback(True)
+                    return Response({"imported": 0, "errors": importer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+                txn.total_amount = importer.total
+                txn.save(update_fields=['total_amount'])
+                PurchaseTransactionSerializer().record_vendor_transactions(
+                    txn, f'Purchase imported for transaction {txn.bill_no}, {importer.imported} items'
+                )
+                txn.update_search_document()
+                schedule_refresh(day_key(txn))
+        except ImportFormatError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"transaction": txn.id, "imported": importer.imported, "errors": importer.errors},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class PurchaseTransactionChangeView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = PurchaseTransaction.objects.all()
     serializer_class = PurchaseTransactionSerializer
+    select_related = ['vendor', 'person__user']
+    prefetch_related = [Prefetch('purchase', queryset=Purchase.objects.select_related('phone'))]
 
     def update(self, request, *args, **kwargs):
         role = request.user.person.role
@@ -129,14 +191,22 @@ class PurchaseTransactionChangeView(generics.RetrieveUpdateDestroyAPIView):
             if vts:
                 for vt in vts:
                     vt.delete()
+            sold_on = SalesTransaction.objects.filter(sales__imei_record__purchase__in=purchases).distinct()
+            schedule_refresh(
+                day_key(purchase_transaction),
+                *(day_key(pr) for pr in purchase_transaction.purchase_return.all()),
+                *(day_key(st) for st in sold_on),
+            )
             purchase_transaction.delete()   
             return Response("Deleted")  
  
     
 
-class SalesTransactionChangeView(generics.RetrieveUpdateDestroyAPIView):
+class SalesTransactionChangeView(QueryPlanMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = SalesTransaction.objects.all()
     serializer_class = SalesTransactionSerializer
+    select_related = ['enterprise', 'person__user']
+    prefetch_related = [Prefetch('sales', queryset=Sales.objects.select_related('phone'))]
 
     def update(self, request, *args, **kwargs):
         role = request.user.person.role
@@ -186,7 +256,9 @@ class SalesTransactionChangeView(generics.RetrieveUpdateDestroyAPIView):
 
             # Item.objects.filter(imei_number = new_imei).delete()
 
-        
+        IMEIRecord.restock(sales_data)
+        schedule_refresh(day_key(instance), *(day_key(sr) for sr in instance.sales_return.all()))
+
         # Perform the deletion
         self.perform_destroy(instance)
         for phone in phones:
@@ -218,8 +290,10 @@ class PurchaseView(APIView):
         return Response(serializer.data)
     
 
-class SalesTransactionView(APIView):
+class SalesTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['enterprise', 'person__user']
+    prefetch_related = [Prefetch('sales', queryset=Sales.objects.select_related('phone'))]
 
     def get(self, request,pk=None, branch=None):
         user = request.user
@@ -231,21 +305,14 @@ class SalesTransactionView(APIView):
         end_date = request.GET.get('end_date')
 
         if pk:
-            sales_transaction = get_object_or_404(SalesTransaction, pk=pk)
+            sales_transaction = get_object_or_404(self.plan(SalesTransaction.objects.all()), pk=pk)
             serializer = SalesTransactionSerializer(sales_transaction)
             return Response(serializer.data)
 
-        transactions = SalesTransaction.objects.filter(enterprise=enterprise)
+        transactions = self.plan(SalesTransaction.objects.filter(enterprise=enterprise))
         if branch:
             transactions = transactions.filter(branch=branch)
 
-        if search:
-            phone_transactions = transactions.filter(sales__phone__name__icontains = search)
-            customer_trasactions = transactions.filter(name__icontains = search)
-            imei_transactions = transactions.filter(sales__imei_number__icontains = search)
-            bill_transactions = transactions.filter(bill_no__icontains = search)
-            transactions = phone_transactions.union(customer_trasactions,imei_transactions,bill_transactions)
-        
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date)
@@ -254,15 +321,17 @@ class SalesTransactionView(APIView):
             start_date = datetime.combine(start_date, datetime.min.time())
             end_date = datetime.combine(end_date, datetime.max.time())
             
-            transactions = SalesTransaction.objects.filter(
+            transactions = transactions.filter(
                 date__range=(start_date, end_date)
             )
 
-        transactions = transactions.order_by('-date','-id')
+        if search:
+            transactions = rank(transactions, search)
+        else:
+            transactions = transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(transactions, request)
 
         serializer = SalesTransactionSerializer(paginated_transactions, many=True)
@@ -326,6 +395,9 @@ class SalesTransactionView(APIView):
             brand.stock = brand.stock + sale.phone.selling_price if brand.stock is not None else sale.phone.selling_price
             brand.save()
 
+        IMEIRecord.restock(sales_data)
+        schedule_refresh(day_key(sales_transaction), *(day_key(sr) for sr in sales_transaction.sales_return.all()))
+
         dt = DebtorTransaction.objects.filter(sales_transaction=sales_transaction).first()
         if dt:
             dt.delete()
@@ -531,99 +603,47 @@ class StatsView(APIView):
 
         enterprise = request.user.person.enterprise
 
-        allstock  = Item.objects.filter(
-            phone__brand__enterprise=enterprise
+        allstock  = IMEIRecord.objects.filter(
+            enterprise=enterprise,
+            state__in=IMEIRecord.IN_STOCK_STATES
         ).count()
         allbrands = Brand.objects.filter(
             enterprise=enterprise
         ).count()
 
-        # NOW we filter directly on the DateField, not __date
-        monthlypurchases = Purchase.objects.filter(
-            purchase_transaction__enterprise=enterprise,
-            purchase_transaction__date__range=(start_date, end_date)
-        )
-        monthlysales = Sales.objects.filter(
-            sales_transaction__enterprise=enterprise,
-            sales_transaction__date__range=(start_date, end_date)
-        )
-
-        # For daily, compare the DateField to today
+        # Month-to-date figures come from the per-branch daily rollups
         today = timezone.now().date()
-        dailypurchases = Purchase.objects.filter(
-            purchase_transaction__enterprise=enterprise,
-            purchase_transaction__date=today
-        )
-        dailysales = Sales.objects.filter(
-            sales_transaction__enterprise=enterprise,
-            sales_transaction__date=today
+        in_range = Q(date__range=(start_date, end_date))
+        is_today = Q(date=today)
+        totals = DailyBranchSummary.objects.filter(enterprise=enterprise).filter(in_range | is_today).aggregate(
+            monthly_purchases=Sum('purchases', filter=in_range),
+            ptamt=Sum('purchase_amount', filter=in_range),
+            monthly_sales=Sum('sales', filter=in_range),
+            stamt=Sum('sales_amount', filter=in_range),
+            monthly_profit=Sum('profit', filter=in_range),
+            daily_purchases=Sum('purchases', filter=is_today),
+            dailyptamt=Sum('purchase_amount', filter=is_today),
+            daily_sales=Sum('sales', filter=is_today),
+            dailystamt=Sum('sales_amount', filter=is_today),
+            daily_profit=Sum('profit', filter=is_today),
         )
-
-        # Sum up transaction amounts over the same date ranges
-        ptamt = 0
-        for pt in PurchaseTransaction.objects.filter(
-            enterprise=enterprise,
-            date__range=(start_date, end_date)
-        ):
-            if pt.total_amount:
-                ptamt += pt.total_amount
-
-        dailyptamt = 0
-        for pt in PurchaseTransaction.objects.filter(
-            enterprise=enterprise,
-            date=today
-        ):
-            if pt.total_amount:
-                dailyptamt += pt.total_amount
-
-        stamt = 0
-        for st in SalesTransaction.objects.filter(
-            enterprise=enterprise,
-            date__range=(start_date, end_date)
-        ):
-            if st.total_amount:
-                stamt += st.total_amount
-
-        dailystamt = 0
-        for st in SalesTransaction.objects.filter(
-            enterprise=enterprise,
-            date=today
-        ):
-            if st.total_amount:
-                dailystamt += st.total_amount
-
-        # Profit calculations unchanged
-        daily_profit = 0
-        for sale in dailysales:
-            purchase = Purchase.objects.filter(
-                imei_number=sale.imei_number
-            ).first()
-            if purchase:
-                daily_profit += sale.unit_price - purchase.unit_price
-
-        monthly_profit = 0
-        for sale in monthlysales:
-            purchase = Purchase.objects.filter(
-                imei_number=sale.imei_number
-            ).first()
-            if purchase:
-                monthly_profit += sale.unit_price - purchase.unit_price
+        totals = {key: value or 0 for key, value in totals.items()}
 
         stat = {
             "enterprise": enterprise.name,
             "daily": {
-                "purchases": dailypurchases.count(),
-                "dailyptamt": dailyptamt,
-                "sales": dailysales.count(),
-                "dailystamt": dailystamt,
-                "profit": round(daily_profit, 2)
+                "purchases": totals["daily_purchases"],
+                "dailyptamt": totals["dailyptamt"],
+                "sales": totals["daily_sales"],
+                "dailystamt": totals["dailystamt"],
+                "profit": round(totals["daily_profit"], 2)
             },
             "monthly": {
-                "purchases": monthlypurchases.count(),
-                "ptamt": ptamt,
-                "stamt": stamt,
-                "sales": monthlysales.count(),
-                "profit": round(monthly_profit, 2)
+                "purchases": totals["monthly_purchases"],
+                "ptamt": totals["ptamt"],
+                "stamt": totals["stamt"],
+                "sales": totals["monthly_sales"],
+                "profit": round(totals["monthly_profit"], 2)
             },
             "stock": allstock,
             "brands": allbrands
@@ -918,36 +938,34 @@ class SingleVendorBrandView(APIView):
         return Response(serializer.data)
 
 
-class VendorTransactionView(APIView):
+class VendorTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['vendor']
 
     def get(self,request,branch=None):
         enterprise = request.user.person.enterprise
         search = request.GET.get('search')
         start_date = request.GET.get('start_date')
         end_date = request.GET.get('end_date')
-        transactions = VendorTransaction.objects.filter(enterprise=enterprise)
+        transactions = self.plan(VendorTransaction.objects.filter(enterprise=enterprise))
         if branch:
             transactions = transactions.filter(branch=branch)
 
         if search:
-            name = transactions.filter(vendor__name__icontains = search)
-            amount = transactions.filter(amount__icontains = search)
-            transactions = name.union(amount)
+            transactions = transactions.filter(
+                Q(vendor__name__icontains=search) | Q(amount__icontains=search)
+            )
         
         if start_date and end_date:
             start_date = parse_date(start_date)
             end_date = parse_date(end_date) 
-            transactions = VendorTransaction.objects.filter(
+            transactions = transactions.filter(
                     date__range=(start_date, end_date)
                 )
 
         transactions = transactions.order_by('-date','-id')
 
-        print(transactions)
-
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set the page size here
+        paginator = TransactionPagination()
         paginated_transactions = paginator.paginate_queryset(transactions, request)
 
         serializer = VendorTransactionSerializer(paginated_transactions, many=True)
@@ -1025,12 +1043,11 @@ class BarChartView(APIView):
 
         profit_list = []
         for brand in brands:
-            profit_sales = sales.filter(phone__brand = brand)
+            profit_sales = sales.filter(phone__brand = brand).annotate(purchase_price=F('purchase__unit_price'))
             profit = 0
             for sale in profit_sales:
-                purchase = Purchase.objects.filter(imei_number = sale.imei_number).first()
-                if purchase:
-                    profit += sale.unit_price - purchase.unit_price
+                if sale.purchase_price is not None:
+                    profit += sale.unit_price - sale.purchase_price
             profit_list.append({'Brand':brand.name,'Sales':round(profit,2)})
         res["profit"] = profit_list
 
@@ -1136,9 +1153,14 @@ class LineGraphView(APIView):
         return Response(sales_by_day)
 
 
-class PurchaseReturnView(APIView):
+class PurchaseReturnView(QueryPlanMixin, APIView):
 
     permission_classes = [IsAuthenticated]
+    select_related = ['purchase_transaction__vendor', 'purchase_transaction__person__user']
+    prefetch_related = [
+        Prefetch('purchases', queryset=Purchase.objects.select_related('phone')),
+        Prefetch('purchase_transaction__purchase', queryset=Purchase.objects.select_related('phone')),
+    ]
 
 
     def get(self, request, branch=None):
@@ -1148,27 +1170,21 @@ class PurchaseReturnView(APIView):
         end_date = request.GET.get('end_date')
 
         # Base QuerySet
-        purchase_returns = PurchaseReturn.objects.filter(enterprise=enterprise)
-        print("returns",purchase_returns)
-        for p in purchase_returns:
-            print(p.branch)
+        purchase_returns = self.plan(PurchaseReturn.objects.filter(enterprise=enterprise))
         if branch:
             purchase_returns = purchase_returns.filter(branch=branch)
-        print("branch returns",purchase_returns)
         # -----------------
         # 1) Search Filter
         # -----------------
         if search:
-            name_filter = purchase_returns.filter(purchase_transaction__vendor__name__icontains=search)
-            # amount_filter = purchase_returns.filter(amount__icontains=search)
-            phone_name = purchase_returns.filter(purchases__phone__name__icontains=search)
-            imei_number = purchase_returns.filter(purchases__imei_number__icontains=search)
-            
-            # union() will merge the two QuerySets without duplicates.
-            purchase_returns = name_filter.union(phone_name,imei_number)
+            matches = (
+                Q(purchase_transaction__vendor__name__icontains=search)
+                | Q(purchases__phone__name__icontains=search)
+                | Q(purchases__imei_number__icontains=search)
+            )
             if search.isdigit():
-                id = purchase_returns.filter(id__icontains=search)
-                purchase_returns = purchase_returns.union(id)
+                matches |= Q(id__icontains=search)
+            purchase_returns = purchase_returns.filter(matches).distinct()
 
         # ---------------------
         # 2) Date Range Filter
@@ -1189,10 +1205,9 @@ class PurchaseReturnView(APIView):
         # ---------------------------------
         # 3) Sort and Paginate the Results
         # ---------------------------------
-        purchase_returns = purchase_returns.order_by('-date')  # Sorting
+        purchase_returns = purchase_returns.order_by('-date', '-id')  # Sorting
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(purchase_returns, request)
 
         serializer = PurchaseReturnSerializer(paginated_data, many=True)
@@ -1225,9 +1240,14 @@ class PurchaseReturnView(APIView):
 
 
 
-class SalesReturnView(APIView):
+class SalesReturnView(QueryPlanMixin, APIView):
 
     permission_classes = [IsAuthenticated]
+    select_related = ['sales_transaction__enterprise', 'sales_transaction__person__user']
+    prefetch_related = [
+        Prefetch('purchases', queryset=Sales.objects.select_related('phone')),
+        Prefetch('sales_transaction__sales', queryset=Sales.objects.select_related('phone')),
+    ]
 
 
     def get(self, request, branch=None):
@@ -1237,7 +1257,7 @@ class SalesReturnView(APIView):
         end_date = request.GET.get('end_date')
 
         # Base QuerySet
-        sales_returns = SalesReturn.objects.filter(enterprise=enterprise)
+        sales_returns = self.plan(SalesReturn.objects.filter(enterprise=enterprise))
         
         if branch:
             sales_returns = sales_returns.filter(branch=branch)
@@ -1245,16 +1265,14 @@ class SalesReturnView(APIView):
         # 1) Search Filter
         # -----------------
         if search:
-            name_filter = sales_returns.filter(sales_transaction__customer_name__icontains=search)
-            # amount_filter = sales_returns.filter(amount__icontains=search)
-            phone_name = sales_returns.filter(sales_transaction__phone__name__icontains=search)
-            imei_number = sales_returns.filter(sales_transaction__imei_number__icontains=search)
-
-            # union() will merge the two QuerySets without duplicates.
-            sales_returns = name_filter.union(phone_name,imei_number)
+            matches = (
+                Q(sales_transaction__name__icontains=search)
+                | Q(purchases__phone__name__icontains=search)
+                | Q(purchases__imei_number__icontains=search)
+            )
             if search.isdigit():
-                id = sales_returns.filter(id__icontains=search)
-                sales_returns = sales_returns.union(id)
+                matches |= Q(id__icontains=search)
+            sales_returns = sales_returns.filter(matches).distinct()
 
         # ---------------------
         # 2) Date Range Filter
@@ -1271,10 +1289,9 @@ class SalesReturnView(APIView):
         # ---------------------------------
         # 3) Sort and Paginate the Results
         # ---------------------------------
-        sales_returns = sales_returns.order_by('-date')  # Sorting
+        sales_returns = sales_returns.order_by('-date', '-id')  # Sorting
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(sales_returns, request)
 
         serializer = SalesReturnSerializer(paginated_data, many=True)
@@ -1346,10 +1363,9 @@ class SalesReportView(APIView):
         sales_transaction = []
         cash_transaction = []
         list = []
-        for sale in sales:
-            purchase = Purchase.objects.filter(imei_number = sale.imei_number).first()
-            if purchase:
-                profit = sale.unit_price - purchase.unit_price
+        for sale in sales.annotate(purchase_price=F('purchase__unit_price')):
+            if sale.purchase_price is not None:
+                profit = sale.unit_price - sale.purchase_price
                 total_profit += profit
             else:
                 profit = 0
@@ -1486,12 +1502,13 @@ class EMIDebtorsView(APIView):
         debtor.delete()
         return Response("Deleted", status=status.HTTP_204_NO_CONTENT)
     
-class EMIDebtorTransactionView(APIView):
+class EMIDebtorTransactionView(QueryPlanMixin, APIView):
     permission_classes = [IsAuthenticated]
+    select_related = ['debtor']
 
     def get(self, request, debtor_pk=None, pk=None, branch=None):
         enterprise = request.user.person.enterprise
-        debtor_transactions = EMIDebtorTransaction.objects.filter(enterprise=enterprise)
+        debtor_transactions = self.plan(EMIDebtorTransaction.objects.filter(enterprise=enterprise))
 
         query = request.GET.get('search')
         start_date = request.GET.get('start_date')
@@ -1500,7 +1517,7 @@ class EMIDebtorTransactionView(APIView):
             debtor_transactions = debtor_transactions.filter(branch=branch)
 
         if pk:
-            debtor_transactions = EMIDebtorTransaction.objects.filter(id=pk, enterprise=enterprise).first()
+            debtor_transactions = self.plan(EMIDebtorTransaction.objects.filter(id=pk, enterprise=enterprise)).first()
             serializer = EMIDebtorTransactionSerializer(debtor_transactions)
             return Response(serializer.data)
         
@@ -1525,8 +1542,7 @@ class EMIDebtorTransactionView(APIView):
         debtor_transactions = debtor_transactions.order_by('-date','-id')
 
 
-        paginator = PageNumberPagination()
-        paginator.page_size = 5  # Set your desired page size
+        paginator = TransactionPagination()
         paginated_data = paginator.paginate_queryset(debtor_transactions, request)
 
         serializer = EMIDebtorTransactionSerializer(paginated_data, many=True)
@@ -1610,28 +1626,90 @@ class VendorStatementView(APIView):
         if not vendor:
             return Response("Vendor not found", status=status.HTTP_404_NOT_FOUND)
 
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
+        start_date = parse_date(request.GET.get('start_date') or '')
+        end_date = parse_date(request.GET.get('end_date') or '')
 
-        if start_date and end_date:
-            start_date = parse_date(start_date)
-            end_date = parse_date(end_date)
+        statement = Statement(
+            vendor_transactions.annotate(vendor_name=F('vendor__name')),
+            vendor.due,
+            start=start_date,
+            end=end_date,
+            fields=STATEMENT_FIELDS,
+        )
+        return statement.response(
+            request,
+            {'vendor_data': VendorSerializer(vendor).data},
+            'vendor_transactions',
+            f'statement-{vendor.name}',
+        )
 
-    
-        if start_date and end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__range=(start_date, end_date)
-            )
-        elif start_date and not end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__gte=start_date
-            )
-        elif not start_date and end_date:
-            vendor_transactions = vendor_transactions.filter(
-                date__lte=end_date
-            )
 
-        vendor_transactions = vendor_transactions.order_by('date','id')
-        vendor = VendorSerializer(vendor).data 
-        vts = VendorTransactionSerializer(vendor_transactions, many=True).data
-        return Response({'vendor_data': vendor, 'vendor_transactions': vts})
+class ScanView(APIView):
+    """Resolve a scanned code at the till: a 15 digit IMEI through the IMEI
+    registry, an EAN-13 (or its 12 digit uid) through Product.uid. Each is a
+    single indexed lookup. Codes stocked by another branch are refused."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, code, branch=None):
+        person = request.user.person
+        branch = branch or person.branch_id
+        if branch is None:
+            return Response({"error": "Branch is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if person.branch_id and person.branch_id != branch:
+            return Response({"error": "Unauthorized branch"}, status=status.HTTP_403_FORBIDDEN)
+
+        code = code.strip()
+        if len(code) == 15 and code.isdigit():
+            return self.scan_imei(person.enterprise_id, branch, code)
+        uid = uid_from_code(code)
+        if uid:
+            return self.scan_product(person.enterprise_id, branch, uid)
+        return Response({"error": "Not an IMEI or EAN-13 code"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def scan_imei(self, enterprise_id, branch, imei):
+        record = (
+            IMEIRecord.objects.select_related('phone__brand')
+            .filter(enterprise_id=enterprise_id, imei_number=imei)
+            .first()
+        )
+        if record is None:
+            return Response({"error": "Unknown code"}, status=status.HTTP_404_NOT_FOUND)
+        if record.branch_id != branch:
+            return Response({"error": "Code belongs to another branch"}, status=status.HTTP_403_FORBIDDEN)
+        phone = record.phone
+        return Response({
+            "type": "phone",
+            "code": imei,
+            "id": phone.id,
+            "name": phone.name,
+            "brand": phone.brand_id,
+            "brand_name": phone.brand.name,
+            "branch": record.branch_id,
+            "price": phone.selling_price,
+            "state": record.state,
+            "available": record.state in IMEIRecord.IN_STOCK_STATES,
+        })
+
+    def scan_product(self, enterprise_id, branch, uid):
+        products = list(
+            Product.objects.select_related('brand')
+            .filter(enterprise_id=enterprise_id, uid=uid)
+            .only('id', 'name', 'uid', 'selling_price', 'count', 'branch_id', 'brand__id', 'brand__name')
+        )
+        product = next((p for p in products if p.branch_id == branch), None)
+        if product is None:
+            if products:
+                return Response({"error": "Code belongs to another branch"}, status=status.HTTP_403_FORBIDDEN)
+            return Response({"error": "Unknown code"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            "type": "product",
+            "code": uid,
+            "id": product.id,
+            "name": product.name,
+            "brand": product.brand_id,
+            "brand_name": product.brand.name,
+            "branch": product.branch_id,
+            "price": product.selling_price,
+            "count": product.count,
+            "available": (product.count or 0) > 0,
+        })
@@ -108,7 +108,7 @@ function AllSalesTransactionForm() {
           await Promise.all([
             api.get("allinventory/product/branch/" + branchId + "/"),
             api.get("allinventory/brand/branch/" + branchId + "/"),
-            api.get("alltransaction/next-bill-no/"),
+            api.get("alltransaction/next-bill-no/?branch=" + branchId),
             api.get("alltransaction/debtors/branch/" + branchId + "/"), // Fetching debtors
             api.get("alltransaction/vendor/branch/" + branchId + "/"), // Fetching vendors
           ]);
@@ -128,16 +128,6 @@ function AllSalesTransactionForm() {
     fetchData();
   }, []);
 
-  // When nextBill is available, update the formData's bill_no
-  useEffect(() => {
-    if (nextBill) {
-      setFormData((prevFormData) => ({
-        ...prevFormData,
-        bill_no: nextBill,
-      }));
-    }
-  }, [nextBill]);
-
   // New useEffect to fetch branch info – adjust endpoints as needed
   useEffect(() => {
     const fetchBranchData = async () => {
@@ -249,8 +239,10 @@ const handleNewProductVendorChange = (ids) => {
       const res = await api.get(
         "alltransaction/customer-total/" + phone_number + "/"
       );
-      console.log(res.data);
-      setCustomerTotal(res.data);
+      const { total_spent, visits } = res.data;
+      setCustomerTotal(
+        visits ? `RS. ${total_spent} · ${visits} visits` : "New customer"
+      );
     } catch (error) {
       console.error("Error fetching data:", error);
       setError("Failed to fetch data");
@@ -568,13 +560,12 @@ const handleNewProductVendorChange = (ids) => {
                     type="text"
                     id="bill_no"
                     name="bill_no"
-                    placeholder="Enter bill number"
+                    placeholder={nextBill ? `Next: ${nextBill} (leave blank to assign)` : "Assigned on save"}
                     value={formData.bill_no}
                     onChange={(e) =>
                       setFormData({ ...formData, bill_no: e.target.value })
                     }
                     className="bg-slate-700 border-slate-600 text-white focus:ring-purple-500 focus:border-purple-500"
-                    required
                   />
                 </div>
               </div>
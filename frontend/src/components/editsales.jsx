@@ -93,7 +93,7 @@ export default function EditSalesTransactionForm() {
     const fetchData = async () => {
       try {
         const [phonesRes, brandsRes, debtorsRes, emiDebtorsRes, salesRes] = await Promise.all([
-          api.get(`inventory/phone/branch/${branchId}/`),
+          api.get(`inventory/phone/branch/${branchId}/?include=imeis`),
           api.get(`inventory/brand/branch/${branchId}/`),
           api.get(`alltransaction/debtors/branch/${branchId}/`),
           api.get(`transaction/emidebtors/branch/${branchId}/`),
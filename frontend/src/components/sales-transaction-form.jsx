@@ -112,7 +112,7 @@ function SalesTransactionForm() {
       try {
         const [phonesRes, brandsRes, debtorsRes, emiDebtorsRes] =
           await Promise.all([
-            api.get(`inventory/phone/branch/${branchId}/`),
+            api.get(`inventory/phone/branch/${branchId}/?include=imeis`),
             api.get(`inventory/brand/branch/${branchId}/`),
             api.get(`alltransaction/debtors/branch/${branchId}/`),
             api.get(`transaction/emidebtors/branch/${branchId}/`),
@@ -528,7 +528,7 @@ function SalesTransactionForm() {
                                 {sale.phone &&
                                   phones
                                     .find((p) => p.id.toString() === sale.phone)
-                                    ?.imeis.map((imei) => (
+                                    ?.imeis?.map((imei) => (
                                       <CommandItem
                                         key={imei}
                                         onSelect={() =>